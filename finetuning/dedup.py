@@ -0,0 +1,156 @@
+"""
+질문 + 보기 텍스트의 MinHash/LSH 로 유사 중복 문제를 묶고, 묶음 단위로 train/validation/test 를 나눕니다.
+
+과목별 CSV 에 같은 문제가 조금씩 다르게 들어 있으면 무작위 분할에서 한쪽은 train, 다른 쪽은 test 로 들어가 평가가 새어 나갑니다.
+문자 n-gram 집합의 MinHash 서명을 만들고, 서명을 band 로 나눠 같은 버킷에 들어온 행만 서명 일치율(Jaccard 추정치)을
+확인해 묶으므로 행 수에 거의 선형으로 동작합니다. 묶음은 대표 행(가장 앞 행) 텍스트의 해시로 분할을 정하므로
+실행 순서와 관계없이 같은 결과가 나오고, 데이터를 추가해도 기존 묶음의 분할은 바뀌지 않습니다.
+"""
+import hashlib
+import re
+import unicodedata
+
+import numpy as np
+
+_EMPTY = np.uint32(0xFFFFFFFF)
+_NON_WORD = re.compile(r'[\W_]+')
+SPLIT_RATIOS = (("train", 0.6), ("validation", 0.3), ("test", 0.1))
+
+
+def normalize_texts(texts: list) -> list:
+    """
+    NFKC 정규화, 소문자, 문장부호/연속 공백을 공백 하나로.
+    (pandas 3 의 pyarrow 문자열 정규식은 \\w 가 ASCII 만 포함해 한글이 지워지므로 파이썬 re 사용)
+    """
+    return [_NON_WORD.sub(' ', unicodedata.normalize('NFKC', text).lower()).strip() for text in texts]
+
+
+def _shingle_hashes(texts: list, ngram: int) -> tuple:
+    """
+    모든 텍스트의 문자 n-gram 해시를 한 번에 계산합니다.
+
+    Returns:
+        tuple: (n-gram 해시 uint64 배열, 행별 n-gram 개수). n 보다 짧은 텍스트는 공백으로 채워 n-gram 하나로 봄.
+    """
+    texts = [text.ljust(ngram) if text else text for text in texts]
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    counts = np.maximum(lengths - ngram + 1, 0)
+    starts = np.cumsum(lengths) - lengths
+    offsets = np.cumsum(counts) - counts
+    positions = np.arange(counts.sum()) - np.repeat(offsets, counts) + np.repeat(starts, counts)
+
+    hashes = np.zeros(len(positions), dtype=np.uint64)
+    for i in range(ngram):
+        hashes = hashes * np.uint64(0x100000001B3) + codes[positions + i]
+    hashes ^= hashes >> np.uint64(29)
+    return hashes, counts
+
+
+def minhash_signatures(texts: list, num_perm: int = 128, ngram: int = 3, seed: int = 42,
+                       perm_chunk: int = 8) -> np.ndarray:
+    """
+    정규화된 텍스트 목록의 MinHash 서명을 계산합니다.
+
+    Args:
+        texts (list): normalize_texts 를 거친 문자열 목록.
+        num_perm (int): 해시 함수 수 (서명 길이).
+        ngram (int): 문자 n-gram 길이.
+        seed (int): 해시 함수 계수를 정하는 시드. 같은 시드면 실행마다 같은 서명.
+        perm_chunk (int): 한 번에 계산할 해시 함수 수 (메모리 = perm_chunk x n-gram 수 x 8바이트).
+
+    Returns:
+        np.ndarray: (len(texts), num_perm) uint32. 빈 텍스트의 행은 모두 0xFFFFFFFF.
+    """
+    # multiply-shift 해시 (a 는 홀수, uint64 곱은 2^64 로 감싸짐): 나머지 연산 없이 상위 32비트를 사용
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64)
+    hashes, counts = _shingle_hashes(texts, ngram)
+
+    signatures = np.full((len(texts), num_perm), _EMPTY, dtype=np.uint32)
+    nonempty = counts > 0
+    if not nonempty.any():
+        return signatures
+    offsets = (np.cumsum(counts) - counts)[nonempty]
+    for start in range(0, num_perm, perm_chunk):
+        stop = min(start + perm_chunk, num_perm)
+        values = (a[start:stop, None] * hashes[None, :] + b[start:stop, None]) >> np.uint64(32)
+        signatures[nonempty, start:stop] = np.minimum.reduceat(values, offsets, axis=1).T.astype(np.uint32)
+    return signatures
+
+
+def _find(parent: np.ndarray, i: int) -> int:
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def lsh_groups(signatures: np.ndarray, bands: int = 16, threshold: float = 0.8) -> np.ndarray:
+    """
+    서명을 bands 개의 band 로 나눠 한 band 라도 같은 행들을 후보로 보고, 버킷 대표 행과의 서명 일치율이
+    threshold 이상이면 같은 묶음으로 합칩니다 (union-find).
+
+    Args:
+        signatures (np.ndarray): minhash_signatures 결과.
+        bands (int): band 수. num_perm 의 약수여야 하며, 많을수록 낮은 유사도까지 후보로 잡힘
+                     (128/16 이면 Jaccard 0.8 인 쌍이 후보가 될 확률 약 95%).
+        threshold (float): 같은 묶음으로 볼 최소 Jaccard 추정치.
+
+    Returns:
+        np.ndarray: 행마다 묶음 대표 행 번호 (묶음에서 가장 앞 행). 빈 텍스트 행은 자기 자신.
+    """
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"bands({bands}) 는 서명 길이({num_perm})의 약수여야 합니다.")
+    rows_per_band = num_perm // bands
+    parent = np.arange(n)
+    valid = np.flatnonzero(signatures[:, 0] != _EMPTY)
+    for band in range(bands):
+        block = np.ascontiguousarray(signatures[valid, band * rows_per_band:(band + 1) * rows_per_band])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows_per_band))).ravel()
+        _, inverse, bucket_sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        if bucket_sizes.max(initial=0) < 2:
+            continue
+        order = valid[np.argsort(inverse, kind='stable')]
+        bucket_starts = np.cumsum(bucket_sizes) - bucket_sizes
+        # 대부분의 버킷은 한 행뿐이므로 두 행 이상인 버킷만 돎
+        for start, size in zip(bucket_starts[bucket_sizes > 1].tolist(), bucket_sizes[bucket_sizes > 1].tolist()):
+            members = order[start:start + size]
+            leader = members[0]
+            agreement = (signatures[members[1:]] == signatures[leader]).mean(axis=1)
+            for member in members[1:][agreement >= threshold]:
+                root_a, root_b = _find(parent, leader), _find(parent, member)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+    # 경로 압축: 모든 행이 대표 행을 가리킬 때까지 한 단계씩 올라감
+    while True:
+        grandparent = parent[parent]
+        if np.array_equal(grandparent, parent):
+            return parent
+        parent = grandparent
+
+
+def stable_fraction(text: str, seed: int = 42) -> float:
+    """텍스트와 시드로 정해지는 [0, 1) 값 (파이썬 hash() 와 달리 프로세스마다 같음)."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8, salt=str(seed).encode()[:16]).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def assign_splits(roots: np.ndarray, fractions: np.ndarray, ratios: tuple = SPLIT_RATIOS) -> np.ndarray:
+    """
+    묶음 대표 행의 해시 값(fractions[root])이 떨어지는 구간으로 분할 번호를 정합니다. 같은 묶음은 항상 같은 분할입니다.
+
+    Args:
+        roots (np.ndarray): lsh_groups 결과.
+        fractions (np.ndarray): 행마다 stable_fraction 값 (대표 행 값만 사용).
+        ratios (tuple): (분할 이름, 비율) 목록. 비율 합은 1.
+
+    Returns:
+        np.ndarray: 행마다 ratios 의 분할 번호.
+    """
+    bounds = np.cumsum([ratio for _, ratio in ratios])
+    return np.minimum(np.searchsorted(bounds, fractions[roots], side='right'), len(ratios) - 1)
@@ -1,6 +1,19 @@
 import pandas as pd
 import glob # 파일 경로 패턴 매칭을 위한 라이브러리
 import os   # 운영체제 관련 기능을 위한 라이브러리
+import argparse
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# pd.read_csv 의 기본 결측 문자열 (pyarrow 기본값에는 '<NA>', 'None' 이 없음)
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+                    'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+MANIFEST_VERSION = 1
 
 def get_csv_file_paths(folder_path: str) -> list:
     """
@@ -86,24 +99,211 @@ def save_dataframe_to_csv(df: pd.DataFrame, output_folder: str, filename: str) -
         print(f"\n'{output_path}' 파일로 저장 중 오류 발생: {e}")
         return False
 
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """파일 내용의 SHA-256 (블록 단위로 읽어 큰 파일도 메모리를 쓰지 않음)."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_csv_arrow(file_path: str) -> pa.Table:
+    """
+    pyarrow 의 멀티스레드 CSV 리더로 읽습니다. 결측과 형 추론은 pd.read_csv 와 같게 맞춥니다.
+    (빈 문자열/결측 문자열은 null, pyarrow 만 추론하는 날짜/시간 형은 원래 문자열 그대로)
+    """
+    convert_options = pa_csv.ConvertOptions(strings_can_be_null=True, null_values=PANDAS_NA_VALUES)
+    table = pa_csv.read_csv(file_path, convert_options=convert_options)
+    temporal = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+    if temporal:
+        convert_options.column_types = {name: pa.string() for name in temporal}
+        table = pa_csv.read_csv(file_path, convert_options=convert_options)
+    return table
+
+
+def unify_schemas(schemas: list) -> pa.Schema:
+    """
+    과목별 CSV 스키마를 하나로 합칩니다. 열 순서는 pd.concat 처럼 처음 나온 순서입니다.
+    정수/실수가 섞이면 float64, 그 밖에 형이 다르면 string, 모든 파일에서 비어 있는 열은 float64 (pandas 의 전부 NaN 열과 같음).
+    """
+    column_types = {}
+    for schema in schemas:
+        for field in schema:
+            column_types.setdefault(field.name, set()).add(field.type)
+    fields = []
+    for name, types in column_types.items():
+        known = {t for t in types if not pa.types.is_null(t)}
+        if not known:
+            dtype = pa.float64()
+        elif len(known) == 1:
+            dtype = known.pop()
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in known):
+            dtype = pa.float64()
+        else:
+            dtype = pa.string()
+        fields.append(pa.field(name, dtype))
+    return pa.schema(fields)
+
+
+def conform_batch(batch: pa.RecordBatch, schema: pa.Schema) -> pa.RecordBatch:
+    """배치를 합친 스키마에 맞춥니다 (없는 열은 null, 형은 cast)."""
+    columns = []
+    for field in schema:
+        index = batch.schema.get_field_index(field.name)
+        if index < 0:
+            columns.append(pa.nulls(batch.num_rows, field.type))
+        else:
+            columns.append(batch.column(index).cast(field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def load_manifest(manifest_path: str) -> dict:
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    return {"version": MANIFEST_VERSION, "files": {}, "output": None}
+
+
+def convert_csv_to_part(file_path: str, cache_dir: str) -> dict | None:
+    """
+    CSV 하나를 내용 해시 이름의 Parquet 파트로 변환합니다. 같은 내용의 파트가 이미 있으면 다시 읽지 않습니다.
+
+    Returns:
+        dict | None: 매니페스트 항목 {"sha256", "size", "mtime_ns", "part", "rows"}. 읽기 실패 시 None.
+    """
+    try:
+        stat = os.stat(file_path)
+        sha256 = file_sha256(file_path)
+        part_path = os.path.join(cache_dir, f"{sha256}.parquet")
+        if os.path.exists(part_path):
+            rows = pq.ParquetFile(part_path).metadata.num_rows
+        else:
+            table = read_csv_arrow(file_path)
+            pq.write_table(table, part_path + ".tmp")
+            os.replace(part_path + ".tmp", part_path)
+            rows = table.num_rows
+        return {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "part": part_path, "rows": rows}
+    except Exception as e:
+        print(f"'{file_path}' 파일을 읽는 중 오류 발생: {e}")
+        return None
+
+
+def merge_csv_files(file_paths: list, output_path: str, manifest_path: str, cache_dir: str,
+                    workers: int | None = None, batch_size: int = 65_536) -> bool:
+    """
+    과목별 CSV 를 하나의 Parquet 파일로 합칩니다.
+
+    매니페스트에 기록된 크기/수정 시각이 같은 파일은 다시 읽지 않고, 바뀐 파일만 해시를 계산해 내용이 달라졌을 때만
+    병렬로 Parquet 파트로 변환합니다. 출력은 파트를 배치 단위로 읽어 합친 스키마로 맞춘 뒤 바로 써서, 전체 데이터를 메모리에
+    올리지 않습니다. 입력 파일 목록과 해시가 지난 실행과 같고 출력이 남아 있으면 출력도 다시 쓰지 않습니다.
+
+    Args:
+        file_paths (list): CSV 파일 경로 리스트 (이 순서대로 행을 합침).
+        output_path (str): 출력 Parquet 경로.
+        manifest_path (str): 매니페스트 JSON 경로.
+        cache_dir (str): 파일별 Parquet 파트를 저장할 디렉토리.
+        workers (int | None): 동시에 변환할 파일 수 (None 이면 CPU 수).
+        batch_size (int): 출력 시 한 번에 옮길 행 수.
+
+    Returns:
+        bool: 출력이 준비되었으면 True.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+    entries = {}
+    changed = []
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        previous = manifest["files"].get(file_path)
+        if (previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns
+                and os.path.exists(previous["part"])):
+            entries[file_path] = previous
+        else:
+            changed.append(file_path)
+    print(f"\n변경 없음 {len(entries)}개, 새로 읽을 파일 {len(changed)}개")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for file_path, entry in zip(changed, pool.map(lambda path: convert_csv_to_part(path, cache_dir), changed)):
+            if entry is not None:
+                entries[file_path] = entry
+                print(f"'{file_path}' 파일을 성공적으로 읽었습니다. ({entry['rows']}행)")
+    if not entries:
+        return False
+
+    ordered = [(file_path, entries[file_path]) for file_path in file_paths if file_path in entries]
+    inputs = [[file_path, entry["sha256"]] for file_path, entry in ordered]
+    output_state = {"path": output_path, "inputs": inputs}
+    if manifest.get("output") == output_state and os.path.exists(output_path):
+        print(f"입력이 바뀌지 않아 '{output_path}' 을(를) 그대로 사용합니다.")
+    else:
+        schema = unify_schemas([pq.read_schema(entry["part"]) for _, entry in ordered])
+        with pq.ParquetWriter(output_path + ".tmp", schema) as writer:
+            for _, entry in ordered:
+                for batch in pq.ParquetFile(entry["part"]).iter_batches(batch_size=batch_size):
+                    writer.write_batch(conform_batch(batch, schema))
+        os.replace(output_path + ".tmp", output_path)
+        print(f"\n모든 CSV 파일이 '{output_path}' 에 합쳐졌습니다. (총 {sum(e['rows'] for _, e in ordered)}행)")
+
+    # 지금 입력에 쓰이지 않는 파트(삭제되거나 바뀐 파일의 이전 내용)는 정리
+    used_parts = {os.path.abspath(entry["part"]) for _, entry in ordered}
+    for name in os.listdir(cache_dir):
+        part_path = os.path.abspath(os.path.join(cache_dir, name))
+        if part_path.endswith(".parquet") and part_path not in used_parts:
+            os.remove(part_path)
+
+    manifest = {"version": MANIFEST_VERSION, "files": dict(ordered), "output": output_state}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return True
+
+
 def main():
     """
     메인 실행 함수.
     """
+    parser = argparse.ArgumentParser(description="과목별 CSV 를 하나의 Parquet 파일로 합치기 (바뀐 파일만 다시 읽음)")
+    parser.add_argument("--data-dir", default='data', help="과목별 CSV 가 있는 폴더")
+    parser.add_argument("--output", default='combined_all_questions.parquet', help="data 폴더 안에 저장할 파일명")
+    parser.add_argument("--workers", type=int, default=None, help="동시에 읽을 CSV 수 (기본: CPU 수)")
+    parser.add_argument("--csv", action="store_true", help="예전처럼 pandas 로 읽어 combined_all_questions.csv 로 저장")
+    args = parser.parse_args()
+
     # 현재 작업 디렉토리 확인
     current_working_directory = os.getcwd()
     print(f"현재 작업 디렉토리: {current_working_directory}")
 
     # CSV 파일들이 저장된 'data' 폴더 경로 설정
-    data_folder_name = 'data' # 현재 작업 디렉토리 내의 'data' 폴더
+    data_folder_name = args.data_dir # 현재 작업 디렉토리 내의 'data' 폴더
 
-    # 1. CSV 파일 경로 가져오기
-    csv_file_list = get_csv_file_paths(data_folder_name)
+    # 1. CSV 파일 경로 가져오기 (이전 실행의 출력 파일은 제외, 실행마다 같은 순서가 되도록 정렬)
+    csv_file_list = sorted(path for path in get_csv_file_paths(data_folder_name)
+                           if os.path.basename(path) != 'combined_all_questions.csv')
 
     if not csv_file_list:
         print("처리할 CSV 파일이 없습니다. 스크립트를 종료합니다.")
         return
 
+    if not args.csv:
+        # 2. 바뀐 CSV 만 병렬로 읽어 하나의 Parquet 파일로 합치기
+        output_path = os.path.join(data_folder_name, args.output)
+        merged = merge_csv_files(csv_file_list, output_path,
+                                 manifest_path=os.path.join(data_folder_name, 'combine_manifest.json'),
+                                 cache_dir=os.path.join(data_folder_name, '.combine_cache'), workers=args.workers)
+        if not merged:
+            print("CSV 파일들을 합치는 데 실패했습니다. 스크립트를 종료합니다.")
+            return
+        parquet_file = pq.ParquetFile(output_path)
+        print("\n--- 합쳐진 파일 스키마 ---")
+        print(parquet_file.schema_arrow)
+        if '과목명' in parquet_file.schema_arrow.names:
+            print("\n--- 포함된 과목명 종류 ---")
+            print(pq.read_table(output_path, columns=['과목명']).column(0).unique().to_pylist())
+        print(f"\n작업 완료. 합쳐진 파일은 '{output_path}'에 저장되었습니다.")
+        return
+
     # 2. CSV 파일들 합치기
     combined_dataframe = combine_csv_files(csv_file_list)
 
@@ -1,129 +1,170 @@
+import argparse
+import tempfile
+import uuid
+
+import numpy as np
 import pandas as pd
-from datasets import Dataset, DatasetDict, load_from_disk # DatasetDict 추가
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dedup import SPLIT_RATIOS, assign_splits, lsh_groups, minhash_signatures, normalize_texts, stable_fraction
+from datasets import Dataset, DatasetDict
 import os
-import math # 비율 계산을 위해 추가 (필요 없을 수도 있음)
 
+OPTION_COLUMNS = [f'보기{i}' for i in range(1, 6)]
+# format_alpaca_frame / dedup_text_frame 이 읽는 컬럼
+FORMAT_COLUMNS = ['문제유형', '과목명', '질문', '정답', '해설', *OPTION_COLUMNS]
+ALPACA_INPUT_HEADER = "Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.\n\n### Instruction:\n"
 
-# 전역 스코프에 함수 정의
-def create_alpaca_formatted_text(instruction: str, response: str, input_text: str = "") -> str:
-    # ... (이 함수 내용은 이전과 동일) ...
-    if input_text:
-        return f"""Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.
 
-### Instruction:
-{instruction}
+def _text_column(df: pd.DataFrame, name: str, default: str) -> pd.Series:
+    """컬럼 값을 f-string/str() 과 같은 문자열로 (NaN 은 'nan'). 컬럼이 없으면 row.get 기본값."""
+    if name not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    # pandas 3 의 astype(str) 은 NaN 을 그대로 두므로 str(nan) 과 같게 채움
+    return df[name].astype(str).fillna('nan')
 
-### Input:
-{input_text}
 
-### Response:
-{response}"""
-    else:
-        return f"""Below is an instruction that describes a task. Write a response that appropriately completes the request.
+def _is_falsy(df: pd.DataFrame, name: str) -> pd.Series:
+    """row.get(name, '') 에 대한 `not 값` (빈 문자열/0 이 거짓, NaN 은 참). 컬럼이 없으면 모두 거짓."""
+    if name not in df.columns:
+        return pd.Series(True, index=df.index)
+    column = df[name]
+    if column.dtype.kind in "biuf":
+        return column.eq(0)
+    return column.map(lambda value: not value).astype(bool)
 
-### Instruction:
-{instruction}
 
-### Response:
-{response}"""
+def format_alpaca_frame(df: pd.DataFrame) -> tuple:
+    """
+    OX / 객관식 행을 Alpaca 형식 텍스트로 만듭니다 (예전 행 단위 iterrows 가공과 같은 텍스트와 누락 개수를 컬럼 연산으로 계산).
+    질문이나 정답이 비어 있는 행, 유효한 보기가 하나도 없는 객관식 행은 누락으로 셉니다.
+    '문제유형' 이 문자열이 아닌 행(NaN 등)은 알 수 없는 유형으로 셉니다.
 
+    Args:
+        df (pd.DataFrame): CSV 를 읽은 DataFrame ('문제유형' 컬럼 필수).
 
-# 전역 스코프에 함수 정의
-def format_ox_quiz_sample(row: pd.Series) -> str | None:
-    # ... (이 함수 내용은 이전과 동일) ...
-    try:
-        subject = row.get('과목명', 'N/A')
-        question = row.get('질문', '')
-        answer = str(row.get('정답', ''))  # 정답이 숫자일 수도 있으므로 문자열로 변환
-        explanation = row.get('해설', '')
+    Returns:
+        tuple: (가공된 텍스트 Series — 원래 행 순서, 누락 개수 dict {"unknown", "ox_missing", "mc_missing"})
+    """
+    problem_type = df['문제유형'].astype(str).str.strip()
+    is_ox = problem_type.eq('OX').to_numpy()
+    is_mc = problem_type.eq('객관식').to_numpy()
+
+    subject = _text_column(df, '과목명', 'N/A')
+    question = _text_column(df, '질문', '')
+    answer = _text_column(df, '정답', '')
+    explanation = _text_column(df, '해설', '')
+    missing_common = (_is_falsy(df, '질문') | answer.eq('')).to_numpy()
+
+    # 보기: 결측이 아니고 앞뒤 공백을 뺀 값이 비어 있지 않은 것만 "번호: 내용" 으로 줄바꿈 연결
+    # (전체 읽기와 청크 읽기 모두 여기서 astype(str) 로 변환한 뒤 판단하므로 NaN 처리가 같음)
+    options = pd.Series('', index=df.index, dtype=object)
+    for i, name in enumerate(OPTION_COLUMNS, start=1):
+        if name not in df.columns:
+            continue
+        raw = df[name].astype(str)
+        option = raw.str.strip()
+        valid = raw.notna() & option.ne('')
+        piece = f"{i}: " + option
+        options = options.where(~valid, options.where(options.eq(''), options + "\n") + piece)
+    has_options = options.ne('').to_numpy()
+
+    ox_ok = is_ox & ~missing_common
+    mc_ok = is_mc & ~missing_common & has_options
+    counts = {
+        "unknown": int((~is_ox & ~is_mc).sum()),
+        "ox_missing": int((is_ox & missing_common).sum()),
+        "mc_missing": int((is_mc & ~mc_ok).sum()),
+    }
+
+    response = "\n\n### Response:\n정답: " + answer + "\n해설: " + explanation
+    ox_text = (ALPACA_INPUT_HEADER + "다음은 [" + subject + "] 과목의 OX 퀴즈입니다. 주어진 질문에 대해 O 또는 X로 답하고, 그 이유를 간략히 설명해주세요."
+               + "\n\n### Input:\n질문: " + question + response)
+    mc_text = (ALPACA_INPUT_HEADER + "다음은 [" + subject + "] 과목의 객관식 문제입니다. 문제와 보기를 읽고 정답 번호와 해설을 제공해주세요."
+               + "\n\n### Input:\n문제: " + question + "\n보기:\n" + options + response)
+    texts = pd.Series(np.where(ox_ok, ox_text, mc_text), index=df.index)[ox_ok | mc_ok]
+    return texts, counts
+
+
+def _filled_text(df: pd.DataFrame, name: str) -> pd.Series:
+    """결측을 '' 로 채운 뒤 문자열로 (pandas 버전이나 청크 dtype 에 따라 결측이 'nan' 텍스트가 되지 않도록). 컬럼이 없으면 ''."""
+    if name not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[name].fillna('').astype(str)
+
+
+def dedup_text_frame(df: pd.DataFrame) -> pd.Series:
+    """
+    유사 중복 판단에 쓰는 질문 + 보기 텍스트 (과목명/정답/해설은 제외). 정규화는 dedup.normalize_texts 에서 합니다.
+    결측 보기는 빠지므로 전체 읽기와 --streaming 청크 읽기에서 같은 텍스트(→ 같은 묶음과 분할)가 나옵니다.
+    """
+    key = _filled_text(df, '질문')
+    for name in OPTION_COLUMNS:
+        if name in df.columns:
+            option = _filled_text(df, name)
+            key = key + (" " + option).where(option.ne(''), '')
+    return key
+
+
+def print_processing_summary(total_rows: int, processed_count: int, counts: dict):
+    print(f"\n--- 데이터 처리 요약 ---")
+    print(f"총 로드된 행 수: {total_rows}")
+    print(f"성공적으로 가공된 샘플 수: {processed_count}")
+    print(f"누락 - 알 수 없는 문제 유형: {counts['unknown']}")
+    print(f"누락 - OX 퀴즈 필수 데이터 부족: {counts['ox_missing']}")
+    print(f"누락 - 객관식 퀴즈 필수 데이터 부족: {counts['mc_missing']}")
+    total_skipped = counts['unknown'] + counts['ox_missing'] + counts['mc_missing']
+    print(f"총 누락된 샘플 수: {total_skipped}")
+    print(
+        f"검증 (로드된 행 - 누락된 샘플 == 가공된 샘플): {total_rows} - {total_skipped} == {processed_count}  -> {total_rows - total_skipped == processed_count}")
 
-        if not question or not answer:  # 필수 정보 누락 시
-            return None
 
-        instruction = f"다음은 [{subject}] 과목의 OX 퀴즈입니다. 주어진 질문에 대해 O 또는 X로 답하고, 그 이유를 간략히 설명해주세요."
-        input_text = f"질문: {question}"
-        response = f"정답: {answer}\n해설: {explanation}"
+def _arrow_to_frame(table) -> pd.DataFrame:
+    """Arrow 테이블/배치를 DataFrame 으로. pandas 버전에 따라 None 으로 나오는 결측을 read_csv 처럼 NaN 으로 맞춥니다."""
+    df = table.to_pandas()
+    for name in df.columns:
+        if df[name].dtype == object:
+            df[name] = df[name].where(df[name].notna(), np.nan)
+    return df
+
+
+def read_frame(file_path: str) -> pd.DataFrame:
+    """main.py 가 만든 Parquet 또는 CSV 를 읽습니다."""
+    if file_path.endswith('.parquet'):
+        return _arrow_to_frame(pq.read_table(file_path))
+    return pd.read_csv(file_path)
 
-        return create_alpaca_formatted_text(instruction, response, input_text)
-    except Exception as e:
-        print(f"Error formatting OX quiz sample: {e} - Row: {row.to_dict()}")
-        return None
 
-def format_multiple_choice_sample(row: pd.Series) -> str | None:
+def read_chunks(file_path: str, chunksize: int, dtypes: dict | None = None):
     """
-    객관식 퀴즈 데이터 행을 Alpaca 형식의 텍스트로 변환합니다.
+    chunksize 행씩 DataFrame 을 내보냅니다. dtypes(infer_chunk_dtypes 결과)를 주면 청크마다 추론이 달라지지 않게 맞춥니다.
+    Parquet 은 열 형이 고정되어 있으므로 결측 유무에 따라 갈리는 정수/실수만 맞춥니다.
     """
-    try:
-        subject = row.get('과목명', 'N/A')
-        # ---!!! 중요 수정 지점 !!!---
-        # 객관식 문제의 내용도 '질문' 컬럼에서 가져오도록 수정합니다.
-        question = row.get('질문', '')  # '문제' 대신 '질문' 사용
-
-        options = []
-        for i in range(1, 6):
-            option_text = row.get(f'보기{i}')
-            # pd.notna()는 NaN을 체크하고, str(option_text).strip()은 빈 문자열이나 공백만 있는 경우를 체크
-            if pd.notna(option_text) and str(option_text).strip():
-                options.append(f"{i}: {str(option_text).strip()}")  # strip()을 추가하여 앞뒤 공백 제거
-
-        answer_num = str(row.get('정답', ''))  # 정답이 숫자일 수 있으므로 문자열로
-        explanation = row.get('해설', '')
-
-        # 필수 정보 누락 시 (특히 options 리스트가 비어있으면 안 됨)
-        if not question or not options or not answer_num:
-            # 누락 원인 로깅 (필요시 주석 해제)
-            # print(f"MC 누락: Q='{question}', Opts_count={len(options)}, Ans='{answer_num}', Row_idx={row.name if hasattr(row, 'name') else 'N/A'}")
-            return None
-
-        instruction = f"다음은 [{subject}] 과목의 객관식 문제입니다. 문제와 보기를 읽고 정답 번호와 해설을 제공해주세요."
-
-        options_str = "\n".join(options)
-        input_text = f"문제: {question}\n보기:\n{options_str}"
-        # 정답 번호가 보기 텍스트의 일부로 포함되지 않도록 주의 (예: "정답: 2. 랜덤변수는 ...")
-        # 현재는 정답 번호만 출력하고, 해설에서 상세 내용을 제공
-        response = f"정답: {answer_num}\n해설: {explanation}"
-
-        return create_alpaca_formatted_text(instruction, response, input_text)
-    except Exception as e:
-        print(f"Error formatting multiple choice sample: {e} - Row: {row.to_dict()}")
-        return None
-
+    if not file_path.endswith('.parquet'):
+        yield from pd.read_csv(file_path, chunksize=chunksize, dtype=dtypes)
+        return
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize):
+        chunk = _arrow_to_frame(batch)
+        if dtypes:
+            chunk = chunk.astype({name: "float64" for name, dtype in dtypes.items()
+                                  if dtype == "float64" and chunk[name].dtype.kind in "iu"})
+        yield chunk
 
-# load_and_process_csv 함수는 이전 디버깅 버전과 동일하게 사용하면 됩니다.
-# 해당 함수 내에서 객관식 문제를 처리할 때 아래와 같이 되어 있는지 확인합니다.
-# (이 부분은 이미 이전 디버깅 코드에서 올바르게 되어 있을 것입니다)
-# elif problem_type == '객관식':
-#     original_question_mc = row.get('질문', '') # <--- 이 부분이 '질문'으로 되어 있는지 확인
-#     ...
-#     if not original_question_mc or not original_options_mc or not original_answer_mc:
-#         skipped_mc_missing_data_count += 1
-#     else:
-#         formatted_sample = format_multiple_choice_sample(row)
 
-# 이 함수는 위에서 정의된 format_ox_quiz_sample 등을 호출
 def load_and_process_csv(csv_file_path: str) -> Dataset | None:
-    # ... (이 함수 내용은 이전 디버깅 버전과 거의 동일) ...
+    """CSV/Parquet 전체를 읽어 Alpaca 형식 텍스트와 유사 중복 판단용 텍스트("dedup_text")를 가진 Dataset 을 만듭니다."""
     if not os.path.exists(csv_file_path):
         print(f"오류: CSV 파일 '{csv_file_path}'을(를) 찾을 수 없습니다.")
         return None
 
     try:
-        df = pd.read_csv(csv_file_path)
+        df = read_frame(csv_file_path)
         print(f"'{csv_file_path}' 파일을 성공적으로 로드했습니다. 총 {len(df)}개의 데이터.")
     except Exception as e:
         print(f"오류: CSV 파일 '{csv_file_path}'을(를) 로드하는 중 오류 발생: {e}")
         return None
 
-    for i in range(1, 6):
-        col_name = f'보기{i}'
-        if col_name in df.columns:
-            df[col_name] = df[col_name].astype(str)
-
-    skipped_unknown_type_count = 0
-    skipped_ox_missing_data_count = 0
-    skipped_mc_missing_data_count = 0
-    processed_count = 0
-
     print("\n--- '문제유형' 컬럼 분석 ---")
     if '문제유형' in df.columns:
         print(df['문제유형'].value_counts(dropna=False))
@@ -131,68 +172,187 @@ def load_and_process_csv(csv_file_path: str) -> Dataset | None:
         print("'문제유형' 컬럼이 CSV 파일에 없습니다.")
         return None
 
-    formatted_texts = []
-    for index, row in df.iterrows():
-        problem_type = row.get('문제유형', '').strip()
-        formatted_sample = None
-
-        if problem_type == 'OX':
-            original_question = row.get('질문', '')  # '질문' 컬럼 확인!
-            original_answer = str(row.get('정답', ''))
-            if not original_question or not original_answer:
-                skipped_ox_missing_data_count += 1
-            else:
-                # 여기서 format_ox_quiz_sample 호출
-                formatted_sample = format_ox_quiz_sample(row)  # <--- 이 호출이 가능해야 함
-
-        elif problem_type == '객관식':
-            original_question_mc = row.get('질문', '')
-            original_options_mc = [row.get(f'보기{i}') for i in range(1, 6) if
-                                   pd.notna(row.get(f'보기{i}')) and str(row.get(f'보기{i}')).strip()]
-            original_answer_mc = str(row.get('정답', ''))
-            if not original_question_mc or not original_options_mc or not original_answer_mc:
-                skipped_mc_missing_data_count += 1
-            else:
-                # 여기서 format_multiple_choice_sample 호출
-                formatted_sample = format_multiple_choice_sample(row)  # <--- 이 호출이 가능해야 함
-        else:
-            skipped_unknown_type_count += 1
-
-        if formatted_sample:
-            formatted_texts.append({"text": formatted_sample})
-            processed_count += 1
-
-    # ... (나머지 디버깅 출력 및 Dataset 생성 부분은 이전과 동일) ...
-    print(f"\n--- 데이터 처리 요약 ---")
-    print(f"총 로드된 행 수: {len(df)}")
-    print(f"성공적으로 가공된 샘플 수: {processed_count}")
-    print(f"누락 - 알 수 없는 문제 유형: {skipped_unknown_type_count}")
-    print(f"누락 - OX 퀴즈 필수 데이터 부족: {skipped_ox_missing_data_count}")
-    print(f"누락 - 객관식 퀴즈 필수 데이터 부족: {skipped_mc_missing_data_count}")
-    total_skipped = skipped_unknown_type_count + skipped_ox_missing_data_count + skipped_mc_missing_data_count
-    print(f"총 누락된 샘플 수: {total_skipped}")
-    print(
-        f"검증 (로드된 행 - 누락된 샘플 == 가공된 샘플): {len(df)} - {total_skipped} == {processed_count}  -> {len(df) - total_skipped == processed_count}")
+    # 문제 유형별 Alpaca 텍스트를 컬럼 연산으로 한 번에 가공 (보기의 문자열 변환은 format_alpaca_frame 안에서 함)
+    texts, counts = format_alpaca_frame(df)
+    formatted_texts = texts.tolist()
+    dedup_texts = dedup_text_frame(df).loc[texts.index].tolist()
+    print_processing_summary(len(df), len(formatted_texts), counts)
 
     if not formatted_texts:
         print("가공된 데이터가 없습니다. 데이터 형식이나 내용을 확인해주세요.")
         return None
 
-    hf_dataset = Dataset.from_list(formatted_texts)
+    hf_dataset = Dataset.from_dict({"text": formatted_texts, "dedup_text": dedup_texts})
     return hf_dataset
 
-def main():
+
+def infer_chunk_dtypes(csv_file_path: str, chunksize: int) -> dict:
     """
-    메인 실행 함수.
-    CSV 로드, 데이터 가공, 데이터셋 분할 및 저장 수행.
+    파일 전체를 한 번에 읽었을 때의 컬럼 dtype 을 구합니다.
+    (청크마다 따로 추론하면 결측치가 있는 청크만 정답이 1.0 처럼 float 로 읽혀 텍스트가 달라질 수 있음)
+
+    Parquet 은 스키마와 행 그룹 통계(null_count)만 읽으므로 데이터를 다시 읽지 않습니다.
+    CSV 는 앞 청크만 보고는 뒤에 결측이 나올지 알 수 없어, 가공에 쓰는 컬럼(FORMAT_COLUMNS)만 한 번 더 파싱합니다.
+    이 추가 패스도 메모리는 chunksize 만큼만 쓰지만 그 컬럼들의 파싱 시간이 한 번 더 들므로, 큰 입력은 main.py 의 Parquet 을 쓰는 편이 낫습니다.
     """
-    base_dir = os.path.dirname(os.path.abspath(__file__)) if '__file__' in locals() else '.' # 스크립트 위치 기준
-    combined_csv_path = os.path.join('data', 'combined_all_questions.csv')
-    print(f"처리할 CSV 파일 경로: {combined_csv_path}")
+    if csv_file_path.endswith('.parquet'):
+        return _parquet_dtypes(csv_file_path)
+    kinds = {}
+    for chunk in pd.read_csv(csv_file_path, chunksize=chunksize, usecols=lambda name: name in FORMAT_COLUMNS):
+        for name, dtype in chunk.dtypes.items():
+            kind = dtype.kind if dtype.kind in "bif" else "O"
+            previous = kinds.get(name, kind)
+            kinds[name] = kind if previous == kind else ("f" if {previous, kind} <= {"i", "f"} else "O")
+    return {name: {"b": "bool", "i": "int64", "f": "float64", "O": str}[kind] for name, kind in kinds.items()}
+
+
+def _parquet_dtypes(file_path: str) -> dict:
+    """Parquet 정수 컬럼 중 결측이 있는 것은 float64 (to_pandas 가 전체 테이블에서 그렇게 읽으므로), 나머지는 Arrow 형 그대로."""
+    parquet_file = pq.ParquetFile(file_path)
+    schema = parquet_file.schema_arrow
+    metadata = parquet_file.metadata
+    dtypes = {}
+    for index, field in enumerate(schema):
+        if not pa.types.is_integer(field.type):
+            dtypes[field.name] = str(field.type)
+            continue
+        statistics = [metadata.row_group(i).column(index).statistics for i in range(metadata.num_row_groups)]
+        if all(stat is not None and stat.has_null_count for stat in statistics):
+            has_nulls = any(stat.null_count for stat in statistics)
+        else:  # 통계가 없는 파일은 그 컬럼만 읽어 확인
+            has_nulls = pq.read_table(file_path, columns=[field.name]).column(0).null_count > 0
+        dtypes[field.name] = "float64" if has_nulls else "int64"
+    return dtypes
+
+
+def iter_formatted_chunks(csv_file_path: str, chunksize: int, dtypes: dict, stats: dict):
+    """CSV/Parquet 을 chunksize 행씩 읽어 가공한 샘플을 하나씩 내보냅니다. 행 수와 누락 개수는 stats 에 누적됩니다."""
+    for chunk in read_chunks(csv_file_path, chunksize, dtypes):
+        texts, counts = format_alpaca_frame(chunk)
+        dedup_texts = dedup_text_frame(chunk).loc[texts.index]
+        stats["rows"] = stats.get("rows", 0) + len(chunk)
+        for key, value in counts.items():
+            stats[key] = stats.get(key, 0) + value
+        for text, dedup_text in zip(texts, dedup_texts):
+            yield {"text": text, "dedup_text": dedup_text}
+
+
+def load_and_process_csv_streaming(csv_file_path: str, cache_dir: str, chunksize: int = 50_000) -> Dataset | None:
+    """
+    load_and_process_csv 와 같은 Dataset 을 CSV 를 청크 단위로 읽어 만듭니다.
+    가공된 샘플은 Dataset.from_generator 가 cache_dir 의 Arrow 파일로 바로 쓰므로, 최대 메모리는 CSV 크기가 아니라 chunksize 에 비례합니다.
 
-    # 1. CSV 로드 및 데이터 가공하여 단일 Dataset 생성
-    hf_dataset = load_and_process_csv(combined_csv_path)
+    Args:
+        csv_file_path (str): 통합 CSV 또는 Parquet 경로.
+        cache_dir (str): Arrow 파일을 쓸 디렉토리. 반환된 Dataset 을 쓰는 동안 지우면 안 됨.
+        chunksize (int): 한 번에 읽을 행 수.
+    """
+    if not os.path.exists(csv_file_path):
+        print(f"오류: CSV 파일 '{csv_file_path}'을(를) 찾을 수 없습니다.")
+        return None
+
+    dtypes = infer_chunk_dtypes(csv_file_path, chunksize)
+    if '문제유형' not in dtypes:
+        print("'문제유형' 컬럼이 CSV 파일에 없습니다.")
+        return None
+
+    stats = {}
+    # fingerprint 를 매번 새로 주어 캐시된 결과 대신 항상 CSV 를 다시 읽음 (누락 개수를 stats 로 받기 위해)
+    hf_dataset = Dataset.from_generator(
+        iter_formatted_chunks, gen_kwargs={"csv_file_path": csv_file_path, "chunksize": chunksize, "dtypes": dtypes, "stats": stats},
+        cache_dir=cache_dir, fingerprint=uuid.uuid4().hex,
+    )
+    print(f"'{csv_file_path}' 파일을 {chunksize}행 단위로 처리했습니다. 총 {stats.get('rows', 0)}개의 데이터.")
+    print_processing_summary(stats.get("rows", 0), len(hf_dataset), stats)
+    if len(hf_dataset) == 0:
+        print("가공된 데이터가 없습니다. 데이터 형식이나 내용을 확인해주세요.")
+        return None
+    return hf_dataset
 
+def random_split(hf_dataset: Dataset) -> DatasetDict:
+    """예전 방식: train_test_split 두 번으로 행 단위 무작위 60/30/10 분할 (유사 중복이 여러 분할에 들어갈 수 있음)."""
+    # 2-1. 먼저 test 셋(10%) 분리
+    # train_test_split은 기본적으로 'train', 'test' 키를 가진 DatasetDict를 반환
+    temp_and_test_split = hf_dataset.train_test_split(test_size=0.1, shuffle=True, seed=42) # shuffle=True로 섞어줌
+    test_dataset = temp_and_test_split['test']     # 최종 test set (10%)
+    temp_train_val_dataset = temp_and_test_split['train'] # 나머지 90% (train + validation 용도)
+
+    print(f" - 1차 분할 완료: 임시 학습/검증셋 {len(temp_train_val_dataset)}개, 테스트셋 {len(test_dataset)}개")
+
+    # 2-2. 나머지 90%에서 validation 셋(원본의 30%) 분리
+    # 90% 중에서 30%를 validation으로 가져가야 함. 비율 = (원하는 크기) / (현재 크기) = 0.3 / 0.9 = 1/3
+    validation_split_ratio = 0.3 / (1.0 - 0.1) # 0.3 / 0.9 = 1/3
+    # validation_split_ratio = 1/3 # 간단히 이렇게 써도 됨
+
+    train_and_val_split = temp_train_val_dataset.train_test_split(test_size=validation_split_ratio, shuffle=True, seed=42)
+    train_dataset = train_and_val_split['train']      # 최종 train set (60%)
+    validation_dataset = train_and_val_split['test'] # 최종 validation set (30%)
+
+    print(f" - 2차 분할 완료: 최종 학습셋 {len(train_dataset)}개, 검증셋 {len(validation_dataset)}개")
+
+    # 3. 최종 분할된 데이터셋을 하나의 DatasetDict로 묶기 (선택적이지만 관리 용이)
+    final_dataset_dict = DatasetDict({
+        'train': train_dataset,
+        'validation': validation_dataset,
+        'test': test_dataset
+    })
+    return final_dataset_dict
+
+
+def dedup_hash_split(hf_dataset: Dataset, threshold: float = 0.8, drop_duplicates: bool = False,
+                     batch_size: int = 10_000) -> DatasetDict:
+    """
+    질문 + 보기의 MinHash/LSH 로 유사 중복 묶음을 찾고, 묶음 대표 행 텍스트의 해시로 60/30/10 분할을 정합니다.
+    같은 묶음은 항상 같은 분할에 들어가고, 같은 데이터면 실행마다 같은 분할이 나옵니다.
+    서명은 batch_size 행씩 계산하므로 추가 메모리는 행당 서명(512바이트) 정도입니다.
+
+    Args:
+        hf_dataset (Dataset): "text", "dedup_text" 컬럼을 가진 Dataset.
+        threshold (float): 같은 묶음으로 볼 최소 Jaccard 추정치 (문자 3-gram).
+        drop_duplicates (bool): True 면 묶음마다 가장 앞 행만 남김.
+        batch_size (int): 서명을 한 번에 계산할 행 수.
+
+    Returns:
+        DatasetDict: train / validation / test ("dedup_text" 컬럼은 제거).
+    """
+    signatures = None
+    fractions = np.empty(len(hf_dataset))
+    start = 0
+    for batch in hf_dataset.iter(batch_size=batch_size):
+        batch_signatures = minhash_signatures(normalize_texts(batch["dedup_text"]))
+        if signatures is None:
+            signatures = np.empty((len(hf_dataset), batch_signatures.shape[1]), dtype=batch_signatures.dtype)
+        stop = start + len(batch_signatures)
+        signatures[start:stop] = batch_signatures
+        fractions[start:stop] = [stable_fraction(text) for text in batch["text"]]
+        start = stop
+    roots = lsh_groups(signatures, threshold=threshold)
+
+    rows = np.arange(len(hf_dataset))
+    group_sizes = np.bincount(roots, minlength=len(rows))
+    print(f" - 유사 중복 묶음: {(group_sizes > 1).sum()}개 ({group_sizes[group_sizes > 1].sum()}행), "
+          f"전체 묶음 {(group_sizes > 0).sum()}개 / {len(rows)}행")
+    keep = rows[roots == rows] if drop_duplicates else rows
+    if drop_duplicates:
+        print(f" - 중복 제거: 묶음마다 첫 행만 남겨 {len(rows) - len(keep)}행 제외")
+
+    split_ids = assign_splits(roots, fractions)
+    hf_dataset = hf_dataset.remove_columns("dedup_text")
+    final_dataset_dict = DatasetDict({
+        name: hf_dataset.select(keep[split_ids[keep] == i]).shuffle(seed=42)
+        for i, (name, _) in enumerate(SPLIT_RATIOS)
+    })
+    sizes = ", ".join(f"{name} {len(split)}개 ({len(split) / len(keep):.1%})" for name, split in final_dataset_dict.items())
+    print(f" - 분할 완료: {sizes}")
+    return final_dataset_dict
+
+
+def split_and_save(hf_dataset: Dataset | None, output_splits_directory: str, split: str = "hash",
+                   dedup_threshold: float = 0.8, drop_duplicates: bool = False):
+    """
+    가공된 Dataset 을 60/30/10 으로 분할해 output_splits_directory 에 저장합니다.
+    split 이 "hash" 면 유사 중복 묶음 단위 해시 분할(dedup_hash_split), "random" 이면 예전 행 단위 무작위 분할.
+    """
     if hf_dataset:
         print("\n--- Hugging Face Dataset 정보 (분할 전) ---")
         print(hf_dataset)
@@ -205,39 +365,16 @@ def main():
 
         # --- 2. 데이터셋 분할 (60% train, 30% validation, 10% test) ---
         print("\n--- 데이터셋 분할 시작 (60% train, 30% validation, 10% test) ---")
-
-        # 2-1. 먼저 test 셋(10%) 분리
-        # train_test_split은 기본적으로 'train', 'test' 키를 가진 DatasetDict를 반환
-        temp_and_test_split = hf_dataset.train_test_split(test_size=0.1, shuffle=True, seed=42) # shuffle=True로 섞어줌
-        test_dataset = temp_and_test_split['test']     # 최종 test set (10%)
-        temp_train_val_dataset = temp_and_test_split['train'] # 나머지 90% (train + validation 용도)
-
-        print(f" - 1차 분할 완료: 임시 학습/검증셋 {len(temp_train_val_dataset)}개, 테스트셋 {len(test_dataset)}개")
-
-        # 2-2. 나머지 90%에서 validation 셋(원본의 30%) 분리
-        # 90% 중에서 30%를 validation으로 가져가야 함. 비율 = (원하는 크기) / (현재 크기) = 0.3 / 0.9 = 1/3
-        validation_split_ratio = 0.3 / (1.0 - 0.1) # 0.3 / 0.9 = 1/3
-        # validation_split_ratio = 1/3 # 간단히 이렇게 써도 됨
-
-        train_and_val_split = temp_train_val_dataset.train_test_split(test_size=validation_split_ratio, shuffle=True, seed=42)
-        train_dataset = train_and_val_split['train']      # 최종 train set (60%)
-        validation_dataset = train_and_val_split['test'] # 최종 validation set (30%)
-
-        print(f" - 2차 분할 완료: 최종 학습셋 {len(train_dataset)}개, 검증셋 {len(validation_dataset)}개")
-
-        # 3. 최종 분할된 데이터셋을 하나의 DatasetDict로 묶기 (선택적이지만 관리 용이)
-        final_dataset_dict = DatasetDict({
-            'train': train_dataset,
-            'validation': validation_dataset,
-            'test': test_dataset
-        })
+        if split == "random":
+            final_dataset_dict = random_split(hf_dataset.remove_columns("dedup_text"))
+        else:
+            final_dataset_dict = dedup_hash_split(hf_dataset, dedup_threshold, drop_duplicates)
 
         print("\n--- 최종 분할된 데이터셋 정보 ---")
         print(final_dataset_dict)
 
         # --- 4. 분할된 데이터셋 저장 ---
         # 각 스플릿(train, validation, test)이 하위 폴더로 저장됨
-        output_splits_directory = os.path.join('data', 'prepared_finetuning_dataset_splits_arrow')
         try:
             # DatasetDict 객체 자체를 저장하면 내부적으로 각 스플릿을 저장함
             final_dataset_dict.save_to_disk(output_splits_directory)
@@ -249,5 +386,39 @@ def main():
     else:
         print("데이터셋 생성에 실패하여 분할 및 저장을 진행할 수 없습니다.")
 
+
+def main():
+    """
+    메인 실행 함수.
+    CSV 로드, 데이터 가공, 데이터셋 분할 및 저장 수행.
+    """
+    parser = argparse.ArgumentParser(description="통합 CSV 를 Alpaca 형식 데이터셋으로 가공해 분할 저장")
+    # main.py 가 만든 Parquet 이 있으면 사용하고, 없으면 예전 CSV 사용
+    default_input = os.path.join('data', 'combined_all_questions.parquet')
+    if not os.path.exists(default_input):
+        default_input = os.path.join('data', 'combined_all_questions.csv')
+    parser.add_argument("--input", "--csv", dest="csv", default=default_input, help="통합 CSV 또는 Parquet 경로")
+    parser.add_argument("--output", default=os.path.join('data', 'prepared_finetuning_dataset_splits_arrow'))
+    parser.add_argument("--streaming", action="store_true",
+                        help="CSV 를 청크 단위로 읽어 Arrow 로 바로 씀 (CSV 전체를 메모리에 올리지 않음)")
+    parser.add_argument("--chunksize", type=int, default=50_000, help="--streaming 에서 한 번에 읽을 행 수")
+    parser.add_argument("--split", choices=["hash", "random"], default="hash",
+                        help="hash: 유사 중복 묶음 단위 해시 분할, random: 예전 행 단위 무작위 분할")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8, help="유사 중복으로 볼 최소 Jaccard (질문 + 보기)")
+    parser.add_argument("--drop-duplicates", action="store_true", help="유사 중복 묶음마다 첫 행만 남김")
+    args = parser.parse_args()
+    combined_csv_path = args.csv
+    print(f"처리할 CSV 파일 경로: {combined_csv_path}")
+
+    # 1. CSV 로드 및 데이터 가공하여 단일 Dataset 생성
+    if args.streaming:
+        # 청크 가공 결과 Arrow 파일은 분할 저장이 끝날 때까지만 필요
+        with tempfile.TemporaryDirectory() as cache_dir:
+            hf_dataset = load_and_process_csv_streaming(combined_csv_path, cache_dir, args.chunksize)
+            split_and_save(hf_dataset, args.output, args.split, args.dedup_threshold, args.drop_duplicates)
+    else:
+        hf_dataset = load_and_process_csv(combined_csv_path)
+        split_and_save(hf_dataset, args.output, args.split, args.dedup_threshold, args.drop_duplicates)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
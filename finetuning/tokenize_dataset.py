@@ -0,0 +1,178 @@
+"""
+prepare_dataset.py 가 만든 Alpaca 텍스트 스플릿을 대상 모델 토크나이저로 미리 토큰화하고, 고정 길이 시퀀스로 패킹합니다.
+
+- 토큰화: Dataset.map(num_proc=...) 로 여러 프로세스에서 토큰화하고 input_ids/length 를 Arrow 스플릿에 저장
+  (data/tokenized_finetuning_dataset_arrow). 학습할 때마다 다시 토큰화하지 않아도 됨.
+- 패킹: 짧은 OX/객관식 샘플을 길이 내림차순 best-fit 으로 seq_len 토큰 행에 채움 (data/packed_finetuning_dataset_arrow).
+  행마다 position_ids 를 샘플 시작에서 0 으로 되돌리고, 샘플 첫 토큰의 label 은 -100 으로 두어 앞 샘플에서 예측하지 않게 함.
+  collate_packed() 는 샘플끼리 서로 보지 않는 블록 대각 causal mask 를 만듦.
+- 보고: 스플릿별 토큰 수와 패딩 효율(seq_len 으로 패딩 / 배치 내 최장 길이로 패딩 / 패킹) 을 출력하고 packing_report.json 으로 저장.
+
+실행:
+    uv run tokenize_dataset.py --tokenizer models/pretrained/gemma-3-4b-it --seq-len 2048 --num-proc 8
+"""
+import argparse
+import bisect
+import json
+import os
+
+import numpy as np
+from datasets import Dataset, DatasetDict, load_from_disk
+
+IGNORE_INDEX = -100
+
+
+def tokenize_batch(batch: dict, tokenizer, max_length: int) -> dict:
+    """텍스트를 토큰화하고 끝에 EOS 를 붙입니다 (패킹된 행에서 샘플 경계가 되도록). max_length 보다 길면 자릅니다."""
+    input_ids, truncated = [], []
+    for ids in tokenizer(batch["text"], add_special_tokens=True)["input_ids"]:
+        if tokenizer.eos_token_id is not None and (not ids or ids[-1] != tokenizer.eos_token_id):
+            ids = ids + [tokenizer.eos_token_id]
+        truncated.append(len(ids) > max_length)
+        input_ids.append(ids[:max_length])
+    return {"input_ids": input_ids, "length": [len(ids) for ids in input_ids], "truncated": truncated}
+
+
+def pack_lengths(lengths: np.ndarray, seq_len: int) -> list:
+    """
+    길이 내림차순 best-fit 으로 샘플을 seq_len 행에 배치합니다 (남은 공간이 가장 작은데도 들어가는 행을 고름).
+
+    Returns:
+        list: 행마다 샘플 번호 리스트 (행 안에서는 원래 번호 순서).
+    """
+    bins = []
+    capacities = []  # (남은 공간, 행 번호) 를 정렬된 상태로 유지
+    for index in np.argsort(-lengths, kind='stable').tolist():
+        length = int(lengths[index])
+        position = bisect.bisect_left(capacities, (length, -1))
+        if position == len(capacities):
+            bins.append([index])
+            remaining, bin_id = seq_len - length, len(bins) - 1
+        else:
+            remaining, bin_id = capacities.pop(position)
+            bins[bin_id].append(index)
+            remaining -= length
+        if remaining > 0:
+            bisect.insort(capacities, (remaining, bin_id))
+    return [sorted(members) for members in bins]
+
+
+def iter_packed_rows(tokenized: Dataset, bins: list, seq_len: int, pad_token_id: int):
+    """bins 대로 샘플을 이어 붙인 고정 길이 행을 내보냅니다."""
+    for members in bins:
+        input_ids, labels, position_ids = [], [], []
+        for ids in tokenized[members]["input_ids"]:
+            input_ids += ids
+            labels += [IGNORE_INDEX] + ids[1:]  # 샘플 첫 토큰은 앞 샘플의 마지막 토큰에서 예측하지 않음
+            position_ids += range(len(ids))
+        padding = seq_len - len(input_ids)
+        yield {
+            "input_ids": input_ids + [pad_token_id] * padding,
+            "labels": labels + [IGNORE_INDEX] * padding,
+            "position_ids": position_ids + [0] * padding,
+            "attention_mask": [1] * len(labels) + [0] * padding,
+            "num_samples": len(members),
+        }
+
+
+def padded_efficiency(lengths: np.ndarray, batch_size: int, seed: int = 42) -> float:
+    """무작위 순서 배치를 배치 내 최장 길이로 패딩했을 때 실제 토큰 비율 (패킹하지 않은 학습의 기준값)."""
+    if not len(lengths):
+        return 0.0
+    shuffled = np.random.default_rng(seed).permutation(lengths)
+    padded = sum(len(batch) * batch.max() for batch in np.array_split(shuffled, -(-len(shuffled) // batch_size)))
+    return float(lengths.sum() / padded)
+
+
+def packed_attention_mask(position_ids, attention_mask, dtype=None):
+    """
+    패킹된 행의 블록 대각 causal mask (B, 1, L, L). 같은 샘플 안의 앞 토큰만 볼 수 있습니다.
+    샘플 경계는 position_ids 가 0 으로 돌아가는 위치로 찾습니다.
+    eager 어텐션은 bool 4D mask 를 더하기 mask 로 해석하지 않으므로, 볼 수 없는 위치를 dtype 의 최솟값으로 둔
+    더하기 mask 를 돌려줍니다 (sdpa 도 같은 mask 사용. 패딩 행도 NaN 이 나오지 않음).
+    """
+    import torch
+
+    segment_ids = torch.cumsum((position_ids == 0).long(), dim=-1)
+    same_segment = segment_ids[:, :, None] == segment_ids[:, None, :]
+    length = position_ids.shape[-1]
+    causal = torch.ones(length, length, dtype=torch.bool, device=position_ids.device).tril()
+    valid = attention_mask.bool()
+    allowed = (same_segment & causal & valid[:, None, :] & valid[:, :, None])[:, None]
+    dtype = dtype or torch.float32
+    return torch.zeros(allowed.shape, dtype=dtype, device=allowed.device).masked_fill(~allowed, torch.finfo(dtype).min)
+
+
+def collate_packed(features: list, block_mask: bool = True, dtype=None) -> dict:
+    """
+    Trainer 의 data_collator 로 쓸 수 있는 패킹 배치 생성 함수.
+    block_mask 가 True 면 attention_mask 를 블록 대각 4D 더하기 mask 로 바꿉니다 (eager/sdpa 어텐션용, dtype 은 모델 dtype).
+    False 면 2D mask 와 position_ids 만 넘기므로, position_ids 로 경계를 나누는 flash-attention 계열에서 사용합니다.
+    """
+    import torch
+
+    batch = {key: torch.tensor([f[key] for f in features]) for key in ("input_ids", "labels", "position_ids", "attention_mask")}
+    if block_mask:
+        batch["attention_mask"] = packed_attention_mask(batch["position_ids"], batch["attention_mask"], dtype)
+    return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="분할된 Alpaca 데이터셋을 미리 토큰화하고 고정 길이로 패킹")
+    parser.add_argument("--tokenizer", required=True, help="대상 모델(또는 토크나이저) 경로")
+    parser.add_argument("--input", default=os.path.join('data', 'prepared_finetuning_dataset_splits_arrow'))
+    parser.add_argument("--tokenized-output", default=os.path.join('data', 'tokenized_finetuning_dataset_arrow'))
+    parser.add_argument("--packed-output", default=os.path.join('data', 'packed_finetuning_dataset_arrow'))
+    parser.add_argument("--seq-len", type=int, default=2048, help="패킹된 행 길이 (이보다 긴 샘플은 잘림)")
+    parser.add_argument("--num-proc", type=int, default=os.cpu_count(), help="토큰화 프로세스 수")
+    parser.add_argument("--batch-size", type=int, default=8, help="패딩 효율 비교에 쓸 학습 배치 크기")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    splits = load_from_disk(args.input)
+
+    # 1. 여러 프로세스로 토큰화 (같은 입력/토크나이저면 datasets 캐시를 다시 사용)
+    tokenized = splits.map(tokenize_batch, batched=True, num_proc=args.num_proc,
+                           fn_kwargs={"tokenizer": tokenizer, "max_length": args.seq_len},
+                           desc="토큰화")
+    tokenized.save_to_disk(args.tokenized_output)
+    print(f"토큰화된 스플릿을 '{args.tokenized_output}' 에 저장했습니다.")
+
+    # 2. 스플릿별 패킹과 토큰 수/패딩 효율 보고
+    packed = {}
+    report = {"tokenizer": args.tokenizer, "seq_len": args.seq_len, "batch_size": args.batch_size, "splits": {}}
+    for name, split in tokenized.items():
+        lengths = np.asarray(split["length"], dtype=np.int64)
+        bins = pack_lengths(lengths, args.seq_len)
+        packed[name] = Dataset.from_generator(
+            iter_packed_rows, gen_kwargs={"tokenized": split, "bins": bins, "seq_len": args.seq_len,
+                                          "pad_token_id": pad_token_id})
+        tokens = int(lengths.sum())
+        report["splits"][name] = {
+            "samples": len(split),
+            "tokens": tokens,
+            "mean_length": float(lengths.mean()) if len(lengths) else 0.0,
+            "max_length": int(lengths.max(initial=0)),
+            "truncated": int(sum(split["truncated"])),
+            "padded_efficiency": padded_efficiency(lengths, args.batch_size),
+            "max_length_efficiency": tokens / (len(split) * args.seq_len) if len(split) else 0.0,
+            "packed_rows": len(bins),
+            "packed_efficiency": tokens / (len(bins) * args.seq_len) if bins else 0.0,
+        }
+        r = report["splits"][name]
+        print(f"[{name:>10}] 샘플 {r['samples']}개, 토큰 {r['tokens']}개 (평균 {r['mean_length']:.1f}, 최대 {r['max_length']}, "
+              f"잘림 {r['truncated']}개) | 패딩 효율 seq_len {r['max_length_efficiency']:.1%}, "
+              f"배치 최장 {r['padded_efficiency']:.1%} → 패킹 {r['packed_rows']}행 "
+              f"{r['packed_efficiency']:.1%}")
+
+    DatasetDict(packed).save_to_disk(args.packed_output)
+    with open(os.path.join(args.packed_output, 'packing_report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"패킹된 스플릿과 packing_report.json 을 '{args.packed_output}' 에 저장했습니다.")
+
+
+if __name__ == "__main__":
+    main()
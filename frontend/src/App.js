@@ -35,7 +35,7 @@ function App() {
     try {
       const res = await axios.post(
         `${API}/compare_models/`,
-        { subject }
+        { subject, session_id: sessionId }
       );
 
       setSelectedSubject(subject);
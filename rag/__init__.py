@@ -0,0 +1 @@
+"""rag_text_and_image.py 에서 사용하는 RAG 보조 모듈 모음."""
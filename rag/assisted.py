@@ -0,0 +1,181 @@
+"""
+작은 draft 모델로 후보 토큰을 먼저 만들고 본 모델이 한 번의 forward 로 검증하는 보조(speculative) 디코딩.
+
+본 모델은 draft 가 제안한 토큰들을 한 번에 검증해 자신의 greedy 선택과 일치하는 앞부분만 받아들이고, 처음 어긋난 위치에는
+자기 토큰을 넣습니다. 따라서 결과는 본 모델 greedy 디코딩과 같고, draft 가 잘 맞힐수록 본 모델 forward 횟수가 줄어듭니다.
+생성 자체는 transformers 의 assisted generation(generate(assistant_model=...))을 사용하고, 이 모듈은 호출마다
+수락률/속도 향상을 계산하기 위한 forward 기록과 greedy 대비 비교 스크립트를 제공합니다.
+
+설정:
+    GEMMA_DRAFT_MODEL_PATH=/models/gemma-3-1b-it     같은 토크나이저를 쓰는 draft 모델 (PipelineConfig.draft_model_path)
+    PipelineConfig.num_assistant_tokens=5             검증 한 번에 draft 가 제안하는 최대 토큰 수
+
+비교:
+    python -m rag.assisted --model-path <본 모델> --draft-model-path <draft> --num-assistant-tokens 3 5 8
+"""
+import argparse
+import json
+import time
+
+import torch
+
+
+class ForwardRecorder:
+    """
+    with 블록 동안 모델 forward 호출마다 입력 토큰 수와 소요 시간을 기록합니다.
+
+    Attributes:
+        calls (list): (입력 토큰 수, 초) 튜플 목록.
+        first_end (float | None): 첫 forward 가 끝난 시각 (time.perf_counter).
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+        self.first_end = None
+        self._start = None
+        self._handles = []
+
+    def _pre_hook(self, module, args, kwargs):
+        self._start = time.perf_counter()
+
+    def _hook(self, module, args, kwargs, output):
+        tensor = kwargs.get("input_ids")
+        if tensor is None:
+            tensor = kwargs.get("inputs_embeds") if kwargs.get("inputs_embeds") is not None else args[0]
+        end = time.perf_counter()
+        if self.first_end is None:
+            self.first_end = end
+        self.calls.append((tensor.shape[1], end - self._start))
+
+    def __enter__(self):
+        self._handles = [
+            self.model.register_forward_pre_hook(self._pre_hook, with_kwargs=True),
+            self.model.register_forward_hook(self._hook, with_kwargs=True),
+        ]
+        return self
+
+    def __exit__(self, *exc):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+
+def assisted_stats(target_calls: list, draft_calls: list, new_tokens: int, uncached_prompt_tokens: int) -> dict:
+    """
+    본 모델 forward 기록으로 draft 수락률과 greedy 대비 속도 향상 추정치를 계산합니다.
+
+    검증 forward 한 번은 받아들인 draft 토큰 + 본 모델 토큰 1개를 만들므로 accepted = new_tokens - 검증 횟수 입니다.
+    각 검증 forward 의 입력은 (직전 토큰 1개 + 후보) 이고, 첫 forward 는 프롬프트 전체 + 후보입니다.
+
+    Args:
+        target_calls (list): ForwardRecorder.calls (본 모델).
+        draft_calls (list): ForwardRecorder.calls (draft 모델).
+        new_tokens (int): 생성된 토큰 수.
+        uncached_prompt_tokens (int): 첫 forward 에 들어간 프롬프트 토큰 수.
+
+    Returns:
+        dict: drafted_tokens, accepted_tokens, acceptance_rate, target_forwards, tokens_per_forward, est_speedup.
+              est_speedup 은 greedy 의 토큰당 시간이 검증 forward 한 번과 같다고 보고, draft 시간까지 더한 실제 decode
+              구간과 비교한 추정치 (검증 forward 가 토큰 1개 forward 보다 조금 느리므로 약간 높게 나옴).
+    """
+    if not target_calls:
+        return {"drafted_tokens": 0, "accepted_tokens": 0, "acceptance_rate": 0.0, "target_forwards": 0,
+                "tokens_per_forward": 0.0, "est_speedup": None}
+    lengths = [n for n, _ in target_calls]
+    drafted = (lengths[0] - uncached_prompt_tokens) + sum(n - 1 for n in lengths[1:])
+    accepted = max(new_tokens - len(target_calls), 0)
+    decode_times = [sec for _, sec in target_calls[1:]]
+    est_speedup = None
+    if decode_times and new_tokens > 1:
+        # 첫 forward(prefill)는 양쪽이 같으므로 decode 구간만 비교
+        greedy_decode_sec = (new_tokens - 1) * (sum(decode_times) / len(decode_times))
+        est_speedup = greedy_decode_sec / (sum(decode_times) + sum(sec for _, sec in draft_calls))
+    return {
+        "drafted_tokens": drafted,
+        "accepted_tokens": accepted,
+        "acceptance_rate": accepted / drafted if drafted else 0.0,
+        "target_forwards": len(target_calls),
+        "tokens_per_forward": new_tokens / len(target_calls),
+        "est_speedup": est_speedup,
+    }
+
+
+def configure_assistant(assistant_model, num_assistant_tokens: int = 5):
+    """draft 길이를 호출마다 바꾸지 않고 고정해 수락률을 보고 num_assistant_tokens 를 조정할 수 있게 합니다."""
+    assistant_model.generation_config.num_assistant_tokens = num_assistant_tokens
+    assistant_model.generation_config.num_assistant_tokens_schedule = "constant"
+
+
+def compare_with_greedy(generator, prompts: list, num_assistant_tokens_list: list, max_new_tokens: int) -> list:
+    """
+    프롬프트마다 greedy 생성과 draft 길이별 보조 생성을 실행해 출력 일치 여부, 수락률, 실제 속도 향상을 측정합니다.
+
+    Returns:
+        list: {"prompt", "num_assistant_tokens", "identical", "acceptance_rate", "tokens_per_forward",
+               "greedy_sec", "assisted_sec", "speedup", "est_speedup"} 리스트.
+    """
+    results = []
+    for name, prompt in prompts:
+        start = time.perf_counter()
+        greedy = generator.generate(prompt, assisted=False, max_new_tokens=max_new_tokens, do_sample=False)
+        greedy_sec = time.perf_counter() - start
+        for num_tokens in num_assistant_tokens_list:
+            configure_assistant(generator.assistant_model, num_tokens)
+            start = time.perf_counter()
+            assisted = generator.generate(prompt, max_new_tokens=max_new_tokens)
+            assisted_sec = time.perf_counter() - start
+            stats = generator.last_stats
+            results.append({
+                "prompt": name, "num_assistant_tokens": num_tokens, "identical": assisted == greedy,
+                "acceptance_rate": stats["acceptance_rate"], "tokens_per_forward": stats["tokens_per_forward"],
+                "greedy_sec": greedy_sec, "assisted_sec": assisted_sec, "speedup": greedy_sec / assisted_sec,
+                "est_speedup": stats["est_speedup"],
+            })
+    return results
+
+
+def main():
+    from rag.bench_cpu import benchmark_prompts
+    from rag.pipeline import PipelineConfig, load_draft_model, load_generator
+
+    parser = argparse.ArgumentParser(description="보조 디코딩 vs greedy 출력 일치/수락률/속도 비교")
+    parser.add_argument("--model-path", default=PipelineConfig().model_path)
+    parser.add_argument("--draft-model-path", default=PipelineConfig().draft_model_path)
+    parser.add_argument("--num-assistant-tokens", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--causal-lm", action="store_true", help="본 모델도 AutoModelForCausalLM 으로 CPU 에 로드 (텍스트 전용 체크포인트)")
+    parser.add_argument("--output", default=None, help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+    if not args.draft_model_path:
+        parser.error("--draft-model-path 또는 GEMMA_DRAFT_MODEL_PATH 가 필요합니다.")
+
+    # greedy 실행의 prefill 이 접두사 캐시로 줄지 않도록 끔 (보조 디코딩은 접두사 캐시를 쓰지 않음)
+    config = PipelineConfig(model_path=args.model_path, draft_model_path=args.draft_model_path, prefix_cache_bytes=0)
+    if args.causal_lm:
+        from transformers import AutoModelForCausalLM, AutoProcessor
+
+        from rag.cpu_backend import load_cpu_model
+        from rag.generation import GemmaGenerator
+
+        config.device = "cpu"
+        model = load_cpu_model(args.model_path, config.quantization, num_threads=config.num_threads,
+                               model_cls=AutoModelForCausalLM)
+        generator = GemmaGenerator(model, AutoProcessor.from_pretrained(args.model_path),
+                                   assistant_model=load_draft_model(config))
+    else:
+        generator = load_generator(config)
+    with torch.inference_mode():
+        results = compare_with_greedy(generator, benchmark_prompts(config), args.num_assistant_tokens,
+                                      args.max_new_tokens)
+    for r in results:
+        print(f"[{r['prompt']:>7} n={r['num_assistant_tokens']}] 일치 {r['identical']}, 수락률 {r['acceptance_rate']:.2f}, "
+              f"forward 당 {r['tokens_per_forward']:.2f}토큰, greedy {r['greedy_sec']:.2f}초 → {r['assisted_sec']:.2f}초 "
+              f"({r['speedup']:.2f}배)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+동시 요청을 모아 한 번의 generate_batch 호출로 처리하는 동적 배처.
+
+첫 요청이 들어오면 max_wait_ms 동안(또는 max_batch_size 개가 찰 때까지) 뒤따르는 요청을 모은 뒤
+스레드에서 generate_batch 를 실행하고, 각 요청의 future 에 결과를 돌려줍니다.
+"""
+import asyncio
+import time
+
+
+class DynamicBatcher:
+    """
+    Args:
+        generate_batch (callable): 프롬프트 리스트 → 같은 순서의 결과 리스트. 블로킹 함수여도 됨.
+        max_batch_size (int): 한 번에 묶을 최대 요청 수.
+        max_wait_ms (float): 첫 요청 이후 추가 요청을 기다리는 최대 시간(ms).
+    """
+
+    def __init__(self, generate_batch, max_batch_size: int = 8, max_wait_ms: float = 50.0):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.requests = 0
+        self._queue = None
+        self._worker = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, prompt: str) -> str:
+        """프롬프트를 큐에 넣고 결과를 기다립니다."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            batch = [(prompt, future) for prompt, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            try:
+                results = await asyncio.to_thread(self.generate_batch, [prompt for prompt, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
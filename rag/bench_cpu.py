@@ -0,0 +1,121 @@
+"""
+CPU 에서 bf16 모델과 int8 동적 양자화 모델의 로드 시간, 최대 RSS, prefill/decode 속도를 요약/퀴즈 프롬프트로 비교합니다.
+변형마다 별도 프로세스에서 측정하므로 최대 RSS 가 서로 섞이지 않습니다.
+
+실행:
+    python -m rag.bench_cpu --model-path /models/gemma-3-4b-it --threads 8 --variants bf16 int8
+    python -m rag.bench_cpu --causal-lm --model-path <텍스트 전용 체크포인트> --max-new-tokens 32
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from rag.pipeline import PipelineConfig, build_quiz_messages, build_summary_messages
+from rag.profiling import peak_rss_mb
+
+VARIANTS = {"bf16": "none", "int8": "int8"}
+KEYWORDS = ["키르히호프 전류 법칙", "테브난 등가회로"]
+DEFAULT_CONTEXT = (
+    "키르히호프 전류 법칙(KCL)은 회로의 한 마디로 들어오는 전류의 합이 나가는 전류의 합과 같다는 법칙이다. "
+    "키르히호프 전압 법칙(KVL)은 닫힌 경로를 따라 전압 강하의 합이 0 이라는 법칙이다. "
+    "테브난 정리에 따르면 선형 회로는 하나의 전압원과 직렬 저항으로 이루어진 등가회로로 바꿀 수 있다."
+)
+
+
+def benchmark_prompts(config: PipelineConfig, context_chars: int = 2000) -> list:
+    """기존 요약/퀴즈 프롬프트 빌더로 측정용 프롬프트를 만듭니다. 문서가 있으면 앞부분을 문맥으로 사용합니다."""
+    path = Path(config.file_path)
+    context = path.read_text(encoding="utf-8")[:context_chars] if path.exists() else DEFAULT_CONTEXT
+    prompts = []
+    for keyword in KEYWORDS:
+        x = {"context": context, "image": "(이미지 없음)", "keyword": keyword}
+        prompts.append(("summary", build_summary_messages(x)))
+        prompts.append(("quiz", build_quiz_messages(x)))
+    return prompts
+
+
+def run_variant(variant: str, model_path: str, num_threads: int | None, max_new_tokens: int, causal_lm: bool) -> dict:
+    """현재 프로세스에서 한 변형을 로드하고 프롬프트마다 생성 속도를 측정합니다."""
+    from transformers import AutoProcessor
+
+    from rag.cpu_backend import load_cpu_model
+    from rag.generation import GemmaGenerator
+
+    model_cls = None
+    if causal_lm:
+        from transformers import AutoModelForCausalLM as model_cls
+
+    start = time.perf_counter()
+    model = load_cpu_model(model_path, quantization=VARIANTS[variant], num_threads=num_threads, model_cls=model_cls)
+    processor = AutoProcessor.from_pretrained(model_path)
+    load_sec = time.perf_counter() - start
+    # 접두사 캐시 없이 측정해야 프롬프트마다 전체 prefill 시간이 잡힘
+    generator = GemmaGenerator(model, processor, max_new_tokens=max_new_tokens, prefix_cache=None)
+
+    runs = []
+    for name, prompt in benchmark_prompts(PipelineConfig()):
+        stats = {}
+        for _ in generator.stream(prompt, stats=stats, do_sample=False):
+            pass
+        ttft = stats["ttft_sec"] or stats["total_sec"]
+        decode_sec = stats["total_sec"] - ttft
+        runs.append({
+            "prompt": name,
+            "prompt_tokens": int(stats["prompt_tokens"]),
+            "new_tokens": stats["new_tokens"],
+            "prefill_tok_per_sec": stats["prompt_tokens"] / ttft if ttft > 0 else 0.0,
+            # 첫 토큰은 prefill 에 포함되므로 나머지 토큰으로 decode 속도 계산
+            "decode_tok_per_sec": (stats["new_tokens"] - 1) / decode_sec if decode_sec > 0 else 0.0,
+        })
+    mean = lambda key: sum(r[key] for r in runs) / len(runs)
+    return {
+        "variant": variant, "load_sec": load_sec, "peak_rss_mb": peak_rss_mb(),
+        "prefill_tok_per_sec": mean("prefill_tok_per_sec"), "decode_tok_per_sec": mean("decode_tok_per_sec"),
+        "runs": runs,
+    }
+
+
+def run_in_subprocess(variant: str, args) -> dict:
+    command = [sys.executable, "-m", "rag.bench_cpu", "--worker", variant, "--model-path", args.model_path,
+               "--max-new-tokens", str(args.max_new_tokens)]
+    if args.threads:
+        command += ["--threads", str(args.threads)]
+    if args.causal_lm:
+        command.append("--causal-lm")
+    completed = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True)
+    # 워커는 마지막 줄에 결과 JSON 을 출력
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU bf16 vs int8 동적 양자화 생성 속도 비교")
+    parser.add_argument("--model-path", default=PipelineConfig().model_path)
+    parser.add_argument("--threads", type=int, default=None, help="intra-op 스레드 수 (기본: PyTorch 기본값)")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--causal-lm", action="store_true", help="AutoModelForCausalLM 으로 로드 (텍스트 전용 체크포인트)")
+    parser.add_argument("--output", default=None, help="결과 JSON 저장 경로")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_variant(args.worker, args.model_path, args.threads, args.max_new_tokens, args.causal_lm)
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    results = []
+    for variant in args.variants:
+        result = run_in_subprocess(variant, args)
+        results.append(result)
+        print(f"[{variant:>4}] 로드 {result['load_sec']:.1f}초, 최대 RSS {result['peak_rss_mb']:.0f}MB, "
+              f"prefill {result['prefill_tok_per_sec']:.1f} tok/s, decode {result['decode_tok_per_sec']:.1f} tok/s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+stub 생성기/임베딩과 합성 코퍼스로 RAG 파이프라인 전체를 재현 가능하게 측정하는 벤치마크.
+
+실제 Gemma/KoE5/CLIP 대신 rag.stubs 의 결정적 구성요소를 넣고, 나머지(과목별 ingest, BM25+FAISS 하이브리드 검색,
+검색 캐시, LCEL 체인, 이미지 디코딩)는 실제 코드를 그대로 실행합니다. GPU 와 네트워크 없이 돌아가며,
+결과는 커밋 해시와 함께 JSON 으로 저장되므로 --baseline 으로 이전 커밋 결과와 비교할 수 있습니다.
+
+측정 항목:
+    ingest     과목별 콜드 ingest(분할 + 임베딩 + 인덱스 저장) 시간과 청크 수, 웜 스타트 로드 시간
+    retrieval  하이브리드 검색 단건 QPS 와 batch_search QPS
+    e2e        키워드 → 요약 → 퀴즈 체인 지연 (반복마다 검색 캐시를 비운 콜드 상태)
+    memory     단계별 최대 RSS
+
+실행:
+    python -m rag.bench_pipeline --subjects 2 --docs 20 --output bench_pipeline.json
+    python -m rag.bench_pipeline --output new.json --baseline bench_pipeline.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rag.bench_retrieval import synthetic_corpus
+from rag.corpus import ingest_subject, scan_subject
+from rag.profiling import peak_rss_mb
+from rag.stubs import StubEmbeddings, StubGenerator, StubImageRetriever
+from rag.tracing import tracer
+
+
+def write_synthetic_corpus(root: Path, num_subjects: int, docs_per_subject: int, sections_per_doc: int = 8,
+                           images_per_subject: int = 4, seed: int = 0) -> list:
+    """
+    <root>/<과목>/*.md 와 figures/*.png 로 된 합성 코퍼스를 만듭니다.
+
+    Returns:
+        list: 과목명 목록.
+    """
+    from PIL import Image
+
+    paragraphs, vocab = synthetic_corpus(num_subjects * docs_per_subject * sections_per_doc, seed=seed)
+    rng = random.Random(seed)
+    subjects = [f"과목{i:02d}" for i in range(num_subjects)]
+    index = 0
+    for subject in subjects:
+        subject_dir = root / subject
+        (subject_dir / "figures").mkdir(parents=True, exist_ok=True)
+        for d in range(docs_per_subject):
+            sections = []
+            for s in range(sections_per_doc):
+                sections.append(f"## {rng.choice(vocab)} {s}\n\n{paragraphs[index]}\n")
+                index += 1
+            (subject_dir / f"{d:03d}.md").write_text(f"# 문서 {d}\n\n" + "\n".join(sections), encoding="utf-8")
+        for i in range(images_per_subject):
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new("RGB", (224, 224), color).save(subject_dir / "figures" / f"{i:02d}.png")
+    return subjects
+
+
+def _percentiles(times_ms: list) -> dict:
+    return {
+        "mean_ms": float(np.mean(times_ms)), "p50_ms": float(np.median(times_ms)),
+        "p95_ms": float(np.percentile(times_ms, 95)), "max_ms": float(np.max(times_ms)),
+    }
+
+
+def bench_ingest(corpus_dir: Path, subjects: list, embeddings, settings: dict, cache_dir: Path, workers: int) -> tuple:
+    """과목마다 콜드 ingest 와 웜 스타트(캐시 로드)를 측정합니다. Returns: (결과 dict, 과목 → TextIndex)"""
+    result = {"subjects": {}, "total_chunks": 0}
+    indexes = {}
+    cold_total = 0.0
+    for subject in subjects:
+        files = scan_subject(str(corpus_dir), subject)
+        start = time.perf_counter()
+        text_index = ingest_subject(files, embeddings, settings, workers=workers, cache_dir=cache_dir)
+        cold_sec = time.perf_counter() - start
+        start = time.perf_counter()
+        indexes[subject] = ingest_subject(files, embeddings, settings, workers=workers, cache_dir=cache_dir)
+        warm_sec = time.perf_counter() - start
+        chunks = len(text_index.split_docs)
+        result["subjects"][subject] = {"chunks": chunks, "cold_sec": cold_sec, "warm_sec": warm_sec}
+        result["total_chunks"] += chunks
+        cold_total += cold_sec
+    result["cold_sec"] = cold_total
+    result["chunks_per_sec"] = result["total_chunks"] / cold_total if cold_total else 0.0
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result, indexes
+
+
+def bench_retrieval(indexes: dict, num_queries: int, seed: int = 1) -> dict:
+    from rag.pipeline import make_hybrid_retriever
+
+    rng = random.Random(seed)
+    times, batch_sec, total_queries = [], 0.0, 0
+    for text_index in indexes.values():
+        retriever = make_hybrid_retriever(text_index)
+        words = [w for d in text_index.split_docs[:200] for w in d.page_content.split()]
+        queries = [" ".join(rng.sample(words, 3)) for _ in range(num_queries)]
+        for query in queries:
+            start = time.perf_counter()
+            retriever.invoke(query)
+            times.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        retriever.batch_search(queries)
+        batch_sec += time.perf_counter() - start
+        total_queries += len(queries)
+    return {
+        "queries": total_queries, "qps": 1000 * len(times) / sum(times), "latency": _percentiles(times),
+        "batch_qps": total_queries / batch_sec if batch_sec else 0.0, "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_e2e(indexes: dict, corpus_dir: Path, iterations: int) -> dict:
+    """
+    과목마다 키워드 → (키워드별) 요약 → 퀴즈 체인을 실행합니다. 반복마다 검색 캐시를 새로 만들어 검색을 매번 수행합니다.
+    """
+    from rag.pipeline import RagPipeline, make_hybrid_retriever
+    from rag.retrieval_cache import RetrievalCache
+
+    generator = StubGenerator("bench")
+    stage_times = {"keywords": [], "summary": [], "quiz": [], "total": []}
+    for subject, text_index in indexes.items():
+        hybrid = make_hybrid_retriever(text_index)
+        images = StubImageRetriever(image_uris=[str(p) for p in scan_subject(str(corpus_dir), subject).images])
+        for i in range(iterations):
+            pipeline = RagPipeline(RetrievalCache(hybrid, images, index_version=f"{subject}-{i}"), generator)
+            run_start = time.perf_counter()
+            start = time.perf_counter()
+            keywords = pipeline.extract_keywords("강의 핵심 키워드 추출")
+            stage_times["keywords"].append((time.perf_counter() - start) * 1000)
+            for keyword in keywords:
+                start = time.perf_counter()
+                pipeline.summary_chain.invoke({"keyword": keyword})
+                stage_times["summary"].append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                pipeline.quiz_chain.invoke({"keyword": keyword})
+                stage_times["quiz"].append((time.perf_counter() - start) * 1000)
+            stage_times["total"].append((time.perf_counter() - run_start) * 1000)
+    result = {name: _percentiles(times) for name, times in stage_times.items()}
+    result["runs"] = len(stage_times["total"])
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    # 청크 크기/분할 방식은 실제 설정과 같은 키를 쓰되, tiktoken 인코딩 다운로드가 필요 없는 글자 단위 분할 사용
+    settings = {"splitter": "recursive", "chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap,
+                "embedding_model": f"stub-{args.dim}", "sparse": "bm25-csr"}
+    if args.dense_index != "flat":
+        settings["dense"] = {"kind": args.dense_index}
+    embeddings = StubEmbeddings(size=args.dim)
+    if args.trace:
+        tracer.enable()
+
+    with tempfile.TemporaryDirectory(prefix="rag_bench_") as tmp:
+        tmp = Path(tmp)
+        corpus_dir, cache_dir = tmp / "corpus", tmp / "cache"
+        start = time.perf_counter()
+        subjects = write_synthetic_corpus(corpus_dir, args.subjects, args.docs, args.sections, seed=args.seed)
+        corpus_sec = time.perf_counter() - start
+
+        ingest, indexes = bench_ingest(corpus_dir, subjects, embeddings, settings, cache_dir, args.workers)
+        retrieval = bench_retrieval(indexes, args.queries, seed=args.seed + 1)
+        e2e = bench_e2e(indexes, corpus_dir, args.iterations)
+
+    result = {
+        "meta": {
+            "commit": _git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "machine": platform.machine(), "args": vars(args), "corpus_sec": corpus_sec,
+        },
+        "ingest": ingest,
+        "retrieval": retrieval,
+        "e2e": e2e,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if args.trace:
+        result["trace"] = tracer.snapshot()
+    return result
+
+
+# 비교할 지표 (경로, 클수록 좋은지)
+REGRESSION_METRICS = [
+    (("ingest", "chunks_per_sec"), True),
+    (("retrieval", "qps"), True),
+    (("retrieval", "batch_qps"), True),
+    (("e2e", "total", "p50_ms"), False),
+    (("e2e", "summary", "p50_ms"), False),
+    (("e2e", "quiz", "p50_ms"), False),
+    (("peak_rss_mb",), False),
+]
+
+
+def compare(result: dict, baseline: dict, tolerance: float = 0.1) -> list:
+    """
+    기준 결과 대비 주요 지표의 변화율을 계산합니다. tolerance 보다 나빠진 지표는 regression=True.
+
+    Returns:
+        list: {"metric", "baseline", "current", "change", "regression"} 리스트.
+    """
+    rows = []
+    for path, higher_is_better in REGRESSION_METRICS:
+        current, base = result, baseline
+        for key in path:
+            current = current.get(key) if isinstance(current, dict) else None
+            base = base.get(key) if isinstance(base, dict) else None
+        if not current or not base:
+            continue
+        change = current / base - 1
+        worse = -change if higher_is_better else change
+        rows.append({"metric": ".".join(path), "baseline": base, "current": current, "change": change,
+                     "regression": worse > tolerance})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="stub 모델 + 합성 코퍼스 RAG 파이프라인 벤치마크")
+    parser.add_argument("--subjects", type=int, default=2)
+    parser.add_argument("--docs", type=int, default=20, help="과목당 Markdown 파일 수")
+    parser.add_argument("--sections", type=int, default=8, help="파일당 섹션 수")
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=256, help="stub 임베딩 차원")
+    parser.add_argument("--dense-index", default="flat", help="밀집 인덱스 종류 (rag.dense_index)")
+    parser.add_argument("--workers", type=int, default=1, help="ingest 분할 프로세스 수")
+    parser.add_argument("--queries", type=int, default=200, help="과목당 검색 질의 수")
+    parser.add_argument("--iterations", type=int, default=5, help="과목당 키워드→요약→퀴즈 반복 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", action="store_true", help="rag.tracing 단계별 히스토그램도 결과에 포함")
+    parser.add_argument("--output", default="bench_pipeline.json", help="결과 JSON 저장 경로")
+    parser.add_argument("--baseline", default=None, help="비교할 이전 결과 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="회귀로 볼 상대 악화 비율")
+    args = parser.parse_args()
+
+    result = run(args)
+    ingest, retrieval, e2e = result["ingest"], result["retrieval"], result["e2e"]
+    print(f"ingest: {ingest['total_chunks']}개 청크, {ingest['cold_sec']:.2f}초 ({ingest['chunks_per_sec']:.0f} 청크/초)")
+    print(f"retrieval: {retrieval['qps']:.0f} QPS (p95 {retrieval['latency']['p95_ms']:.2f}ms), "
+          f"batch {retrieval['batch_qps']:.0f} QPS")
+    print(f"e2e: 키워드→요약→퀴즈 p50 {e2e['total']['p50_ms']:.1f}ms, p95 {e2e['total']['p95_ms']:.1f}ms "
+          f"({e2e['runs']}회)")
+    print(f"최대 RSS: {result['peak_rss_mb']:.0f}MB")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows = compare(result, json.load(f), args.tolerance)
+        result["comparison"] = rows
+        for row in rows:
+            mark = "회귀" if row["regression"] else "ok"
+            print(f"  {row['metric']:<22} {row['baseline']:.3f} → {row['current']:.3f} ({row['change']:+.1%}) {mark}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
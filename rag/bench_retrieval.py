@@ -0,0 +1,109 @@
+"""
+합성 코퍼스로 기존 EnsembleRetriever(BM25Retriever + FAISS) 와 HybridRetriever(BM25Index + FAISS) 의
+질의 지연 시간을 청크 수별로 비교합니다. 밀집 임베딩은 난수 벡터와 DeterministicFakeEmbedding 으로 대신합니다.
+
+실행:
+    python -m rag.bench_retrieval --sizes 1000 10000 100000 --queries 20
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from rag.index_cache import build_faiss_store
+from rag.sparse import HybridRetriever, SparseBM25Retriever, tokenize_ko
+
+SYLLABLES = "가나다라마바사아자차카타파하전압류저항회로기소자등가원리법칙신호주파수위상"
+JOSA = ["", "은", "는", "을", "를", "의", "에서", "으로", "과"]
+
+
+def synthetic_corpus(num_chunks: int, vocab_size: int = 20000, words_per_chunk: int = 60, seed: int = 0) -> tuple:
+    """Zipf 분포로 단어를 뽑아 청크 텍스트를 만듭니다. Returns: (청크 리스트, 단어 리스트)"""
+    rng = random.Random(seed)
+    vocab = list({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))) for _ in range(vocab_size)})
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    np_rng = np.random.default_rng(seed)
+    word_ids = np_rng.choice(len(vocab), size=(num_chunks, words_per_chunk), p=weights / weights.sum())
+    texts = [" ".join(vocab[w] + JOSA[w % len(JOSA)] for w in row) for row in word_ids]
+    return texts, vocab
+
+
+def _latency(fn, queries: list) -> dict:
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        times.append((time.perf_counter() - start) * 1000)
+    return {"mean_ms": float(np.mean(times)), "p50_ms": float(np.median(times)), "p95_ms": float(np.percentile(times, 95))}
+
+
+def run(num_chunks: int, num_queries: int, dim: int, k: int, skip_ensemble: bool) -> dict:
+    try:
+        from langchain.retrievers.ensemble import EnsembleRetriever
+    except ImportError:
+        from langchain_classic.retrievers.ensemble import EnsembleRetriever
+    from langchain_community.retrievers import BM25Retriever
+
+    texts, vocab = synthetic_corpus(num_chunks)
+    docs = [Document(page_content=t) for t in texts]
+    rng = np.random.default_rng(1)
+    queries = [" ".join(rng.choice(vocab[:2000], size=3)) for _ in range(num_queries)]
+
+    embeddings = DeterministicFakeEmbedding(size=dim)
+    vectors = rng.standard_normal((num_chunks, dim), dtype=np.float32)
+    faiss_store = build_faiss_store(docs, vectors, embeddings)
+    result = {"chunks": num_chunks, "queries": num_queries}
+
+    start = time.perf_counter()
+    sparse = SparseBM25Retriever.from_documents(docs, k=k)
+    result["hybrid_build_sec"] = time.perf_counter() - start
+    hybrid = HybridRetriever(sparse_retriever=sparse, faiss_store=faiss_store, k=k, weights=[0.3, 0.7])
+    result["hybrid"] = _latency(hybrid.invoke, queries)
+    start = time.perf_counter()
+    hybrid.batch_search(queries)
+    result["hybrid_batch_ms_per_query"] = (time.perf_counter() - start) * 1000 / num_queries
+
+    if not skip_ensemble:
+        # 비교를 위해 기존 BM25Retriever 에도 같은 토크나이저를 사용
+        start = time.perf_counter()
+        bm25 = BM25Retriever.from_documents(docs, preprocess_func=tokenize_ko)
+        result["ensemble_build_sec"] = time.perf_counter() - start
+        bm25.k = k
+        ensemble = EnsembleRetriever(
+            retrievers=[bm25, faiss_store.as_retriever(search_kwargs={"k": k})], weights=[0.3, 0.7],
+        )
+        result["ensemble"] = _latency(ensemble.invoke, queries)
+        result["speedup"] = result["ensemble"]["mean_ms"] / result["hybrid"]["mean_ms"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EnsembleRetriever vs HybridRetriever 질의 지연 비교")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=1)
+    parser.add_argument("--skip-ensemble", action="store_true", help="기존 앙상블 측정 생략 (큰 코퍼스용)")
+    parser.add_argument("--output", default=None, help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        result = run(size, args.queries, args.dim, args.k, args.skip_ensemble)
+        results.append(result)
+        line = f"[{size:>7}개 청크] hybrid {result['hybrid']['mean_ms']:.2f}ms (배치 {result['hybrid_batch_ms_per_query']:.2f}ms/질의)"
+        if "ensemble" in result:
+            line += f", ensemble {result['ensemble']['mean_ms']:.2f}ms, {result['speedup']:.1f}배"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+과목별로 분할된(파티션) 코퍼스 ingest 와 과목 라우팅.
+
+코퍼스 디렉토리는 과목마다 하위 디렉토리를 두고, 그 안의 Markdown 과 이미지를 재귀적으로 읽습니다.
+
+    data/subjects/
+        회로이론1/  01_기초.md  02_정리.md  figures/*.png
+        확률변수/   ...
+
+과목 디렉토리는 하나씩 차례로 스트리밍되며(한 번에 한 과목의 청크만 메모리에 올림), 파일 분할은 프로세스 풀에서 병렬로 하고
+임베딩은 바뀐 청크만 배치로 계산합니다. 과목마다 .rag_cache/text/<과목>/ 아래에 독립된 FAISS/BM25 파티션이 생기므로
+과목을 추가해도 질의 비용은 그 과목의 파티션 크기에만 비례하고, 한 과목만 다시 인덱싱할 수 있습니다.
+
+실행:
+    python -m rag.corpus --corpus-dir data/subjects                        # 바뀐 과목만 다시 인덱싱
+    python -m rag.corpus --corpus-dir data/subjects --subjects 회로이론1 --force
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from rag.index_cache import CACHE_DIR, build_text_index, load_text_index, sha256_text, split_markdown_sections
+from rag.profiling import report_stage
+
+TEXT_SUFFIXES = {".md", ".markdown"}
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+
+
+@dataclass
+class SubjectFiles:
+    subject: str
+    root: Path
+    documents: list
+    images: list
+
+
+def _walk(root: Path):
+    """os.scandir 로 디렉토리를 재귀 순회하며 파일 경로를 이름순으로 하나씩 내보냅니다."""
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk(Path(entry.path))
+        elif entry.is_file():
+            yield Path(entry.path)
+
+
+def scan_subject(corpus_dir: str, subject: str) -> SubjectFiles:
+    root = Path(corpus_dir) / subject
+    documents, images = [], []
+    for path in _walk(root):
+        suffix = path.suffix.lower()
+        if suffix in TEXT_SUFFIXES:
+            documents.append(path)
+        elif suffix in IMAGE_SUFFIXES:
+            images.append(path)
+    return SubjectFiles(subject, root, documents, images)
+
+
+def list_subjects(corpus_dir: str) -> list:
+    return sorted(p.name for p in Path(corpus_dir).iterdir() if p.is_dir() and not p.name.startswith("."))
+
+
+def iter_corpus(corpus_dir: str, subjects: list | None = None):
+    """과목별 파일 목록을 한 과목씩 내보냅니다."""
+    for subject in subjects or list_subjects(corpus_dir):
+        yield scan_subject(corpus_dir, subject)
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def partition_fingerprint(files: SubjectFiles, settings: dict) -> str:
+    """과목의 Markdown 파일 경로/내용 해시와 설정으로 파티션 키를 만듭니다 (파일을 분할하지 않고 계산)."""
+    manifest = [(path.relative_to(files.root).as_posix(), _file_digest(path)) for path in files.documents]
+    return sha256_text(json.dumps({"settings": settings, "files": manifest}, sort_keys=True, ensure_ascii=False))
+
+
+def make_splitter(kind: str, chunk_size: int, chunk_overlap: int):
+    """
+    settings['splitter'] 에 맞는 TextSplitter. 'token' 은 tiktoken 토큰 단위(인코딩 파일이 필요),
+    'recursive' 는 글자 단위라 네트워크 없이 동작합니다 (벤치마크/테스트용).
+    """
+    if kind == "recursive":
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    from langchain_text_splitters import TokenTextSplitter
+
+    return TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def chunk_markdown_file(path: str, root: str, subject: str, chunk_size: int, chunk_overlap: int,
+                        splitter: str = "token") -> list:
+    """
+    Markdown 파일 하나를 섹션 → 청크로 자릅니다. 프로세스 풀 워커에서 실행됩니다.
+
+    Returns:
+        list: (청크 텍스트, 메타데이터) 튜플 리스트.
+    """
+    splitter = make_splitter(splitter, chunk_size, chunk_overlap)
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    source = Path(path).relative_to(root).as_posix()
+    return [
+        (chunk, {"subject": subject, "source": source})
+        for section in split_markdown_sections(text)
+        for chunk in splitter.split_text(section)
+    ]
+
+
+def chunk_subject(files: SubjectFiles, chunk_size: int, chunk_overlap: int, pool: ProcessPoolExecutor | None,
+                  splitter: str = "token") -> list:
+    """과목의 Markdown 파일들을 (가능하면 프로세스 풀에서) 청크 Document 리스트로 만듭니다. 파일 순서는 유지됩니다."""
+    args = [(str(p), str(files.root), files.subject, chunk_size, chunk_overlap, splitter) for p in files.documents]
+    if pool is None:
+        results = (chunk_markdown_file(*a) for a in args)
+    else:
+        results = pool.map(chunk_markdown_file, *zip(*args)) if args else []
+    return [Document(page_content=text, metadata=metadata) for chunks in results for text, metadata in chunks]
+
+
+def ingest_subject(files: SubjectFiles, embeddings, settings: dict, pool: ProcessPoolExecutor | None = None,
+                   workers: int = 1, cache_dir: Path = CACHE_DIR, force: bool = False):
+    """
+    과목 하나의 텍스트 파티션을 로드하거나(내용이 같으면) 다시 만듭니다.
+
+    Args:
+        files (SubjectFiles): scan_subject 결과.
+        embeddings: LangChain Embeddings 객체.
+        settings (dict): chunk_size, chunk_overlap, embedding_model 등 인덱스 설정.
+        pool (ProcessPoolExecutor | None): 파일 분할에 쓸 프로세스 풀.
+        workers (int): pool 이 없을 때 다시 만들어야 하면 띄울 분할 프로세스 수 (1 이면 현재 프로세스에서 분할).
+        cache_dir (Path): 캐시 루트 디렉토리.
+        force (bool): 캐시가 있어도 다시 만듭니다. 청크 임베딩 캐시는 그대로 재사용합니다.
+
+    Returns:
+        TextIndex | None: 과목의 텍스트 인덱스. Markdown 이 없으면 None.
+    """
+    if not files.documents:
+        print(f"'{files.subject}' 과목에 Markdown 파일이 없습니다: {files.root}")
+        return None
+    fingerprint = partition_fingerprint(files, settings)
+    index_dir = Path(cache_dir) / "text" / files.subject / fingerprint[:16]
+    if force and index_dir.exists():
+        shutil.rmtree(index_dir)
+    text_index = load_text_index(index_dir, embeddings, fingerprint)
+    if text_index is not None:
+        return text_index
+
+    with report_stage(f"{files.subject} 텍스트 ingest"):
+        split_args = (settings["chunk_size"], settings["chunk_overlap"])
+        splitter = settings.get("splitter", "token")
+        if pool is None and workers > 1 and len(files.documents) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(files.documents))) as pool:
+                split_docs = chunk_subject(files, *split_args, pool, splitter=splitter)
+        else:
+            split_docs = chunk_subject(files, *split_args, pool, splitter=splitter)
+        return build_text_index(split_docs, embeddings, fingerprint, files.subject, settings, cache_dir)
+
+
+def image_collection_name(subject: str) -> str:
+    # Chroma 컬렉션 이름은 영문/숫자만 허용하므로 과목명 해시를 사용
+    return f"images_{sha256_text(subject)[:12]}"
+
+
+class SubjectRouter:
+    """
+    과목명 → 그 과목 파티션만 검색하는 RagPipeline.
+
+    파티션은 처음 요청될 때 로드(캐시가 없거나 낡았으면 ingest)하고, 생성기와 임베딩 모델은 모든 과목이 공유합니다.
+
+    Args:
+        config (PipelineConfig): corpus_dir 가 지정된 설정.
+        generator: 모든 과목이 공유할 생성기.
+    """
+
+    def __init__(self, config, generator):
+        self.config = config
+        self.generator = generator
+        self._pipelines = {}
+        self._lock = threading.Lock()
+        self._subject_locks = {}
+        self._text_embeddings = None
+        self._clip_embeddings = None
+        self._response_cache = None
+
+    def subjects(self) -> list:
+        return list_subjects(self.config.corpus_dir)
+
+    def _embeddings(self) -> tuple:
+        from rag.pipeline import load_clip_embeddings, load_text_embeddings
+
+        with self._lock:
+            if self._text_embeddings is None:
+                self._text_embeddings = load_text_embeddings(self.config)
+                self._clip_embeddings = load_clip_embeddings(self.config)
+        return self._text_embeddings, self._clip_embeddings
+
+    def _response_cache_for(self, text_embeddings):
+        """모든 과목이 공유하는 응답 캐시 (키에 과목별 인덱스 버전이 들어가므로 과목끼리 섞이지 않음)."""
+        from rag.pipeline import build_response_cache
+
+        with self._lock:
+            if self._response_cache is None:
+                self._response_cache = build_response_cache(self.config, text_embeddings)
+        return self._response_cache
+
+    def _build(self, subject: str, force: bool = False):
+        from rag.pipeline import (RagPipeline, build_image_retriever, generation_settings, make_hybrid_retriever,
+                                  text_index_settings)
+        from rag.retrieval_cache import RetrievalCache
+
+        if not (Path(self.config.corpus_dir) / subject).is_dir():
+            raise KeyError(f"'{subject}' 과목 디렉토리가 없습니다: {self.config.corpus_dir}")
+        files = scan_subject(self.config.corpus_dir, subject)
+        text_embeddings, clip_embeddings = self._embeddings()
+        text_index = ingest_subject(
+            files, text_embeddings, text_index_settings(self.config), workers=self.config.ingest_workers, force=force,
+        )
+        if text_index is None:
+            raise KeyError(f"'{subject}' 과목에 인덱싱할 문서가 없습니다.")
+
+        image_retriever, image_version = None, "none"
+        if files.images:
+            image_retriever, image_version = build_image_retriever(
+                self.config, [str(p) for p in files.images], collection_name=image_collection_name(subject),
+                cache_dir=CACHE_DIR / "images" / subject, clip_embeddings=clip_embeddings,
+            )
+        retrieval_cache = RetrievalCache(
+            make_hybrid_retriever(text_index), image_retriever,
+            index_version=f"{subject}-{text_index.fingerprint[:16]}-{image_version}",
+        )
+        return RagPipeline(retrieval_cache, self.generator, response_cache=self._response_cache_for(text_embeddings),
+                           generation_settings=generation_settings(self.config))
+
+    def pipeline(self, subject: str):
+        """과목의 RagPipeline 을 반환합니다. 없는 과목이면 KeyError."""
+        if subject not in self._pipelines:
+            with self._lock:
+                subject_lock = self._subject_locks.setdefault(subject, threading.Lock())
+            with subject_lock:
+                if subject not in self._pipelines:
+                    self._pipelines[subject] = self._build(subject)
+        return self._pipelines[subject]
+
+    def reindex(self, subject: str):
+        """한 과목만 다시 인덱싱하고 그 과목의 파이프라인을 교체합니다. 다른 과목은 건드리지 않습니다."""
+        pipeline = self._build(subject, force=True)
+        self._pipelines[subject] = pipeline
+        return pipeline
+
+
+def build_subject_router(config, generator=None) -> SubjectRouter:
+    """config.corpus_dir 의 과목별 파티션을 쓰는 라우터를 만듭니다. 파티션은 과목이 처음 요청될 때 로드됩니다."""
+    from rag.pipeline import load_generator
+
+    return SubjectRouter(config, generator or load_generator(config))
+
+
+def ingest_corpus(config, subjects: list | None = None, force: bool = False) -> dict:
+    """
+    코퍼스의 과목들을 차례로 ingest 합니다 (텍스트 + 이미지).
+
+    Returns:
+        dict: 과목명 → 텍스트 파티션 fingerprint.
+    """
+    from rag.pipeline import build_image_retriever, load_clip_embeddings, load_text_embeddings, text_index_settings
+
+    text_embeddings = load_text_embeddings(config)
+    clip_embeddings = None
+    settings = text_index_settings(config)
+    fingerprints = {}
+    with ProcessPoolExecutor(max_workers=config.ingest_workers) as pool:
+        for files in iter_corpus(config.corpus_dir, subjects):
+            text_index = ingest_subject(files, text_embeddings, settings, pool, force=force)
+            if text_index is None:
+                continue
+            fingerprints[files.subject] = text_index.fingerprint
+            if files.images:
+                clip_embeddings = clip_embeddings or load_clip_embeddings(config)
+                build_image_retriever(
+                    config, [str(p) for p in files.images], collection_name=image_collection_name(files.subject),
+                    cache_dir=CACHE_DIR / "images" / files.subject, clip_embeddings=clip_embeddings,
+                )
+    return fingerprints
+
+
+def main():
+    from rag.pipeline import PipelineConfig
+
+    parser = argparse.ArgumentParser(description="과목별 코퍼스 ingest")
+    parser.add_argument("--corpus-dir", default=os.environ.get("RAG_CORPUS_DIR", "data/subjects"))
+    parser.add_argument("--subjects", nargs="*", default=None, help="인덱싱할 과목 (기본: 전체)")
+    parser.add_argument("--workers", type=int, default=4, help="파일 분할 프로세스 수")
+    parser.add_argument("--force", action="store_true", help="내용이 같아도 다시 인덱싱")
+    args = parser.parse_args()
+
+    config = PipelineConfig(corpus_dir=args.corpus_dir, ingest_workers=args.workers)
+    fingerprints = ingest_corpus(config, args.subjects, force=args.force)
+    for subject, fingerprint in fingerprints.items():
+        print(f"{subject}: {fingerprint[:16]}")
+
+
+if __name__ == "__main__":
+    main()
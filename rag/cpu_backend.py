@@ -0,0 +1,97 @@
+"""
+GPU 가 없는 노드에서 Gemma 를 돌리기 위한 CPU 백엔드.
+
+CPU 에서 bf16 행렬곱은 AMX 가 없는 대부분의 서버에서 느리므로, Linear 레이어를 int8 동적 양자화
+(가중치 int8, 활성값은 호출마다 양자화)해 메모리 대역폭과 연산량을 줄입니다. 양자화된 Linear 는 float32 입력을 받으므로
+나머지 레이어(임베딩, 정규화)는 float32 로 둡니다.
+
+설정 (PipelineConfig 또는 환경 변수):
+    RAG_DEVICE=cpu              CPU 에 로드 (기본 auto: device_map="auto")
+    RAG_QUANTIZATION=int8       Linear 레이어 int8 동적 양자화 (CPU 전용)
+    RAG_NUM_THREADS=8           intra-op 스레드 수
+"""
+import os
+import time
+
+import torch
+
+
+def configure_threads(num_threads: int | None = None, interop_threads: int | None = None):
+    """
+    PyTorch CPU 스레드 수를 설정합니다. None 이면 기본값(물리 코어 수)을 그대로 둡니다.
+    inter-op 스레드 수는 첫 병렬 연산 전에만 바꿀 수 있으므로 모델 로드 전에 호출해야 합니다.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+        os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            print("inter-op 스레드 수는 병렬 연산이 시작된 뒤에는 바꿀 수 없어 그대로 둡니다.")
+
+
+def _quantized_engine() -> str:
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):  # ARM 에서는 qnnpack 만 지원
+        if engine in engines:
+            return engine
+    raise RuntimeError(f"int8 동적 양자화를 지원하는 엔진이 없습니다: {engines}")
+
+
+def quantize_linear_int8(model: torch.nn.Module, skip: tuple = ("vision_tower", "multi_modal_projector")) -> torch.nn.Module:
+    """
+    모델의 nn.Linear 를 하나씩 float32 로 올린 뒤 바로 int8 동적 양자화 Linear 로 바꿉니다.
+    레이어 단위로 바꾸므로 모델 전체를 float32 로 만든 뒤 양자화하는 것보다 최대 메모리가 작습니다.
+
+    Args:
+        model: bf16/float32 모델 (CPU).
+        skip (tuple): 이 이름이 경로에 들어간 모듈은 양자화하지 않음 (텍스트 프롬프트에서는 쓰이지 않는 비전 타워 등).
+
+    Returns:
+        torch.nn.Module: 같은 모델 객체 (제자리 변경). 양자화되지 않은 파라미터는 float32.
+    """
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    from torch.ao.quantization import default_dynamic_qconfig
+
+    torch.backends.quantized.engine = _quantized_engine()
+    for name, parent in list(model.named_modules()):
+        if any(part in name for part in skip):
+            continue
+        for child_name, child in list(parent.named_children()):
+            if type(child) is not torch.nn.Linear:
+                continue
+            child.float()
+            child.qconfig = default_dynamic_qconfig
+            setattr(parent, child_name, DynamicQuantizedLinear.from_float(child))
+    return model.float()
+
+
+def load_cpu_model(model_path: str, quantization: str = "none", dtype=torch.bfloat16, num_threads: int | None = None,
+                   model_cls=None):
+    """
+    모델을 CPU 에 로드합니다.
+
+    Args:
+        model_path (str): 모델 디렉토리.
+        quantization (str): 'none' 또는 'int8'.
+        dtype: 양자화하지 않을 때의 가중치 dtype (bf16 또는 float32).
+        num_threads (int | None): intra-op 스레드 수.
+        model_cls: from_pretrained 를 가진 모델 클래스. None 이면 Gemma3ForConditionalGeneration.
+
+    Returns:
+        모델 (eval 모드).
+    """
+    if quantization not in ("none", "int8"):
+        raise ValueError(f"quantization 은 'none' 또는 'int8' 이어야 합니다: {quantization}")
+    configure_threads(num_threads)
+    if model_cls is None:
+        from transformers import Gemma3ForConditionalGeneration as model_cls
+
+    start = time.perf_counter()
+    # device_map 없이 읽으면 CPU 에 로드됨. int8 은 bf16 으로 읽은 뒤 레이어 단위로 양자화 (float32 전체 사본을 만들지 않음)
+    model = model_cls.from_pretrained(model_path, torch_dtype=dtype).eval()
+    if quantization == "int8":
+        model = quantize_linear_int8(model)
+    print(f"CPU 모델 로드 ({quantization}, {torch.get_num_threads()} 스레드): {time.perf_counter() - start:.1f}초")
+    return model
@@ -0,0 +1,225 @@
+"""
+양자화된 밀집(FAISS) 인덱스 생성/저장/메모리 매핑과 recall@k 평가.
+
+KoE5 벡터(1024차원 float32)는 청크당 4KB 라 코퍼스가 커지면 서버 워커마다 같은 인덱스를 RAM 에 올리는 비용이 커집니다.
+종류별 청크당 코드 크기 (1024차원 기준):
+    flat     IndexFlatL2                 4096B  정확한 검색 (기본값)
+    sq8      IndexScalarQuantizer(8bit)  1024B  전수 검색, 차원별 int8 양자화
+    ivf_sq8  IVF + 8bit SQ               1024B  nprobe 개 클러스터만 검색
+    ivfpq    IVF + PQ(m, 8bit)              mB  nprobe 개 클러스터만 검색, 가장 작음
+저장한 인덱스는 메모리 매핑으로 읽어 코드 배열을 파일에서 직접 참조하므로, 여러 워커 프로세스가 페이지 캐시의
+한 복사본을 공유합니다. nlist/nprobe 를 키우면 recall 이 오르고 지연 시간이 늘어납니다.
+refine_factor 를 주면 원본 float32 벡터를 인덱스 파일에 함께 두고 후보 k·refine_factor 개만 정확한 거리로 다시 정렬합니다
+(파일은 커지지만 매핑되므로 후보 벡터 페이지만 읽힘).
+
+평가:
+    python -m rag.dense_index --n 100000 --dim 1024 --kinds flat sq8 ivf_sq8 ivfpq --nprobe 4 16 64
+    python -m rag.dense_index --vectors .rag_cache/text/회로이론/<fingerprint>/vectors.npy
+"""
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+
+DENSE_INDEX_KINDS = ("flat", "sq8", "ivf_sq8", "ivfpq")
+
+
+def mmap_flags() -> int:
+    import faiss
+
+    # IO_FLAG_MMAP_IFC: 파일 전체를 매핑해 flat/SQ 코드와 IVF 역리스트를 복사하지 않고 참조 (faiss 1.8+)
+    # IO_FLAG_MMAP 과 함께 쓰면 IVF 를 읽을 때 실패하므로 둘 중 하나만 사용
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+    return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+
+def default_nlist(num_vectors: int) -> int:
+    """클러스터 수 기본값 4·√n. 클러스터마다 학습 벡터가 39개 이상 되도록 제한합니다."""
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def effective_kind(kind: str, num_vectors: int, nlist: int | None = None) -> str:
+    """
+    벡터 수로 실제로 만들 인덱스 종류를 정합니다.
+    IVF/PQ 는 클러스터(PQ 는 256개 코드워드)마다 학습 벡터가 39개 이상 없으면 품질이 무너지므로 sq8 전수 검색으로 대신합니다.
+    """
+    nlist = nlist or default_nlist(num_vectors)
+    if kind.startswith("ivf") and num_vectors < 39 * max(nlist, 256 if kind == "ivfpq" else 0):
+        return "sq8"
+    return kind
+
+
+def build_dense_index(vectors: np.ndarray, kind: str = "flat", nlist: int | None = None, pq_m: int = 64,
+                      nprobe: int = 16, refine_factor: int = 0, max_train: int = 100_000, seed: int = 0):
+    """
+    임베딩 행렬로 FAISS 인덱스를 만듭니다 (L2 거리, 기존 IndexFlatL2 와 같은 거리 척도).
+
+    Args:
+        vectors (np.ndarray): (n, dim) float32 행렬.
+        kind (str): 'flat', 'sq8', 'ivf_sq8', 'ivfpq' 중 하나. 벡터가 부족하면 effective_kind 에 따라 sq8 로 만듭니다.
+        nlist (int | None): IVF 클러스터 수. None 이면 default_nlist(n).
+        pq_m (int): PQ 부분 양자화기 수 (dim 의 약수여야 함, 청크당 pq_m 바이트).
+        nprobe (int): 질의마다 검색할 클러스터 수. 인덱스 파일에 함께 저장됩니다.
+        refine_factor (int): 0 보다 크면 양자화 인덱스의 후보 k·refine_factor 개를 원본 벡터로 다시 정렬합니다.
+        max_train (int): 학습에 쓸 최대 벡터 수 (무작위 샘플).
+        seed (int): 학습 샘플 시드.
+
+    Returns:
+        faiss.Index
+    """
+    import faiss
+
+    if kind not in DENSE_INDEX_KINDS:
+        raise ValueError(f"kind 는 {DENSE_INDEX_KINDS} 중 하나여야 합니다: {kind}")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dim = vectors.shape
+    nlist = nlist or default_nlist(num_vectors)
+    if effective_kind(kind, num_vectors, nlist) != kind:
+        print(f"벡터 {num_vectors}개로는 {kind} 학습이 부족해 sq8 인덱스를 사용합니다.")
+        kind = "sq8"
+
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif kind == "ivf_sq8":
+        index = faiss.IndexIVFScalarQuantizer(faiss.IndexFlatL2(dim), dim, nlist, faiss.ScalarQuantizer.QT_8bit)
+    else:
+        if dim % pq_m:
+            raise ValueError(f"pq_m({pq_m}) 은 벡터 차원({dim})의 약수여야 합니다.")
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, 8)
+    if hasattr(index, "nprobe"):
+        index.nprobe = min(nprobe, nlist)
+    if refine_factor and kind != "flat":
+        index = faiss.IndexRefineFlat(index)
+        index.k_factor = refine_factor
+
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = vectors if num_vectors <= max_train else vectors[np.sort(rng.choice(num_vectors, max_train, replace=False))]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def save_dense_index(index, path):
+    import faiss
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(index, str(path))
+
+
+def load_dense_index(path, mmap: bool = True):
+    """저장된 인덱스를 읽습니다. mmap=True 면 코드 배열을 파일에서 매핑해 프로세스 간에 공유합니다."""
+    import faiss
+
+    return faiss.read_index(str(path), mmap_flags() if mmap else 0)
+
+
+def set_nprobe(index, nprobe: int):
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+
+
+def recall_at_k(exact_ids: np.ndarray, approx_ids: np.ndarray, k: int) -> float:
+    """정확 검색 상위 k 개 중 근사 검색 상위 k 개에 포함된 비율의 평균."""
+    hits = [len(set(e[:k]) & set(a[:k])) for e, a in zip(exact_ids, approx_ids)]
+    return float(np.mean(hits)) / k
+
+
+def _index_bytes(index) -> int:
+    import faiss
+
+    return int(faiss.serialize_index(index).size)
+
+
+def evaluate(vectors: np.ndarray, queries: np.ndarray, kinds: list, k: int = 10, nprobes: list = (16,),
+             nlist: int | None = None, pq_m: int = 64, refine_factor: int = 0) -> list:
+    """
+    flat 인덱스 결과를 기준으로 인덱스 종류/nprobe 별 recall@k, 질의 지연, 인덱스 크기를 측정합니다.
+    벡터가 부족해 요청한 IVF 종류 대신 sq8 을 만들면 "kind" 는 실제로 만든 종류, "requested" 는 요청한 종류이고,
+    nprobe 가 의미 없으므로 행은 하나만 남깁니다.
+
+    Returns:
+        list: {"kind", "requested", "nprobe", "recall", "ms_per_query", "bytes", "build_sec"} 리스트.
+    """
+    exact = build_dense_index(vectors, "flat")
+    _, exact_ids = exact.search(queries, k)
+    results = []
+    for requested in kinds:
+        kind = effective_kind(requested, len(vectors), nlist)
+        start = time.perf_counter()
+        index = build_dense_index(vectors, kind, nlist=nlist, pq_m=pq_m, refine_factor=refine_factor)
+        build_sec = time.perf_counter() - start
+        size = _index_bytes(index)
+        for nprobe in (nprobes if kind.startswith("ivf") else [None]):
+            if nprobe is not None:
+                set_nprobe(index, nprobe)
+            start = time.perf_counter()
+            _, ids = index.search(queries, k)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "kind": kind, "requested": requested, "nprobe": nprobe, "recall": recall_at_k(exact_ids, ids, k),
+                "ms_per_query": elapsed * 1000 / len(queries), "bytes": size, "build_sec": build_sec,
+            })
+    return results
+
+
+def synthetic_vectors(num_vectors: int, dim: int, num_clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """군집 구조가 있는 정규화 벡터 (문장 임베딩처럼 주제별로 모인 분포를 흉내냄)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(num_clusters, size=num_vectors)]
+    vectors += 0.5 * rng.standard_normal((num_vectors, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="양자화 인덱스 recall@k 평가 (flat 기준)")
+    parser.add_argument("--vectors", default=None, help="평가할 임베딩 .npy (없으면 합성 벡터)")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kinds", nargs="+", default=list(DENSE_INDEX_KINDS), choices=DENSE_INDEX_KINDS)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--refine-factor", type=int, default=0)
+    parser.add_argument("--output", default=None, help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(args.n + args.queries, args.dim)
+    # 질의는 코퍼스에서 뺀 벡터에 잡음을 섞어 사용
+    rng = np.random.default_rng(1)
+    query_ids = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[query_ids] + 0.05 * rng.standard_normal((len(query_ids), vectors.shape[1]), dtype=np.float32)
+    if not args.vectors:
+        vectors = np.delete(vectors, query_ids, axis=0)
+
+    results = evaluate(vectors, queries.astype(np.float32), args.kinds, args.k, args.nprobe, args.nlist, args.pq_m,
+                       args.refine_factor)
+    print(f"벡터 {len(vectors)}개 × {vectors.shape[1]}차원, 질의 {len(queries)}개, recall@{args.k}")
+    for r in results:
+        nprobe = f"nprobe={r['nprobe']}" if r["nprobe"] else ""
+        if r["requested"] != r["kind"]:
+            nprobe = f"({r['requested']} 대신)"
+        print(f"{r['kind']:>8} {nprobe:>11}  recall {r['recall']:.3f}  {r['ms_per_query']:.3f}ms/질의  "
+              f"{r['bytes'] / 1024 ** 2:.1f}MB  (학습/추가 {r['build_sec']:.1f}초)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
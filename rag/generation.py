@@ -0,0 +1,338 @@
+"""
+Gemma 생성 래퍼.
+
+여러 프롬프트를 왼쪽 패딩으로 묶어 한 번의 model.generate 로 생성하고, 결과는 입력 순서대로 돌려줍니다.
+prefix_cache 를 지정하면 이전 호출과 겹치는 접두사의 KV 캐시를 재사용합니다. 왼쪽 패딩 배치는 행마다 토큰 위치가 달라
+캐시를 이어 붙일 수 없으므로, 이때 generate_batch 는 프롬프트를 하나씩 생성합니다 (같은 키워드의 요약 → 퀴즈가 문맥 prefill 을 공유).
+그만큼 배치 처리량을 잃으므로 파이프라인 기본값(PipelineConfig.prefix_cache_bytes=0)은 캐시 없이 패딩 배치를 씁니다.
+schema 를 지정하면 출력 형식(rag.structured)에 맞는 토큰만 생성하고 형식이 완성되면 바로 멈춥니다.
+stream / astream 은 생성되는 텍스트를 조금씩 돌려주며 첫 토큰까지의 시간(TTFT)과 초당 토큰 수를 기록합니다.
+assistant_model 을 지정하면 generate / generate_batch 가 기본으로 draft 모델 보조 디코딩(greedy 와 같은 출력)을 사용합니다
+(rag.assisted). 보조 디코딩은 행 하나씩 검증하므로 프롬프트를 하나씩 생성하며, 이때는 접두사 KV 캐시를 쓰지 않습니다.
+"""
+import asyncio
+import threading
+import time
+
+import torch
+from langchain_core.runnables import RunnableGenerator
+from transformers import LogitsProcessorList, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+from rag.assisted import ForwardRecorder, assisted_stats, configure_assistant
+from rag.prefix_cache import PrefixKVCache
+from rag.structured import SchemaConstraint, SchemaLogitsProcessor, SchemaStoppingCriteria
+from rag.tracing import tracer
+
+
+class TimedTextIteratorStreamer(TextIteratorStreamer):
+    """토큰이 들어올 때마다 개수와 첫 토큰 시각을 기록하는 TextIteratorStreamer."""
+
+    def __init__(self, tokenizer, **kwargs):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True, **kwargs)
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.new_tokens = 0
+
+    def put(self, value):
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            if self.first_token_time is None:
+                self.first_token_time = time.perf_counter()
+            self.new_tokens += value.numel()
+        super().put(value)
+
+
+class CancelCriteria(StoppingCriteria):
+    """스트림 소비자가 중간에 그만두면 생성 스레드도 멈추도록 하는 stopping criteria."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class GemmaGenerator:
+    """
+    Gemma 모델/프로세서와 생성 설정을 묶은 객체.
+
+    Args:
+        model: Gemma3ForConditionalGeneration 등 generate 를 지원하는 모델.
+        processor: AutoProcessor (tokenizer 속성 사용) 또는 토크나이저.
+        max_new_tokens (int): 프롬프트당 최대 생성 토큰 수.
+        max_batch_size (int): generate 한 번에 묶을 최대 프롬프트 수.
+        prefix_cache (PrefixKVCache | None): 접두사 KV 캐시. 지정하면 generate_batch 도 프롬프트를 하나씩 생성합니다
+            (배치 처리량이 더 중요하면 None).
+        assistant_model: 같은 토크나이저를 쓰는 작은 draft 모델. 지정하면 요약/퀴즈/키워드 생성이 기본으로 보조 디코딩을
+            사용하고, None 이면 쓰지 않습니다.
+        num_assistant_tokens (int): 검증 한 번에 draft 가 제안하는 최대 토큰 수.
+    """
+
+    def __init__(self, model, processor, max_new_tokens: int = 1024, max_batch_size: int = 8,
+                 prefix_cache: PrefixKVCache | None = None, assistant_model=None, num_assistant_tokens: int = 5):
+        self.model = model
+        self.processor = processor
+        self.tokenizer = getattr(processor, "tokenizer", processor)
+        self.max_new_tokens = max_new_tokens
+        self.max_batch_size = max_batch_size
+        self.prefix_cache = prefix_cache
+        self.assistant_model = assistant_model
+        if assistant_model is not None:
+            configure_assistant(assistant_model, num_assistant_tokens)
+        self.last_stats = {}
+        # 배치 생성은 왼쪽 패딩이어야 모든 행의 새 토큰이 같은 위치에서 시작함
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+    def generate(self, formatted_prompt: str, schema=None, assisted: bool = True, **generate_kwargs) -> str:
+        """
+        프롬프트 하나를 생성합니다.
+        draft 모델이 있으면(assisted=False 로 끌 수 있음) 보조 디코딩(greedy)으로 생성하고, last_stats 에 수락률과
+        속도 향상 추정치를 남깁니다. schema 제약도 그대로 적용됩니다.
+        """
+        return self.generate_batch([formatted_prompt], schema=schema, assisted=assisted, **generate_kwargs)[0]
+
+    def generate_batch(self, formatted_prompts: list, max_batch_size: int | None = None, schema=None,
+                       assisted: bool = True, **generate_kwargs) -> list:
+        """
+        여러 프롬프트를 배치로 생성합니다.
+        길이가 비슷한 프롬프트끼리 묶이도록 토큰 수로 정렬한 뒤 max_batch_size 단위로 generate 를 호출합니다.
+        draft 모델이 있으면 하나씩 보조 디코딩으로, 그렇지 않고 prefix_cache 가 있으면 하나씩 접두사 KV 를 재사용하며 생성합니다.
+
+        Args:
+            formatted_prompts (list): 채팅 템플릿이 적용된 프롬프트 문자열 목록.
+            max_batch_size (int | None): 이번 호출에만 적용할 최대 배치 크기.
+            schema: 출력 형식 스키마 (JsonStringArraySchema, QuizSchema 등). None 이면 제한 없음.
+            assisted (bool): False 면 draft 모델이 있어도 보조 디코딩을 쓰지 않음.
+            **generate_kwargs: model.generate 에 그대로 전달할 인자.
+
+        Returns:
+            list: 입력 순서와 같은 순서의 생성 텍스트 목록.
+        """
+        if not formatted_prompts:
+            return []
+        batch_size = max_batch_size or self.max_batch_size
+        generate_kwargs.setdefault("max_new_tokens", self.max_new_tokens)
+        if assisted and self.assistant_model is not None:
+            return [self._generate_assisted(prompt, schema, **generate_kwargs) for prompt in formatted_prompts]
+        if self.prefix_cache is not None:
+            return [self._generate_with_prefix_cache(prompt, schema, **generate_kwargs) for prompt in formatted_prompts]
+
+        lengths = [len(ids) for ids in self.tokenizer(formatted_prompts)["input_ids"]]
+        order = sorted(range(len(formatted_prompts)), key=lambda i: lengths[i])
+        results = [None] * len(formatted_prompts)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            texts = self._generate_padded([formatted_prompts[i] for i in indices], schema, **generate_kwargs)
+            for i, text in zip(indices, texts):
+                results[i] = text
+        return results
+
+    def _schema_kwargs(self, schema, batch_size: int, prompt_len: int) -> dict:
+        if schema is None:
+            return {}
+        constraint = SchemaConstraint(schema, self.tokenizer, batch_size, prompt_len)
+        return {
+            "logits_processor": LogitsProcessorList([SchemaLogitsProcessor(constraint)]),
+            "stopping_criteria": StoppingCriteriaList([SchemaStoppingCriteria(constraint)]),
+        }
+
+    def _tokenize(self, prompts, **kwargs):
+        with tracer.span("tokenize"):
+            return self.tokenizer(prompts, return_tensors="pt", **kwargs).to(self.model.device)
+
+    def _model_generate(self, prefill_sec: float = 0.0, prefill_tokens: int = 0, **kwargs):
+        """
+        model.generate 를 실행합니다. 추적 중이면 첫 forward 가 끝날 때까지(+ 미리 한 prefill_sec)를 prefill,
+        나머지를 decode 단계로 기록합니다.
+        """
+        if not tracer.enabled:
+            with torch.inference_mode():
+                return self.model.generate(**kwargs)
+        start = time.perf_counter()
+        with ForwardRecorder(self.model) as forwards, torch.inference_mode():
+            outputs = self.model.generate(**kwargs)
+        end = time.perf_counter()
+        first_end = forwards.first_end or end
+        input_ids = kwargs["input_ids"]
+        new_tokens = (outputs.shape[-1] - input_ids.shape[-1]) * outputs.shape[0]
+        tracer.record("prefill", prefill_sec + first_end - start, tokens=prefill_tokens)
+        tracer.record("decode", end - first_end, tokens=new_tokens)
+        return outputs
+
+    def _generate_padded(self, prompts: list, schema=None, **generate_kwargs) -> list:
+        inputs = self._tokenize(prompts, padding=True)
+        input_len = inputs["input_ids"].shape[-1]
+        generate_kwargs.update(self._schema_kwargs(schema, len(prompts), input_len))
+        outputs = self._model_generate(
+            prefill_tokens=int(inputs["attention_mask"].sum()), **inputs, pad_token_id=self.tokenizer.pad_token_id,
+            **generate_kwargs,
+        )
+        self.last_stats = {"prompt_tokens": int(inputs["attention_mask"].sum()), "prefill_tokens_saved": 0}
+        return [self.tokenizer.decode(output[input_len:], skip_special_tokens=True) for output in outputs]
+
+    def _prefill_with_prefix_cache(self, input_ids: torch.Tensor):
+        """
+        캐시된 접두사 KV 를 이어받아 프롬프트의 마지막 토큰 직전까지 prefill 하고, 그 KV 를 다시 캐시에 저장합니다.
+
+        Returns:
+            tuple: (마지막 토큰 직전까지를 덮는 KV 캐시 또는 None, 재사용한 토큰 수)
+        """
+        token_ids = input_ids[0].tolist()
+        reused, past_key_values = self.prefix_cache.lookup(token_ids)
+        if len(token_ids) - 1 > reused:
+            with torch.inference_mode():
+                outputs = self.model(input_ids=input_ids[:, reused:-1], past_key_values=past_key_values, use_cache=True)
+            past_key_values = outputs.past_key_values
+        if past_key_values is not None:
+            self.prefix_cache.store(token_ids[:-1], past_key_values)
+        return past_key_values, reused
+
+    def _generate_with_prefix_cache(self, prompt: str, schema=None, **generate_kwargs) -> str:
+        input_ids = self._tokenize(prompt)["input_ids"]
+        generate_kwargs.update(self._schema_kwargs(schema, 1, input_ids.shape[-1]))
+        start = time.perf_counter()
+        past_key_values, reused = self._prefill_with_prefix_cache(input_ids)
+        outputs = self._model_generate(
+            prefill_sec=time.perf_counter() - start, prefill_tokens=input_ids.shape[-1] - reused,
+            input_ids=input_ids, attention_mask=torch.ones_like(input_ids), past_key_values=past_key_values,
+            pad_token_id=self.tokenizer.pad_token_id, **generate_kwargs,
+        )
+        self.last_stats = {"prompt_tokens": input_ids.shape[-1], "prefill_tokens_saved": reused}
+        return self.tokenizer.decode(outputs[0][input_ids.shape[-1]:], skip_special_tokens=True)
+
+    def _generate_assisted(self, prompt: str, schema=None, **generate_kwargs) -> str:
+        generate_kwargs.setdefault("max_new_tokens", self.max_new_tokens)
+        # 검증은 본 모델의 greedy 선택과 비교하므로 샘플링 설정(generation_config)을 덮어씀
+        generate_kwargs["do_sample"] = False
+        text_config = lambda model: model.config.get_text_config()
+        if text_config(self.model).vocab_size != text_config(self.assistant_model).vocab_size:
+            # 토크나이저는 같지만 임베딩 행 수(패딩)가 다르면 transformers 가 두 토크나이저를 명시하도록 요구함
+            generate_kwargs.update(tokenizer=self.tokenizer, assistant_tokenizer=self.tokenizer)
+
+        # 접두사 KV 캐시는 쓰지 않음: 미리 채운 past_key_values 를 넘기면 assisted generation 이 프롬프트 전체를 캐시 뒤에
+        # 다시 넣어 greedy 와 다른 출력이 나옴 (보조 디코딩은 decode 구간을 줄이는 용도)
+        input_ids = self._tokenize(prompt)["input_ids"]
+        # 제약 상태는 draft 후보가 거절되면 되돌아가므로(SchemaConstraint.update) 검증 결과는 제약 greedy 와 같음
+        generate_kwargs.update(self._schema_kwargs(schema, 1, input_ids.shape[-1]))
+        start = time.perf_counter()
+        with ForwardRecorder(self.model) as target, ForwardRecorder(self.assistant_model) as draft:
+            with torch.inference_mode():
+                outputs = self.model.generate(
+                    input_ids=input_ids, attention_mask=torch.ones_like(input_ids),
+                    assistant_model=self.assistant_model, pad_token_id=self.tokenizer.pad_token_id, **generate_kwargs,
+                )
+        new_tokens = outputs.shape[-1] - input_ids.shape[-1]
+        if target.first_end is not None:
+            # draft 후보 검증이 섞여 있어 첫 forward 까지를 prefill, 나머지(draft 포함)를 decode 로 기록
+            tracer.record("prefill", target.first_end - start, tokens=input_ids.shape[-1])
+            tracer.record("decode", time.perf_counter() - target.first_end, tokens=new_tokens)
+        self.last_stats = {
+            "prompt_tokens": input_ids.shape[-1],
+            "prefill_tokens_saved": 0,
+            "new_tokens": new_tokens,
+            "total_sec": time.perf_counter() - start,
+            **assisted_stats(target.calls, draft.calls, new_tokens, input_ids.shape[-1]),
+        }
+        return self.tokenizer.decode(outputs[0][input_ids.shape[-1]:], skip_special_tokens=True)
+
+    def stream(self, formatted_prompt: str, schema=None, stats: dict | None = None, **generate_kwargs):
+        """
+        프롬프트 하나를 생성하면서 디코딩된 텍스트 조각을 순서대로 yield 합니다.
+        생성은 별도 스레드에서 진행되고, 소비자가 반복을 중단하면 생성도 멈춥니다.
+
+        Args:
+            formatted_prompt (str): 채팅 템플릿이 적용된 프롬프트.
+            schema: 출력 형식 스키마. None 이면 제한 없음.
+            stats (dict | None): 주어지면 호출이 끝날 때 이 dict 에 통계를 채움 (동시 호출 시 last_stats 대신 사용).
+            **generate_kwargs: model.generate 에 그대로 전달할 인자.
+
+        Yields:
+            str: 새로 디코딩된 텍스트 조각.
+        """
+        generate_kwargs.setdefault("max_new_tokens", self.max_new_tokens)
+        input_ids = self._tokenize(formatted_prompt)["input_ids"]
+        streamer = TimedTextIteratorStreamer(self.tokenizer)
+        reused, past_key_values = 0, None
+        if self.prefix_cache is not None:
+            past_key_values, reused = self._prefill_with_prefix_cache(input_ids)
+
+        cancelled = threading.Event()
+        generate_kwargs.update(self._schema_kwargs(schema, 1, input_ids.shape[-1]))
+        stopping = StoppingCriteriaList(generate_kwargs.pop("stopping_criteria", []))
+        stopping.append(CancelCriteria(cancelled))
+        errors = []
+
+        def run():
+            try:
+                with torch.inference_mode():
+                    self.model.generate(
+                        input_ids=input_ids, attention_mask=torch.ones_like(input_ids),
+                        past_key_values=past_key_values, streamer=streamer, stopping_criteria=stopping,
+                        pad_token_id=self.tokenizer.pad_token_id, **generate_kwargs,
+                    )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            cancelled.set()
+            thread.join()
+            total = time.perf_counter() - streamer.start_time
+            first = streamer.first_token_time
+            decode_time = time.perf_counter() - first if first is not None else 0.0
+            call_stats = {
+                "prompt_tokens": input_ids.shape[-1],
+                "prefill_tokens_saved": reused,
+                "new_tokens": streamer.new_tokens,
+                "ttft_sec": first - streamer.start_time if first is not None else None,
+                "total_sec": total,
+                "tokens_per_sec": streamer.new_tokens / decode_time if decode_time > 0 else 0.0,
+            }
+            self.last_stats = call_stats
+            if first is not None:
+                tracer.record("prefill", call_stats["ttft_sec"], tokens=input_ids.shape[-1] - reused)
+                tracer.record("decode", decode_time, tokens=streamer.new_tokens)
+            if stats is not None:
+                stats.update(call_stats)
+        if errors:
+            raise errors[0]
+
+    async def astream(self, formatted_prompt: str, schema=None, stats: dict | None = None, **generate_kwargs):
+        """stream 의 async iterator 버전. 각 조각을 기다리는 동안 이벤트 루프를 막지 않습니다."""
+        iterator = self.stream(formatted_prompt, schema=schema, stats=stats, **generate_kwargs)
+        sentinel = object()
+        try:
+            while True:
+                text = await asyncio.to_thread(next, iterator, sentinel)
+                if text is sentinel:
+                    break
+                yield text
+        finally:
+            iterator.close()
+
+
+def streaming_runnable(generator: GemmaGenerator, **generate_kwargs) -> RunnableGenerator:
+    """
+    LCEL 체인 끝에 붙여 .stream() / .astream() 으로 생성 텍스트를 조금씩 받을 수 있게 하는 Runnable.
+
+    Args:
+        generator (GemmaGenerator): 생성에 사용할 객체.
+        **generate_kwargs: generator.stream 에 전달할 인자 (schema, max_new_tokens 등).
+    """
+    def transform(prompts):
+        for prompt in prompts:
+            yield from generator.stream(prompt, **generate_kwargs)
+
+    async def atransform(prompts):
+        async for prompt in prompts:
+            async for text in generator.astream(prompt, **generate_kwargs):
+                yield text
+
+    return RunnableGenerator(transform, atransform)
@@ -0,0 +1,166 @@
+"""
+CLIP 이미지 임베딩의 배치 인코딩과 디스크 캐시.
+
+이미지 디코딩/전처리는 스레드 풀에서, 인코딩은 설정한 배치 크기로 수행합니다.
+임베딩은 파일 경로, mtime, sha256 기준으로 캐시되어 재시작 시 새로 추가되거나 수정된 이미지만 인코딩하고,
+삭제된 이미지는 컬렉션에서 제거합니다.
+"""
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+from rag.index_cache import CACHE_DIR
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ImageEmbeddingCache:
+    """
+    이미지 경로 → (mtime, sha256, 임베딩)을 저장하는 디스크 캐시.
+    manifest.json 에 파일 정보를, vectors.npy 에 manifest 순서대로 임베딩 행렬을 저장합니다.
+    """
+
+    def __init__(self, cache_dir: Path, model_name: str):
+        self.cache_dir = Path(cache_dir)
+        self.model_name = model_name
+        self.entries = {}  # uri -> {"mtime", "size", "sha256"}
+        self.vectors = {}  # uri -> np.ndarray
+        manifest_path = self.cache_dir / "manifest.json"
+        if not manifest_path.exists():
+            return
+        with open(manifest_path, "r", encoding="utf-8") as f: manifest = json.load(f)
+        if manifest.get("model") != model_name:
+            print(f"이미지 임베딩 모델이 바뀌어 캐시를 초기화합니다: {manifest.get('model')} -> {model_name}")
+            return
+        matrix = np.load(self.cache_dir / "vectors.npy")
+        for row, (uri, entry) in enumerate(manifest["images"].items()):
+            self.entries[uri] = entry
+            self.vectors[uri] = matrix[row]
+
+    def diff(self, image_uris: list) -> tuple:
+        """
+        현재 이미지 목록과 캐시를 비교합니다.
+
+        Returns:
+            tuple: (다시 인코딩할 경로 목록, 삭제된 경로 목록)
+        """
+        changed = []
+        for uri in image_uris:
+            stat = Path(uri).stat()
+            entry = self.entries.get(uri)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+            sha = file_sha256(uri)
+            if entry and entry["sha256"] == sha:
+                # 내용은 같고 mtime만 바뀐 경우 다시 인코딩하지 않음
+                entry.update(mtime=stat.st_mtime, size=stat.st_size)
+                continue
+            self.entries[uri] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": sha}
+            changed.append(uri)
+        current = set(image_uris)
+        removed = [uri for uri in self.entries if uri not in current]
+        for uri in removed:
+            del self.entries[uri]
+            self.vectors.pop(uri, None)
+        return changed, removed
+
+    def version(self) -> str:
+        """이미지 인덱스 내용이 바뀔 때마다 달라지는 버전 문자열."""
+        payload = json.dumps([self.model_name, sorted((u, e["sha256"]) for u, e in self.entries.items())])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def save(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        uris = list(self.entries)
+        matrix = np.stack([self.vectors[u] for u in uris]) if uris else np.zeros((0, 0), dtype=np.float32)
+        np.save(self.cache_dir / "vectors.npy", matrix)
+        with open(self.cache_dir / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "images": self.entries}, f, ensure_ascii=False)
+
+
+def encode_images(image_uris: list, clip_embeddings, batch_size: int = 16, num_workers: int = 4) -> np.ndarray:
+    """
+    이미지들을 배치 단위로 CLIP 인코딩합니다. 다음 배치의 디코딩/전처리는 현재 배치 인코딩과 겹쳐서 진행됩니다.
+
+    Args:
+        image_uris (list): 이미지 파일 경로 목록.
+        clip_embeddings: OpenCLIPEmbeddings 객체 (model, preprocess 사용).
+        batch_size (int): encode_image 한 번에 넣을 이미지 수.
+        num_workers (int): 디코딩/전처리 스레드 수.
+
+    Returns:
+        np.ndarray: (len(image_uris), dim) L2 정규화된 float32 행렬.
+    """
+    def load(uri):
+        with Image.open(uri) as image:
+            return clip_embeddings.preprocess(image.convert("RGB"))
+
+    if not image_uris:
+        return np.zeros((0, 0), dtype=np.float32)
+    device = next(clip_embeddings.model.parameters()).device
+    batches = [image_uris[i:i + batch_size] for i in range(0, len(image_uris), batch_size)]
+    results = []
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        pending = [pool.submit(load, uri) for uri in batches[0]]
+        for i in range(len(batches)):
+            pixels = torch.stack([future.result() for future in pending]).to(device)
+            if i + 1 < len(batches):
+                pending = [pool.submit(load, uri) for uri in batches[i + 1]]
+            with torch.inference_mode():
+                features = clip_embeddings.model.encode_image(pixels)
+                features = features / features.norm(dim=-1, keepdim=True)
+            results.append(features.float().cpu().numpy())
+    return np.concatenate(results).astype(np.float32, copy=False)
+
+
+def sync_image_index(image_uris: list, image_db, clip_embeddings, model_name: str,
+                     cache_dir: Path = CACHE_DIR / "images", batch_size: int = 16, num_workers: int = 4) -> str:
+    """
+    이미지 임베딩 캐시와 Chroma 컬렉션을 현재 이미지 목록에 맞춥니다.
+
+    Args:
+        image_uris (list): 현재 이미지 파일 경로 목록.
+        image_db: 이미지용 Chroma 벡터스토어.
+        clip_embeddings: OpenCLIPEmbeddings 객체.
+        model_name (str): 캐시 무효화에 쓰일 CLIP 모델/체크포인트 이름.
+        cache_dir (Path): 캐시 디렉토리.
+        batch_size (int): 인코딩 배치 크기.
+        num_workers (int): 디코딩/전처리 스레드 수.
+
+    Returns:
+        str: 이미지 인덱스 버전 문자열.
+    """
+    cache = ImageEmbeddingCache(cache_dir, model_name)
+    changed, removed = cache.diff(image_uris)
+    if changed:
+        vectors = encode_images(changed, clip_embeddings, batch_size=batch_size, num_workers=num_workers)
+        cache.vectors.update(zip(changed, vectors))
+    cache.save()
+
+    # 컬렉션이 캐시와 어긋나 있으면(새 DB 등) 빠진 항목도 함께 채움
+    collection = image_db._collection
+    existing = set(collection.get(include=[])["ids"])
+    stale = [uri for uri in existing if uri not in cache.entries]
+    if stale:
+        collection.delete(ids=stale)
+    to_upsert = list(dict.fromkeys(changed + [uri for uri in cache.entries if uri not in existing]))
+    if to_upsert:
+        collection.upsert(
+            ids=to_upsert,
+            embeddings=[cache.vectors[uri].tolist() for uri in to_upsert],
+            documents=to_upsert,
+            metadatas=[{"uri": uri} for uri in to_upsert],
+        )
+    print(f"이미지 인덱스: 전체 {len(image_uris)}개, 새로 인코딩 {len(changed)}개, 삭제 {len(removed)}개")
+    return cache.version()
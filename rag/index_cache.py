@@ -0,0 +1,223 @@
+"""
+텍스트 RAG 코퍼스용 디스크 인덱스 캐시.
+
+원본 문서와 분할/임베딩 설정의 해시를 키로 청크, FAISS 인덱스, BM25 검색기를 저장합니다.
+웜 스타트에서는 디스크에서 바로 로드하고(FAISS 인덱스는 메모리 매핑), 문서가 바뀌면 내용이 바뀐 청크만 다시 임베딩합니다.
+"""
+import hashlib
+import json
+import pickle
+import re
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from rag.dense_index import build_dense_index, load_dense_index
+from rag.sparse import SparseBM25Retriever
+
+CACHE_DIR = Path(".rag_cache")
+EMBED_BATCH_SIZE = 256
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def index_fingerprint(source_text: str, settings: dict) -> str:
+    """
+    원본 문서와 분할/임베딩 설정으로 인덱스 키를 만듭니다.
+
+    Args:
+        source_text (str): 원본 문서 전체 텍스트.
+        settings (dict): chunk_size, chunk_overlap, 임베딩 모델명 등 인덱스에 영향을 주는 설정.
+
+    Returns:
+        str: sha256 16진 문자열.
+    """
+    payload = json.dumps(settings, sort_keys=True, ensure_ascii=False) + "\n" + source_text
+    return sha256_text(payload)
+
+
+def split_markdown_sections(text: str) -> list:
+    """
+    Markdown 제목(#) 단위로 문서를 나눕니다.
+    섹션 단위로 먼저 자르면 한 섹션을 수정해도 다른 섹션의 청크 경계가 밀리지 않아 임베딩 캐시를 재사용할 수 있습니다.
+    """
+    sections = [s for s in re.split(r"(?m)^(?=#{1,6}\s)", text) if s.strip()]
+    return sections or [text]
+
+
+def embed_corpus(texts: list, embeddings, batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """
+    텍스트 목록을 큰 배치 단위로 임베딩해 하나의 float32 행렬로 반환합니다.
+    배치마다 미리 할당한 행렬에 바로 채워 넣어 파이썬 리스트가 한꺼번에 쌓이지 않게 합니다.
+
+    Args:
+        texts (list): 임베딩할 텍스트 목록.
+        embeddings: LangChain Embeddings 객체 (embed_documents 사용).
+        batch_size (int): embed_documents 한 번에 넘길 텍스트 수.
+
+    Returns:
+        np.ndarray: (len(texts), dim) float32 행렬.
+    """
+    matrix = None
+    for start in range(0, len(texts), batch_size):
+        batch = np.asarray(embeddings.embed_documents(texts[start:start + batch_size]), dtype=np.float32)
+        if matrix is None:
+            matrix = np.empty((len(texts), batch.shape[1]), dtype=np.float32)
+        matrix[start:start + len(batch)] = batch
+    return matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+
+
+def build_faiss_store(split_docs: list, vectors: np.ndarray, embeddings, index=None) -> FAISS:
+    """
+    미리 계산한 임베딩 행렬로 FAISS 벡터스토어를 만듭니다 (모델을 다시 돌리지 않음).
+    index 를 주면(예: rag.dense_index 의 양자화 인덱스) 벡터가 이미 들어 있는 그 인덱스를 사용합니다.
+    """
+    import faiss
+
+    if index is None:
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    ids = [str(i) for i in range(len(split_docs))]
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, split_docs))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+
+class EmbeddingStore:
+    """
+    청크 텍스트 해시 → 임베딩 벡터를 저장하는 디스크 캐시.
+    임베딩 모델마다 다른 파일을 사용해야 합니다.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.vectors = {}
+        if self.path.exists():
+            with np.load(self.path, allow_pickle=False) as data:
+                self.vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    def embed(self, texts: list, embeddings) -> np.ndarray:
+        """
+        텍스트 목록의 임베딩 행렬을 반환합니다. 캐시에 없는 텍스트만 모델로 계산합니다.
+
+        Args:
+            texts (list): 청크 텍스트 목록.
+            embeddings: LangChain Embeddings 객체 (embed_documents 사용).
+
+        Returns:
+            np.ndarray: (len(texts), dim) float32 행렬.
+        """
+        keys = [sha256_text(t) for t in texts]
+        missing = list(dict.fromkeys(k for k in keys if k not in self.vectors))
+        if missing:
+            text_by_key = dict(zip(keys, texts))
+            new_vectors = embed_corpus([text_by_key[k] for k in missing], embeddings)
+            self.vectors.update(zip(missing, new_vectors))
+        print(f"임베딩 캐시: 전체 {len(keys)}개 청크 중 {len(missing)}개 새로 임베딩")
+        # 현재 문서에서 쓰이지 않는 벡터는 정리
+        self.vectors = {k: self.vectors[k] for k in keys}
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([self.vectors[k] for k in keys]).astype(np.float32, copy=False)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        keys = list(self.vectors)
+        vectors = np.stack([self.vectors[k] for k in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+        tmp_path = self.path.with_name(self.path.stem + ".tmp.npz")
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), vectors=vectors)
+        tmp_path.replace(self.path)
+
+
+@dataclass
+class TextIndex:
+    split_docs: list
+    faiss_store: FAISS
+    bm25_retriever: SparseBM25Retriever
+    fingerprint: str
+    vectors: np.ndarray
+
+
+def _model_slug(settings: dict) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(settings.get("embedding_model", "default")))
+
+
+def load_text_index(index_dir: Path, embeddings, fingerprint: str) -> TextIndex | None:
+    """디스크에 저장된 텍스트 인덱스를 로드합니다. 파일이 하나라도 없으면 None."""
+    index_dir = Path(index_dir)
+    if not all((index_dir / name).exists() for name in ("index.faiss", "index.pkl", "chunks.pkl", "bm25.pkl", "vectors.npy")):
+        return None
+    with open(index_dir / "chunks.pkl", "rb") as f: split_docs = pickle.load(f)
+    with open(index_dir / "bm25.pkl", "rb") as f: bm25_retriever = pickle.load(f)
+    # FAISS.load_local 과 같은 파일 구성이지만, 인덱스는 메모리 매핑으로 읽어 워커 프로세스끼리 페이지 캐시를 공유
+    with open(index_dir / "index.pkl", "rb") as f: docstore, index_to_docstore_id = pickle.load(f)
+    faiss_store = FAISS(embeddings, load_dense_index(index_dir / "index.faiss"), docstore, index_to_docstore_id)
+    vectors = np.load(index_dir / "vectors.npy", mmap_mode="r")
+    print(f"텍스트 인덱스 캐시 로드: {index_dir} ({len(split_docs)}개 청크)")
+    return TextIndex(split_docs, faiss_store, bm25_retriever, fingerprint, vectors)
+
+
+def build_text_index(split_docs: list, embeddings, fingerprint: str, source_name: str, settings: dict,
+                     cache_dir: Path = CACHE_DIR) -> TextIndex:
+    """
+    청크를 임베딩(바뀐 청크만)해 FAISS/BM25 인덱스를 만들고 cache_dir/text/<source_name>/<fingerprint> 에 저장합니다.
+    같은 source_name 의 이전 버전 인덱스는 지웁니다.
+    """
+    source_dir = Path(cache_dir) / "text" / source_name
+    index_dir = source_dir / fingerprint[:16]
+    texts = [d.page_content for d in split_docs]
+
+    store = EmbeddingStore(Path(cache_dir) / "embeddings" / source_name / f"{_model_slug(settings)}.npz")
+    vectors = store.embed(texts, embeddings)
+    store.save()
+
+    # settings['dense'] 가 있으면 양자화 인덱스 (rag.dense_index.build_dense_index 인자)
+    dense_index = build_dense_index(vectors, **settings["dense"]) if settings.get("dense") and len(vectors) else None
+    faiss_store = build_faiss_store(split_docs, vectors, embeddings, index=dense_index)
+    bm25_retriever = SparseBM25Retriever.from_documents(split_docs)
+
+    # 이전 버전의 인덱스는 지우고 현재 버전만 남김
+    if source_dir.exists():
+        shutil.rmtree(source_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    faiss_store.save_local(str(index_dir))
+    with open(index_dir / "chunks.pkl", "wb") as f: pickle.dump(split_docs, f)
+    with open(index_dir / "bm25.pkl", "wb") as f: pickle.dump(bm25_retriever, f)
+    np.save(index_dir / "vectors.npy", vectors)
+    print(f"텍스트 인덱스 생성 및 저장: {index_dir} ({len(split_docs)}개 청크)")
+    return TextIndex(split_docs, faiss_store, bm25_retriever, fingerprint, vectors)
+
+
+def load_or_build_text_index(source_text: str, source_name: str, text_splitter, embeddings,
+                             settings: dict, cache_dir: Path = CACHE_DIR) -> TextIndex:
+    """
+    캐시된 텍스트 인덱스를 로드하거나, 없으면 만들어서 저장합니다.
+
+    Args:
+        source_text (str): 원본 문서 텍스트.
+        source_name (str): 캐시 디렉토리 이름으로 쓰일 문서 이름 (예: '회로이론').
+        text_splitter: LangChain TextSplitter.
+        embeddings: LangChain Embeddings 객체.
+        settings (dict): 인덱스 키에 포함될 분할/임베딩 설정.
+        cache_dir (Path): 캐시 루트 디렉토리.
+
+    Returns:
+        TextIndex: 청크, FAISS 벡터스토어, BM25 검색기, 청크 임베딩 행렬.
+    """
+    fingerprint = index_fingerprint(source_text, settings)
+    index_dir = Path(cache_dir) / "text" / source_name / fingerprint[:16]
+    text_index = load_text_index(index_dir, embeddings, fingerprint)
+    if text_index is not None:
+        return text_index
+
+    split_docs = text_splitter.create_documents(split_markdown_sections(source_text))
+    return build_text_index(split_docs, embeddings, fingerprint, source_name, settings, cache_dir)
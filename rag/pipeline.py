@@ -0,0 +1,421 @@
+"""
+텍스트/이미지 인덱스, Gemma 생성기, LCEL 체인을 한 번에 구성하는 파이프라인.
+
+rag_text_and_image.py(일회성 실행)와 rag.server(상주 서버)가 같은 구성 코드를 공유합니다.
+"""
+import os
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+from langchain_core.runnables import RunnableLambda
+
+from rag.generation import GemmaGenerator, streaming_runnable
+from rag.index_cache import CACHE_DIR, load_or_build_text_index, sha256_text
+from rag.prefix_cache import PrefixKVCache
+from rag.profiling import report_stage
+from rag.response_cache import ResponseCache, cache_key
+from rag.retrieval_cache import RetrievalCache, normalize_query
+from rag.sparse import HybridRetriever
+from rag.structured import JsonStringArraySchema, QuizSchema
+from rag.tracing import TracedEmbeddings, traced, traced_chain, tracer
+
+
+@dataclass
+class PipelineConfig:
+    """파이프라인 설정. model_path 는 환경 변수 GEMMA_MODEL_PATH 로도 지정할 수 있습니다."""
+    file_path: str = "./data/회로이론.md"
+    image_dir: str = "tmp"
+    model_path: str = os.environ.get(
+        "GEMMA_MODEL_PATH", "C:/Users/user/PycharmProjects/PythonProject/cache/gemma-3-4b-it-safetensors"
+    )
+    chunk_size: int = 300
+    chunk_overlap: int = 50
+    embedding_model: str = "nlpai-lab/KoE5"
+    clip_model: str = "ViT-H-14-378-quickgelu"
+    clip_checkpoint: str = "dfn5b"
+    max_new_tokens: int = 1024
+    max_batch_size: int = 8
+    # 접두사 KV 캐시 크기 (0 이면 끔). 켜면 generate_batch 가 프롬프트를 하나씩 생성하고, 프롬프트는 문서 → 지시문 순서가 됨
+    prefix_cache_bytes: int = int(os.environ.get("RAG_PREFIX_CACHE_BYTES", 0))
+    # 과목별 디렉토리 트리(<corpus_dir>/<과목>/*.md, *.png). 지정하면 과목마다 별도 인덱스 파티션을 사용 (rag.corpus)
+    corpus_dir: str | None = os.environ.get("RAG_CORPUS_DIR")
+    ingest_workers: int = 4
+    # 밀집 인덱스 종류: flat(정확) / sq8 / ivf_sq8 / ivfpq (rag.dense_index). nlist/nprobe/refine 으로 recall·지연 조절
+    dense_index: str = os.environ.get("RAG_DENSE_INDEX", "flat")
+    dense_nlist: int | None = None
+    dense_pq_m: int = 64
+    dense_nprobe: int = 16
+    dense_refine_factor: int = 0
+    # 생성 모델 백엔드: device=auto(device_map="auto", bf16) / cpu. quantization=int8 은 CPU 에서 Linear 동적 양자화 (rag.cpu_backend)
+    device: str = os.environ.get("RAG_DEVICE", "auto")
+    quantization: str = os.environ.get("RAG_QUANTIZATION", "none")
+    num_threads: int | None = int(os.environ["RAG_NUM_THREADS"]) if os.environ.get("RAG_NUM_THREADS") else None
+    # 보조 디코딩용 draft 모델 (같은 토크나이저, 예: gemma-3-1b-it). 지정하면 run_gemma_chat 이 greedy 보조 디코딩으로 생성 (rag.assisted)
+    draft_model_path: str | None = os.environ.get("GEMMA_DRAFT_MODEL_PATH")
+    num_assistant_tokens: int = 5
+    # 요약/퀴즈 응답 캐시 (rag.response_cache). 경로가 없으면 끔. similarity 를 주면(예: 0.95) 같은 검색 문맥 안에서
+    # 키워드 임베딩 유사도 조회도 사용 (기본은 정확히 같은 키만)
+    response_cache_path: str | None = os.environ.get("RAG_RESPONSE_CACHE")
+    response_cache_ttl_sec: float | None = 7 * 24 * 3600
+    response_cache_max_entries: int = 10000
+    response_cache_similarity: float | None = (
+        float(os.environ["RAG_RESPONSE_CACHE_SIMILARITY"]) if os.environ.get("RAG_RESPONSE_CACHE_SIMILARITY") else None
+    )
+
+
+# 프롬프트 빌더
+# context_first=True 면 [문서]/[이미지] 를 지시문보다 앞에 두어, 같은 키워드의 요약/퀴즈 프롬프트가 같은 접두사로 시작하도록 함
+# (접두사 KV 캐시 재사용용). 기본은 지시문 → 문서 순서 그대로.
+def build_context_block(x: dict) -> str:
+    return (
+        f"[문서]\n{x['context']}\n"
+        f"[이미지]\n{x['image']}\n"
+    )
+
+def _user_turn(x: dict, instruction: str, context_first: bool) -> str:
+    body = build_context_block(x) + "\n" + instruction if context_first else instruction + "\n" + build_context_block(x)
+    return "<start_of_turn>user\n" + body + "<end_of_turn>\n<start_of_turn>model\n"
+
+def build_keyword_messages(x: dict, context_first: bool = False) -> str:
+    where = "위" if context_first else "다음"
+    return _user_turn(x, (
+        f"전기전자공학 전문가로서, {where} 문서에서 기술 중심 키워드 5개만 리스트로 추출하세요.\n"
+        "일반 용어는 제외하고, 출력은 반드시 [\"키워드1\",\"키워드2\",...] 형식으로 해주세요.\n"
+    ), context_first)
+
+def build_summary_messages(x: dict, context_first: bool = False) -> str:
+    return _user_turn(x, (
+        f"전기전자공학 요약 전문가로서, '{x['keyword']}'에 대해 5문장 이내로 요약하세요. 반복은 피하고, 용어 번역은 하지 마세요.한글로 작성하세요.\n"
+    ), context_first)
+
+def build_quiz_messages(x: dict, context_first: bool = False) -> str:
+    return _user_turn(x, (
+        f"전자공학 시험 문제 출제자입니다. '{x['keyword']}' 관련 4지선다 문제 1개를 아래 형식으로 생성하세요. 한글로 작성하세요.\n"
+        "문제: ...\n1) ...\n정답: 번호\n"
+    ), context_first)
+
+
+def text_index_settings(config: PipelineConfig) -> dict:
+    """텍스트 인덱스 키에 포함될 분할/임베딩 설정."""
+    settings = {"splitter": "token", "chunk_size": config.chunk_size, "chunk_overlap": config.chunk_overlap,
+                "embedding_model": config.embedding_model, "sparse": "bm25-csr"}
+    if config.dense_index != "flat":
+        settings["dense"] = {"kind": config.dense_index, "nlist": config.dense_nlist, "pq_m": config.dense_pq_m,
+                             "nprobe": config.dense_nprobe, "refine_factor": config.dense_refine_factor}
+    return settings
+
+
+def load_text_embeddings(config: PipelineConfig):
+    from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=config.embedding_model, encode_kwargs={"batch_size": 64})
+
+
+def build_text_retriever(config: PipelineConfig):
+    """
+    텍스트 문서를 로드해 BM25 + FAISS 하이브리드 검색기를 만듭니다.
+
+    Returns:
+        tuple: (HybridRetriever, 텍스트 인덱스 fingerprint)
+    """
+    from langchain_text_splitters import TokenTextSplitter
+
+    #텍스트 문서 로드
+    try:
+        with open(config.file_path, "r", encoding="utf-8") as f: docs = f.read()
+    except Exception as e: print(f"파일 읽기 오류: {e}"); raise
+
+    #토큰단위로 자르기
+    text_splitter = TokenTextSplitter(chunk_size=config.chunk_size, chunk_overlap=config.chunk_overlap)
+
+    # 텍스트 임베딩 & FAISS/BM25 검색기 (.rag_cache에 캐시, 바뀐 청크만 다시 임베딩)
+    embeddings = load_text_embeddings(config)
+    with report_stage("텍스트 ingest"):
+        text_index = load_or_build_text_index(
+            docs, Path(config.file_path).stem, text_splitter, embeddings, settings=text_index_settings(config),
+        )
+
+    return make_hybrid_retriever(text_index), text_index.fingerprint
+
+
+def make_hybrid_retriever(text_index) -> HybridRetriever:
+    # BM25 와 FAISS 를 동시에 검색해 EnsembleRetriever(weights=[0.3, 0.7]) 와 같은 가중 RRF 로 합침
+    return HybridRetriever(
+        sparse_retriever=text_index.bm25_retriever, faiss_store=text_index.faiss_store, k=1, weights=[0.3, 0.7],
+    )
+
+
+def load_clip_embeddings(config: PipelineConfig):
+    from langchain_experimental.open_clip import OpenCLIPEmbeddings
+
+    return OpenCLIPEmbeddings(model_name=config.clip_model, checkpoint=config.clip_checkpoint)
+
+
+def build_image_retriever(config: PipelineConfig, image_uris: list | None = None, collection_name: str = "multimodal",
+                          cache_dir: Path = CACHE_DIR / "images", clip_embeddings=None):
+    """
+    이미지를 CLIP 으로 인덱싱해 이미지 검색기를 만듭니다.
+
+    Args:
+        config (PipelineConfig): 설정.
+        image_uris (list | None): 인덱싱할 이미지 경로. None 이면 config.image_dir 의 PNG 전체.
+        collection_name (str): Chroma 컬렉션 이름 (과목별 파티션은 과목마다 다른 이름을 사용).
+        cache_dir (Path): 이미지 임베딩 캐시 디렉토리.
+        clip_embeddings: 이미 로드된 OpenCLIPEmbeddings. None 이면 새로 로드.
+
+    Returns:
+        tuple: (이미지 검색기, 이미지 인덱스 버전)
+    """
+    from langchain_chroma import Chroma
+
+    from rag.image_index import sync_image_index
+
+    #이미지 로드
+    if image_uris is None:
+        image_uris = sorted([str(p) for p in Path(config.image_dir).glob("*.png")])
+
+    #이미지 임베딩 & 벡터스토어 & 검색기
+    image_embedding_function = clip_embeddings or load_clip_embeddings(config)
+
+    # DB 생성 (디스크에 저장되어 재시작 시 바뀐 이미지만 반영). 질의 시 CLIP 텍스트 인코딩은 clip_encode 단계로 기록
+    image_db = Chroma(
+        collection_name=collection_name,
+        embedding_function=TracedEmbeddings(image_embedding_function, "clip_encode"),
+        persist_directory=str(CACHE_DIR / "image_chroma"),
+    )
+
+    # 이미지 추가 (배치 인코딩, 경로/mtime/해시 기준 캐시)
+    with report_stage("이미지 ingest"):
+        image_index_version = sync_image_index(
+            image_uris, image_db, image_embedding_function,
+            model_name=f"{config.clip_model}/{config.clip_checkpoint}", cache_dir=cache_dir,
+            batch_size=16, num_workers=4,
+        )
+
+    # Image Retriever 생성
+    return image_db.as_retriever(search_kwargs={"k": 1}), image_index_version
+
+
+def generation_settings(config: PipelineConfig) -> dict:
+    """응답 캐시 키에 포함될 생성 설정 (모델이나 생성 길이가 바뀌면 이전 응답을 쓰지 않음)."""
+    return {"model": config.model_path, "quantization": config.quantization, "max_new_tokens": config.max_new_tokens,
+            "draft_model": config.draft_model_path}
+
+
+def build_response_cache(config: PipelineConfig, embeddings=None) -> ResponseCache | None:
+    """config.response_cache_path 가 있으면 응답 캐시를 만듭니다. embeddings 는 키워드 유사도 조회에 사용."""
+    if not config.response_cache_path:
+        return None
+    use_similarity = config.response_cache_similarity is not None
+    return ResponseCache(
+        config.response_cache_path, ttl_sec=config.response_cache_ttl_sec,
+        max_entries=config.response_cache_max_entries, embeddings=embeddings if use_similarity else None,
+        similarity_threshold=config.response_cache_similarity if use_similarity else 1.0,
+    )
+
+
+def load_draft_model(config: PipelineConfig):
+    """보조 디코딩용 draft 모델(텍스트 전용 causal LM)을 본 모델과 같은 백엔드로 로드합니다. 경로가 없으면 None."""
+    if not config.draft_model_path:
+        return None
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    if config.device == "cpu" or config.quantization != "none":
+        from rag.cpu_backend import load_cpu_model
+
+        return load_cpu_model(config.draft_model_path, quantization=config.quantization, num_threads=config.num_threads,
+                              model_cls=AutoModelForCausalLM)
+    return AutoModelForCausalLM.from_pretrained(config.draft_model_path, torch_dtype=torch.bfloat16, device_map="auto").eval()
+
+
+def load_generator(config: PipelineConfig, model_path: str | None = None) -> GemmaGenerator:
+    """Gemma 모델과 프로세서를 로드해 GemmaGenerator 를 만듭니다. device=cpu 또는 quantization=int8 이면 CPU 백엔드를 사용합니다."""
+    import torch
+    from transformers import AutoProcessor, Gemma3ForConditionalGeneration
+
+    # llm 모델 설정
+    model_path = model_path or config.model_path
+    if config.device == "cpu" or config.quantization != "none":
+        from rag.cpu_backend import load_cpu_model
+
+        model = load_cpu_model(model_path, quantization=config.quantization, num_threads=config.num_threads)
+    else:
+        model = Gemma3ForConditionalGeneration.from_pretrained(model_path, torch_dtype=torch.bfloat16, device_map="auto").eval()
+    processor = AutoProcessor.from_pretrained(model_path)
+    # prefix_cache_bytes 를 주면 겹치는 접두사의 KV 캐시를 재사용 (LRU). 이때 배치 생성도 프롬프트를 하나씩 생성
+    return GemmaGenerator(
+        model, processor, max_new_tokens=config.max_new_tokens, max_batch_size=config.max_batch_size,
+        prefix_cache=PrefixKVCache(max_bytes=config.prefix_cache_bytes) if config.prefix_cache_bytes else None,
+        assistant_model=load_draft_model(config), num_assistant_tokens=config.num_assistant_tokens,
+    )
+
+
+class RagPipeline:
+    """
+    검색 캐시와 생성기로 키워드/요약/퀴즈 체인을 구성합니다.
+
+    Args:
+        retrieval_cache (RetrievalCache): 키워드별 검색 결과 캐시.
+        generator: GemmaGenerator (또는 같은 generate/generate_batch/stream 인터페이스를 가진 객체).
+        response_cache (ResponseCache | None): 요약/퀴즈 응답 캐시. None 이면 매번 생성.
+        generation_settings (dict | None): 응답 캐시 키에 포함될 생성 설정 (generation_settings(config)).
+
+    생성기에 접두사 KV 캐시가 있으면 프롬프트를 문서 → 지시문 순서(context_first)로 만들어 같은 키워드의
+    요약/퀴즈가 문맥 prefill 을 공유하도록 합니다. 없으면 원래의 지시문 → 문서 순서를 씁니다.
+    """
+
+    def __init__(self, retrieval_cache: RetrievalCache, generator, response_cache: ResponseCache | None = None,
+                 generation_settings: dict | None = None):
+        self.retrieval_cache = retrieval_cache
+        self.generator = generator
+        self.response_cache = response_cache
+        self.generation_settings = generation_settings or {}
+        self.context_first = getattr(generator, "prefix_cache", None) is not None
+        build_keywords = partial(build_keyword_messages, context_first=self.context_first)
+        self._templates = {
+            "summary": partial(build_summary_messages, context_first=self.context_first),
+            "quiz": partial(build_quiz_messages, context_first=self.context_first),
+        }
+
+        # 구조화 출력: 키워드는 최대 5개 문자열의 JSON 배열, 퀴즈는 문제/보기 4개/정답 형식이 완성되면 바로 멈춤
+        self.keyword_schema = JsonStringArraySchema(max_items=5)
+        self.quiz_schema = QuizSchema(num_options=4)
+
+        # 체인 구성 부분 (각 단계는 rag.tracing 으로 체인/단계별 소요 시간을 기록, 추적이 꺼져 있으면 그대로 실행)
+        self.keywords_prompt_chain = (
+            RunnableLambda(traced("retrieval", retrieval_cache.assign("input"), chain="keywords_chain"))
+            | traced("prompt", build_keywords, chain="keywords_chain")
+        )
+        self.keywords_chain = traced_chain("keywords_chain", self.keywords_prompt_chain | self.run_gemma_keywords)
+
+        self.summary_prompt_chain = (
+            RunnableLambda(traced("retrieval", retrieval_cache.assign("keyword"), chain="summary_chain"))
+            | traced("prompt", self._templates["summary"], chain="summary_chain")
+        )
+        # 응답 캐시가 있으면 검색 결과로 키를 만들어 조회하고, 없을 때만 프롬프트를 만들어 생성
+        self.summary_chain = traced_chain("summary_chain", self._cached_chain(
+            "summary", self._templates["summary"], self.run_gemma_chat, self.summary_prompt_chain,
+        ))
+
+        self.quiz_prompt_chain = (
+            RunnableLambda(traced("retrieval", retrieval_cache.assign("keyword"), chain="quiz_chain"))
+            | traced("prompt", self._templates["quiz"], chain="quiz_chain")
+        )
+        self.quiz_chain = traced_chain("quiz_chain", self._cached_chain(
+            "quiz", self._templates["quiz"], self.run_gemma_quiz, self.quiz_prompt_chain,
+        ))
+
+        # 스트리밍 체인 (.stream() / .astream() 으로 생성 텍스트를 조금씩 받음, 통계는 generator.last_stats)
+        self.keywords_stream_chain = self.keywords_prompt_chain | streaming_runnable(
+            generator, schema=self.keyword_schema, max_new_tokens=128
+        )
+        self.summary_stream_chain = self.summary_prompt_chain | streaming_runnable(generator)
+        self.quiz_stream_chain = self.quiz_prompt_chain | streaming_runnable(generator, schema=self.quiz_schema)
+
+    def _cache_keys(self, template: str, x: dict) -> tuple:
+        """
+        검색 결과 x 의 응답 캐시 키.
+
+        Returns:
+            tuple: (정확 조회 키, 유사도 조회 범위). 범위는 템플릿·인덱스 버전·생성 설정·검색 문맥이 모두 같은 항목끼리만
+                키워드 유사도를 비교하도록 함 (비슷하지만 다른 키워드는 보통 다른 문맥을 검색하므로 서로의 응답을 쓰지 않음).
+        """
+        # 템플릿 문구가 바뀌면 키도 바뀌도록, 빈 입력으로 만든 프롬프트를 키에 포함
+        build = self._templates[template]
+        scope = {
+            "template": template,
+            "template_text": build({"context": "", "image": "", "keyword": ""}),
+            "index_version": self.retrieval_cache.index_version,
+            "settings": self.generation_settings,
+            "context": sha256_text(x["context"]),
+            "image_uri": x.get("image_uri"),  # 이미지는 PIL 객체의 repr 대신 경로로 구분
+        }
+        key = {**scope, "keyword": normalize_query(x["keyword"])}
+        return cache_key(key), cache_key(scope)
+
+    def _cached_chain(self, template: str, build, run, prompt_chain):
+        if self.response_cache is None:
+            return prompt_chain | run
+        chain = f"{template}_chain"
+        retrieval = RunnableLambda(traced("retrieval", self.retrieval_cache.assign("keyword"), chain=chain))
+
+        def generate(x: dict) -> str:
+            key, scope = self._cache_keys(template, x)
+            response = self.response_cache.get(key, scope, x["keyword"])
+            if response is None:
+                response = run(traced("prompt", build, chain=chain)(x))
+                self.response_cache.put(key, response, scope, x["keyword"])
+            return response
+
+        return retrieval | generate
+
+    def run_cached_batch(self, template: str, keyword_inputs: list, schema=None) -> list:
+        """
+        키워드 입력 목록의 요약('summary') 또는 퀴즈('quiz')를 만듭니다.
+        응답 캐시에 있는 키워드는 바로 돌려주고, 나머지만 한 번에 배치 생성합니다.
+        추적 시 단계는 '<template>_chain' 체인으로 기록됩니다.
+        """
+        chain = f"{template}_chain"
+        prompt_chain = self.summary_prompt_chain if template == "summary" else self.quiz_prompt_chain
+        if self.response_cache is None:
+            return self.run_gemma_chat_batch(prompt_chain.batch(keyword_inputs), schema=schema, chain=chain)
+        build = traced("prompt", self._templates[template], chain=chain)
+        retrieve = traced("retrieval", self.retrieval_cache.assign("keyword"), chain=chain)
+        retrieved = [retrieve(x) for x in keyword_inputs]
+        keys = [self._cache_keys(template, x) for x in retrieved]
+        responses = [self.response_cache.get(key, scope, x["keyword"]) for x, (key, scope) in zip(retrieved, keys)]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            generated = self.run_gemma_chat_batch([build(retrieved[i]) for i in missing], schema=schema, chain=chain)
+            for i, response in zip(missing, generated):
+                key, scope = keys[i]
+                self.response_cache.put(key, response, scope, retrieved[i]["keyword"])
+                responses[i] = response
+        return responses
+
+    def run_gemma_chat(self, formatted_prompt):
+        # draft 모델이 있으면 보조 디코딩 (수락률/속도 향상은 generator.last_stats). 배치/퀴즈 생성도 같음
+        with tracer.span("generate", chain="summary_chain"):
+            return self.generator.generate(formatted_prompt)
+
+    def run_gemma_chat_batch(self, formatted_prompts, schema=None, chain: str = "batch"):
+        # chain: 추적에서 생성 단계를 기록할 체인 이름 (요약/퀴즈 배치는 summary_chain / quiz_chain)
+        with tracer.span("generate", chain=chain):
+            return self.generator.generate_batch(formatted_prompts, schema=schema)
+
+    def run_gemma_keywords(self, formatted_prompt):
+        with tracer.span("generate", chain="keywords_chain"):
+            return self.generator.generate(formatted_prompt, schema=self.keyword_schema, max_new_tokens=128)
+
+    def run_gemma_quiz(self, formatted_prompt):
+        with tracer.span("generate", chain="quiz_chain"):
+            return self.generator.generate(formatted_prompt, schema=self.quiz_schema)
+
+    def extract_keywords(self, query: str) -> list:
+        """키워드 체인을 실행해 키워드 리스트를 반환합니다."""
+        return self.keyword_schema.parse(self.keywords_chain.invoke({"input": query}))
+
+
+def build_pipeline(config: PipelineConfig | None = None, generator=None) -> RagPipeline:
+    """
+    인덱스와 모델을 로드해 RagPipeline 을 만듭니다.
+
+    Args:
+        config (PipelineConfig | None): 설정. None 이면 기본값.
+        generator: 이미 로드된 생성기. None 이면 config.model_path 에서 로드.
+    """
+    config = config or PipelineConfig()
+    text_retriever, text_fingerprint = build_text_retriever(config)
+    image_retriever, image_index_version = build_image_retriever(config)
+
+    # 검색 결과 캐시 (summary_chain / quiz_chain 이 같은 키워드의 검색 결과와 이미지를 공유)
+    retrieval_cache = RetrievalCache(
+        text_retriever, image_retriever,
+        index_version=f"{text_fingerprint[:16]}-{image_index_version}",
+    )
+    # 응답 캐시의 키워드 유사도 조회는 검색에 쓰는 텍스트 임베딩(KoE5)을 재사용
+    response_cache = build_response_cache(config, text_retriever.faiss_store.embedding_function)
+    return RagPipeline(retrieval_cache, generator or load_generator(config), response_cache=response_cache,
+                       generation_settings=generation_settings(config))
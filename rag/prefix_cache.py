@@ -0,0 +1,125 @@
+"""
+반복되는 프롬프트 접두사의 KV 캐시를 보관하는 LRU 캐시.
+
+요약/퀴즈 프롬프트는 같은 키워드에 대해 같은 [문서] 문맥으로 시작하므로,
+앞선 호출에서 계산한 KV 캐시를 재사용하면 그만큼 prefill 연산을 건너뛸 수 있습니다.
+"""
+import copy
+import threading
+from collections import OrderedDict
+
+
+def cache_nbytes(past_key_values) -> int:
+    """KV 캐시가 차지하는 텐서 메모리(byte)를 계산합니다."""
+    layers = getattr(past_key_values, "layers", None)
+    if layers is not None:
+        tensors = [t for layer in layers for t in (getattr(layer, "keys", None), getattr(layer, "values", None))]
+    else:
+        tensors = list(getattr(past_key_values, "key_cache", [])) + list(getattr(past_key_values, "value_cache", []))
+    return sum(t.numel() * t.element_size() for t in tensors if t is not None and hasattr(t, "numel"))
+
+
+def can_crop(past_key_values, tokens_to_remove: int) -> bool:
+    """
+    KV 캐시 뒤쪽 tokens_to_remove 개를 잘라낼 수 있는지 확인합니다.
+    sliding window 층(Gemma3 의 local attention)은 창 크기만큼 채워지면 오래된 상태를 버리므로, 그 뒤로는 잘라서 되돌릴 수 없습니다.
+    """
+    if tokens_to_remove <= 0:
+        return True
+    for layer in getattr(past_key_values, "layers", None) or []:
+        window = getattr(layer, "sliding_window", None)
+        if window is not None and layer.get_seq_length() >= window and not getattr(layer, "record_past", False):
+            return False
+    return True
+
+
+def common_prefix_length(a: tuple, b: list) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class PrefixKVCache:
+    """
+    토큰 ID 접두사 → KV 캐시 LRU. 전체 KV 텐서 크기가 max_bytes 를 넘지 않도록 오래된 항목부터 제거합니다.
+
+    Args:
+        max_bytes (int): 보관할 KV 캐시 총 크기 상한.
+        min_prefix_tokens (int): 이보다 짧게 겹치는 접두사는 재사용하지 않음.
+    """
+
+    def __init__(self, max_bytes: int = 2 * 1024 ** 3, min_prefix_tokens: int = 16):
+        self.max_bytes = max_bytes
+        self.min_prefix_tokens = min_prefix_tokens
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._entries = OrderedDict()  # tuple(token_ids) -> (past_key_values, nbytes)
+        self._lock = threading.Lock()
+
+    def lookup(self, token_ids: list) -> tuple:
+        """
+        token_ids 와 가장 길게 겹치는 캐시 항목을 찾아, 겹치는 길이로 자른 복사본을 반환합니다.
+        마지막 토큰 하나는 모델에 넣어야 하므로 재사용 길이는 최대 len(token_ids) - 1 입니다.
+        sliding window 층이 창 크기를 넘어 자를 수 없는 항목은 건너뜁니다 (can_crop).
+
+        Returns:
+            tuple: (재사용한 토큰 수, KV 캐시 복사본 또는 None)
+        """
+        limit = len(token_ids) - 1
+        with self._lock:
+            candidates = sorted(
+                ((min(common_prefix_length(key, token_ids), limit), key) for key in self._entries),
+                key=lambda candidate: candidate[0], reverse=True,
+            )
+            # 가장 길게 겹치는 항목부터, 겹치는 길이로 자를 수 있는 항목을 사용 (자를 수 없으면 더 짧은 항목으로 넘어감)
+            taken = None
+            for length, key in candidates:
+                if length < self.min_prefix_tokens:
+                    break
+                cached = self._entries[key][0]
+                extra = cached.get_seq_length() - length
+                if can_crop(cached, extra):
+                    self._entries.move_to_end(key)
+                    taken = length, extra, copy.deepcopy(cached)
+                    break
+            if taken is None:
+                self.misses += 1
+                return 0, None
+            length, extra, past_key_values = taken
+            self.hits += 1
+            self.tokens_saved += length
+        if extra > 0:
+            past_key_values.crop(-extra)
+        return length, past_key_values
+
+    def store(self, token_ids: list, past_key_values):
+        """token_ids 전체를 덮는 KV 캐시의 복사본을 저장합니다."""
+        if len(token_ids) < self.min_prefix_tokens:
+            return
+        nbytes = cache_nbytes(past_key_values)
+        if nbytes > self.max_bytes:
+            return
+        key = tuple(token_ids)
+        snapshot = copy.deepcopy(past_key_values)
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (snapshot, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "prefill_tokens_saved": self.tokens_saved,
+            }
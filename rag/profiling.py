@@ -0,0 +1,64 @@
+"""
+ingest 단계의 소요 시간과 메모리 사용량을 출력하는 보조 함수.
+"""
+import sys
+import time
+from contextlib import contextmanager
+
+
+def peak_rss_mb() -> float | None:
+    """
+    현재 프로세스의 최대 RSS(MB)를 반환합니다. 측정할 수 없는 환경이면 None.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux는 KB, macOS는 byte 단위
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def current_rss_mb() -> float | None:
+    """
+    현재 프로세스의 RSS(MB)를 반환합니다 (최댓값이 아니라 지금 값이므로 해제된 메모리만큼 줄어듦). 측정할 수 없으면 None.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        import resource
+        return resident_pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, ImportError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+@contextmanager
+def report_stage(name: str):
+    """
+    with 블록의 소요 시간과 최대 RSS를 출력합니다.
+
+    Args:
+        name (str): 출력에 표시할 단계 이름.
+    """
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        rss_after = peak_rss_mb()
+        if rss_after is None:
+            print(f"[{name}] {elapsed:.2f}초")
+        else:
+            print(f"[{name}] {elapsed:.2f}초, 최대 RSS {rss_after:.0f}MB (+{rss_after - rss_before:.0f}MB)")
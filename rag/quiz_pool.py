@@ -0,0 +1,328 @@
+"""
+과목별 퀴즈 사전 생성 풀.
+
+배치 작업이 과목마다 키워드 → 요약 → 퀴즈(모델 A/B) 파이프라인을 미리 돌려 디스크 풀에 저장하고,
+서버는 요청마다 세션이 아직 받지 않은 다음 퀴즈를 O(1)로 꺼냅니다.
+풀은 과목별 JSONL 파일과 고정 폭(int64) 오프셋 파일로 이루어져 있어 i번째 퀴즈를 seek 두 번으로 읽습니다.
+보충할 때마다 검색 질의를 바꿔(처음에는 과목 질의, 다음부터는 풀에 들어온 키워드) 코퍼스의 다른 부분에서 키워드를 뽑고,
+이미 풀에 있는 키워드는 건너뜁니다. 쓸 질의가 더 없으면 그 과목은 소진된 것으로 봅니다.
+
+사전 생성:
+    python -m rag.quiz_pool --per-subject 20            # 모든 과목
+    python -m rag.quiz_pool --subjects 회로이론1 --stub  # stub 모델로 로컬 테스트
+"""
+import argparse
+import json
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from rag.index_cache import CACHE_DIR
+from rag.retrieval_cache import normalize_query
+
+SUBJECTS = [
+    "객체지향프로그래밍", "디지털논리회로", "디지털시스템설계", "멀티미디어",
+    "자료구조론", "컴퓨터네트워크", "회로이론1", "기계학습개론",
+    "데이터베이스설계", "신호및시스템", "알고리즘설계", "전자기학1",
+    "정보보호론", "확률변수",
+]
+
+OFFSET = struct.Struct("<q")
+
+
+def base_query(subject: str) -> str:
+    """과목의 첫 키워드 추출 질의."""
+    return f"{subject} 강의 핵심 키워드 추출"
+
+
+class QuizPool:
+    """
+    과목별 디스크 퀴즈 풀과 세션별 '이미 받은 문제' 커서.
+
+    세션은 과목의 퀴즈를 0번부터 순서대로 받으므로, (세션, 과목)마다 다음 번호 하나만 기억하면 됩니다.
+    과목마다 풀에 든 키워드와 키워드 추출에 이미 쓴 질의(queries.json)도 기록합니다.
+
+    Args:
+        pool_dir (str): 풀 디렉토리. 과목마다 하위 디렉토리에 quizzes.jsonl, offsets.bin 을 둡니다.
+        max_sessions (int): 메모리에 보관할 최대 세션 수 (오래된 세션부터 제거).
+    """
+
+    def __init__(self, pool_dir: str = CACHE_DIR / "quiz_pool", max_sessions: int = 10000):
+        self.pool_dir = Path(pool_dir)
+        self.max_sessions = max_sessions
+        self._cursors = OrderedDict()  # session_id -> {subject: 다음 번호}
+        self._max_served = {}  # subject -> 가장 앞선 세션이 받은 문제 수
+        self._keywords = {}  # subject -> {정규화된 키워드: 키워드} (풀에 들어온 순서)
+        self._lock = threading.Lock()
+
+    def _paths(self, subject: str) -> tuple:
+        subject_dir = self.pool_dir / subject
+        return subject_dir / "quizzes.jsonl", subject_dir / "offsets.bin"
+
+    def _queries_path(self, subject: str) -> Path:
+        return self.pool_dir / subject / "queries.json"
+
+    def keywords(self, subject: str) -> dict:
+        """풀에 든 키워드 {정규화된 키워드: 키워드} (처음 호출할 때 JSONL 에서 읽음)."""
+        with self._lock:
+            if subject not in self._keywords:
+                data_path, _ = self._paths(subject)
+                keywords = {}
+                if data_path.exists():
+                    with open(data_path, encoding="utf-8") as data:
+                        for line in data:
+                            keyword = json.loads(line)["keyword"]
+                            keywords.setdefault(normalize_query(keyword), keyword)
+                self._keywords[subject] = keywords
+            return dict(self._keywords[subject])
+
+    def _read_used_queries(self, subject: str) -> set:
+        path = self._queries_path(subject)
+        return set(json.loads(path.read_text(encoding="utf-8"))) if path.exists() else set()
+
+    def used_queries(self, subject: str) -> set:
+        with self._lock:
+            return self._read_used_queries(subject)
+
+    def mark_query_used(self, subject: str, query: str):
+        path = self._queries_path(subject)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            used = self._read_used_queries(subject) | {normalize_query(query)}
+            # 임시 파일에 쓰고 바꿔치기 (다른 프로세스가 반쯤 쓰인 파일을 읽지 않도록)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(sorted(used), ensure_ascii=False), encoding="utf-8")
+            tmp_path.replace(path)
+
+    def next_query(self, subject: str) -> str | None:
+        """
+        아직 키워드 추출에 쓰지 않은 다음 질의. 과목 질의를 먼저 쓰고, 그다음 풀에 들어온 키워드를 순서대로 씁니다.
+
+        Returns:
+            str | None: 질의. 더 없으면 None (과목 소진).
+        """
+        used = self.used_queries(subject)
+        for query in [base_query(subject), *self.keywords(subject).values()]:
+            if normalize_query(query) not in used:
+                return query
+        return None
+
+    def exhausted(self, subject: str) -> bool:
+        return self.next_query(subject) is None
+
+    def subjects(self) -> list:
+        return sorted(p.name for p in self.pool_dir.iterdir() if p.is_dir()) if self.pool_dir.exists() else []
+
+    def size(self, subject: str) -> int:
+        _, offsets_path = self._paths(subject)
+        return offsets_path.stat().st_size // OFFSET.size if offsets_path.exists() else 0
+
+    def append(self, subject: str, records: list):
+        """퀴즈 레코드들을 풀 끝에 추가합니다."""
+        if not records:
+            return
+        data_path, offsets_path = self._paths(subject)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        self.keywords(subject)  # 기존 키워드를 먼저 읽어 둠
+        with self._lock, open(data_path, "ab") as data, open(offsets_path, "ab") as offsets:
+            for record in records:
+                self._keywords[subject].setdefault(normalize_query(record["keyword"]), record["keyword"])
+                offset = data.tell()
+                data.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+                data.flush()
+                # 데이터를 먼저 쓰고 오프셋을 나중에 써야 읽는 쪽이 반쯤 쓰인 레코드를 보지 않음
+                offsets.write(OFFSET.pack(offset))
+                offsets.flush()
+
+    def get(self, subject: str, idx: int) -> dict:
+        data_path, offsets_path = self._paths(subject)
+        with open(offsets_path, "rb") as offsets:
+            offsets.seek(idx * OFFSET.size)
+            (offset,) = OFFSET.unpack(offsets.read(OFFSET.size))
+        with open(data_path, "rb") as data:
+            data.seek(offset)
+            return json.loads(data.readline())
+
+    def pop(self, subject: str, session_id: str) -> tuple | None:
+        """
+        세션이 아직 받지 않은 다음 퀴즈를 꺼냅니다.
+
+        Returns:
+            tuple | None: (번호, 레코드). 남은 퀴즈가 없으면 None.
+        """
+        with self._lock:
+            cursors = self._cursors.setdefault(session_id, {})
+            self._cursors.move_to_end(session_id)
+            while len(self._cursors) > self.max_sessions:
+                self._cursors.popitem(last=False)
+            idx = cursors.get(subject, 0)
+            if idx >= self.size(subject):
+                return None
+            cursors[subject] = idx + 1
+            self._max_served[subject] = max(self._max_served.get(subject, 0), idx + 1)
+        return idx, self.get(subject, idx)
+
+    def remaining(self, subject: str, session_id: str) -> int:
+        with self._lock:
+            served = self._cursors.get(session_id, {}).get(subject, 0)
+        return self.size(subject) - served
+
+    def headroom(self, subject: str) -> int:
+        """가장 앞선 세션 기준으로 과목 풀에 남은 문제 수 (보충 기준)."""
+        with self._lock:
+            served = self._max_served.get(subject, 0)
+        return self.size(subject) - served
+
+
+@dataclass
+class QuizJob:
+    """
+    과목 하나에 대해 키워드 → 요약 → 퀴즈(모델별) 파이프라인을 한 바퀴 돌리는 작업.
+
+    Args:
+        keywords_fn (callable): (과목명, 검색 질의) → 키워드 리스트.
+        summary_prompt_fn (callable): (과목명, 키워드) → 요약 프롬프트.
+        quiz_prompt_fn (callable): (과목명, 키워드) → 퀴즈 프롬프트.
+        summarize_batch (callable): 요약 프롬프트 리스트 → 요약 리스트.
+        quiz_batches (dict): 모델 이름 → (퀴즈 프롬프트 리스트 → 퀴즈 텍스트 리스트).
+        parse_quiz (callable): 퀴즈 텍스트 → {question, choices, answer, explanation}.
+    """
+    keywords_fn: callable
+    summary_prompt_fn: callable
+    quiz_prompt_fn: callable
+    summarize_batch: callable
+    quiz_batches: dict
+    parse_quiz: callable
+
+    def run(self, subject: str, query: str | None = None, exclude=()) -> list:
+        """
+        query 로 키워드를 뽑아, exclude(정규화된 키워드)에 없는 키워드의 퀴즈 레코드를 만듭니다.
+
+        Args:
+            subject (str): 과목명.
+            query (str | None): 키워드 추출 질의. None 이면 base_query(subject).
+            exclude: 건너뛸 정규화된 키워드 (보통 이미 풀에 든 키워드).
+        """
+        keywords, seen = [], set(exclude)
+        for keyword in self.keywords_fn(subject, query or base_query(subject)):
+            if normalize_query(keyword) not in seen:
+                seen.add(normalize_query(keyword))
+                keywords.append(keyword)
+        if not keywords:
+            return []
+        summaries = self.summarize_batch([self.summary_prompt_fn(subject, k) for k in keywords])
+        quiz_prompts = [self.quiz_prompt_fn(subject, k) for k in keywords]
+        quizzes = {name: batch(quiz_prompts) for name, batch in self.quiz_batches.items()}
+        return [
+            {"subject": subject, "keyword": keyword, "summary": summary,
+             **{name: self.parse_quiz(texts[i]) for name, texts in quizzes.items()}}
+            for i, (keyword, summary) in enumerate(zip(keywords, summaries))
+        ]
+
+
+def fill_pool(pool: QuizPool, job: QuizJob, subject: str, target_size: int) -> int:
+    """
+    과목 풀의 크기가 target_size 이상이 될 때까지, 아직 쓰지 않은 질의로 새 키워드의 퀴즈를 추가합니다.
+    쓸 질의가 없으면(과목 소진) 중단합니다.
+
+    Returns:
+        int: 새로 추가한 퀴즈 수.
+    """
+    added = 0
+    while pool.size(subject) < target_size:
+        query = pool.next_query(subject)
+        if query is None:
+            print(f"'{subject}' 과목에서 새 키워드를 더 찾지 못했습니다 (소진).")
+            break
+        records = job.run(subject, query, exclude=pool.keywords(subject))
+        pool.append(subject, records)
+        pool.mark_query_used(subject, query)
+        added += len(records)
+    print(f"'{subject}' 퀴즈 풀: {pool.size(subject)}개 (+{added})")
+    return added
+
+
+def build_job(stub: bool = False) -> QuizJob:
+    """
+    실제 파이프라인(또는 stub)으로 QuizJob 을 만듭니다.
+    모델 B 경로는 GEMMA_MODEL_B_PATH 로 지정하며, 없으면 모델 A 와 같은 생성기를 공유합니다.
+    """
+    from rag.structured import QuizSchema
+
+    schema = QuizSchema(num_options=4, explanation=True)
+    if stub:
+        from rag.pipeline import build_summary_messages
+        from rag.stubs import STUB_KEYWORDS, StubGenerator, stub_quiz_prompt
+
+        generators = {name: StubGenerator(name) for name in ("model_a", "model_b")}
+        # 과목 질의는 STUB_KEYWORDS, 키워드 질의는 '<키워드> 응용' 한 단계까지만 → 과목마다 10문제 뒤 소진
+        return QuizJob(
+            keywords_fn=lambda subject, query: (
+                list(STUB_KEYWORDS) if query == base_query(subject)
+                else [] if query.endswith(" 응용") else [f"{query} 응용"]
+            ),
+            summary_prompt_fn=lambda subject, k: build_summary_messages(
+                {"keyword": k, "context": f"{k} 관련 stub 문서", "image": "(이미지 없음)"}
+            ),
+            quiz_prompt_fn=lambda subject, k: stub_quiz_prompt(k),
+            summarize_batch=generators["model_a"].generate_batch,
+            quiz_batches={name: (lambda prompts, g=g: g.generate_batch(prompts, schema=schema))
+                          for name, g in generators.items()},
+            parse_quiz=schema.parse,
+        )
+
+    import os
+
+    from rag.pipeline import PipelineConfig, build_pipeline, load_generator
+    from rag.tracing import traced
+
+    config = PipelineConfig()
+    if config.corpus_dir:
+        # 과목별 파티션: 질의는 선택한 과목의 인덱스만 검색
+        from rag.corpus import build_subject_router
+
+        router = build_subject_router(config)
+        pipeline_for, generator_a = router.pipeline, router.generator
+    else:
+        pipeline = build_pipeline(config)
+        pipeline_for, generator_a = (lambda subject: pipeline), pipeline.generator
+    generator_b = generator_a
+    model_b_path = os.environ.get("GEMMA_MODEL_B_PATH")
+    if model_b_path and model_b_path != config.model_path:
+        generator_b = load_generator(config, model_b_path)
+    # 같은 생성기는 같은 함수 객체를 공유해야 서버에서 하나의 배처로 묶임. 생성 단계는 체인별로 추적
+    fns = {}
+    for generator in (generator_a, generator_b):
+        if generator not in fns:
+            fns[generator] = traced(
+                "generate", lambda prompts, g=generator: g.generate_batch(prompts, schema=schema), chain="quiz_chain",
+            )
+    return QuizJob(
+        # 질의마다 검색되는 문맥이 달라 보충할 때마다 다른 키워드가 나옴
+        keywords_fn=lambda subject, query: pipeline_for(subject).extract_keywords(query),
+        summary_prompt_fn=lambda subject, k: pipeline_for(subject).summary_prompt_chain.invoke({"keyword": k}),
+        quiz_prompt_fn=lambda subject, k: pipeline_for(subject).quiz_prompt_chain.invoke({"keyword": k}),
+        summarize_batch=traced("generate", generator_a.generate_batch, chain="summary_chain"),
+        quiz_batches={"model_a": fns[generator_a], "model_b": fns[generator_b]},
+        parse_quiz=schema.parse,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="과목별 퀴즈 사전 생성")
+    parser.add_argument("--subjects", nargs="*", default=SUBJECTS)
+    parser.add_argument("--per-subject", type=int, default=20, help="과목별 목표 퀴즈 수")
+    parser.add_argument("--pool-dir", default=str(CACHE_DIR / "quiz_pool"))
+    parser.add_argument("--stub", action="store_true", help="실제 모델 대신 결정적 stub 생성기 사용")
+    args = parser.parse_args()
+
+    pool = QuizPool(args.pool_dir)
+    job = build_job(stub=args.stub)
+    for subject in args.subjects:
+        fill_pool(pool, job, subject, args.per_subject)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+요약/퀴즈 생성 결과를 디스크에 보관하는 응답 캐시.
+
+같은 키워드(예: 키르히호프 법칙, 테브난 등가회로)는 실행과 사용자를 가리지 않고 반복해서 요청되므로, 생성 전에
+(프롬프트 템플릿, 검색된 문맥 해시, 생성 설정) 키로 이전 응답을 찾아 바로 돌려줍니다.
+임베딩 모델을 주면(선택) 키가 정확히 같지 않아도 같은 범위(템플릿 + 인덱스 버전 + 생성 설정 + 검색 문맥) 안에서
+키워드 임베딩의 코사인 유사도가 similarity_threshold 이상인 응답을 돌려줍니다. 같은 문맥을 검색한 표기만 다른 키워드
+("키르히호프 법칙" ↔ "키르히호프의 법칙")만 대상이 되고, 문맥이 다른 키워드("테브난 등가회로" ↔ "노턴 등가회로")는 섞이지 않습니다.
+SQLite 한 파일에 저장하며, 만든 지 ttl_sec 이 지난 항목은 쓰지 않고, max_entries 를 넘으면 가장 오래 쓰이지 않은 항목부터 지웁니다.
+
+설정 (PipelineConfig 또는 환경 변수):
+    RAG_RESPONSE_CACHE=.rag_cache/responses.sqlite   캐시 파일 (지정하지 않으면 끔)
+    RAG_RESPONSE_CACHE_SIMILARITY=0.95               키워드 임베딩 유사도 조회 (지정하지 않으면 정확히 같은 키만)
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from rag.tracing import tracer
+
+
+def cache_key(parts: dict) -> str:
+    """키 구성 요소 dict 의 sha256 (dict 순서와 무관)."""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    (키, 범위, 질의) → 응답 텍스트 영속 캐시.
+
+    Args:
+        path (str): SQLite 파일 경로.
+        ttl_sec (float | None): 항목 유효 시간(초). None 이면 만료 없음.
+        max_entries (int): 보관할 최대 항목 수 (넘으면 마지막 사용 시각이 오래된 것부터 삭제).
+        embeddings: embed_query 를 가진 임베딩 객체. None 이면 유사도 조회를 하지 않음.
+        similarity_threshold (float): 유사도 조회로 응답을 돌려줄 최소 코사인 유사도.
+    """
+
+    def __init__(self, path: str, ttl_sec: float | None = 7 * 24 * 3600, max_entries: int = 10000,
+                 embeddings=None, similarity_threshold: float = 0.95):
+        self.path = Path(path)
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = {}  # 범위 → (키 리스트, 단위 벡터 행렬). put/삭제 시 무효화
+        self._query_vectors = OrderedDict()  # 질의 → 단위 벡터 (get 에서 계산한 것을 put 에서 재사용)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, scope TEXT, query TEXT, embedding BLOB, "
+            "response TEXT, created REAL, last_access REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._db.commit()
+
+    def _expiry(self) -> float:
+        return time.time() - self.ttl_sec if self.ttl_sec is not None else float("-inf")
+
+    def _query_vector(self, query: str) -> np.ndarray | None:
+        if self.embeddings is None or not query:
+            return None
+        vector = self._query_vectors.get(query)
+        if vector is None:
+            with tracer.span("response_cache_embed"):
+                vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            self._query_vectors[query] = vector
+            while len(self._query_vectors) > 1024:
+                self._query_vectors.popitem(last=False)
+        return vector
+
+    def _scope_vectors(self, scope: str) -> tuple:
+        cached = self._vectors.get(scope)
+        if cached is None:
+            rows = self._db.execute(
+                "SELECT key, embedding FROM responses WHERE scope = ? AND embedding IS NOT NULL AND created >= ?",
+                (scope, self._expiry()),
+            ).fetchall()
+            keys = [key for key, _ in rows]
+            matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]) if rows else None
+            cached = self._vectors[scope] = (keys, matrix)
+        return cached
+
+    def _touch(self, key: str) -> str | None:
+        row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        response, created = row
+        if created < self._expiry():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            self._vectors.clear()
+            return None
+        self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return response
+
+    def get(self, key: str, scope: str | None = None, query: str | None = None) -> str | None:
+        """
+        키가 같은 응답을 찾고, 없으면 같은 scope 안에서 query 임베딩이 가장 가까운 응답을 찾습니다.
+
+        Returns:
+            str | None: 캐시된 응답. 없거나 만료되었으면 None.
+        """
+        with tracer.span("response_cache"), self._lock:
+            response = self._touch(key)
+            if response is not None:
+                self.hits += 1
+                return response
+            vector = self._query_vector(query) if scope is not None else None
+            if vector is not None:
+                keys, matrix = self._scope_vectors(scope)
+                if matrix is not None:
+                    similarities = matrix @ vector
+                    best = int(similarities.argmax())
+                    if similarities[best] >= self.similarity_threshold:
+                        response = self._touch(keys[best])
+                        if response is not None:
+                            self.semantic_hits += 1
+                            return response
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str, scope: str | None = None, query: str | None = None):
+        """응답을 저장하고, 만료된 항목과 max_entries 를 넘는 오래된 항목을 지웁니다."""
+        with self._lock:
+            vector = self._query_vector(query) if scope is not None else None
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, query, vector.tobytes() if vector is not None else None, response, now, now),
+            )
+            self._db.execute("DELETE FROM responses WHERE created < ?", (self._expiry(),))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+            self._vectors.clear()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._vectors.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.semantic_hits + self.misses
+            size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "size": size,
+                "hit_rate": (self.hits + self.semantic_hits) / total if total else 0.0,
+            }
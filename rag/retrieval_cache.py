@@ -0,0 +1,103 @@
+"""
+키워드별 검색 결과(텍스트 문맥 + 디코딩된 이미지)를 재사용하는 LRU 캐시.
+
+summary_chain 과 quiz_chain 이 같은 키워드로 BM25/FAISS 검색, CLIP 텍스트 인코딩, PNG 디코딩을
+두 번씩 하지 않도록 체인 앞단에서 결과를 공유합니다.
+"""
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from PIL import Image
+
+from rag.tracing import tracer
+
+
+def normalize_query(query: str) -> str:
+    """유니코드 정규화(NFC), 앞뒤 공백 제거, 연속 공백 축약, 소문자 변환."""
+    return " ".join(unicodedata.normalize("NFC", query).split()).lower()
+
+
+class RetrievalCache:
+    """
+    (정규화된 질의, 인덱스 버전) → {"context", "image", "image_uri"} LRU 캐시.
+
+    Args:
+        text_retriever: 텍스트 검색기 (예: HybridRetriever).
+        image_retriever: 이미지 검색기. 결과 Document 의 metadata['uri'] 를 사용. None 이면 이미지 없이 검색.
+        index_version (str): 인덱스 내용이 바뀌면 달라지는 문자열. 키에 포함되어 오래된 결과를 쓰지 않음.
+        maxsize (int): 보관할 최대 항목 수.
+    """
+
+    def __init__(self, text_retriever, image_retriever, index_version: str, maxsize: int = 256):
+        self.text_retriever = text_retriever
+        self.image_retriever = image_retriever
+        self.index_version = index_version
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _retrieve(self, query: str) -> dict:
+        with tracer.span("text_retrieval"):
+            context = "\n".join([d.page_content for d in self.text_retriever.invoke(query)])
+        with tracer.span("image_retrieval"):
+            image_docs = self.image_retriever.invoke(query) if self.image_retriever is not None else []
+        if not image_docs:  # 이미지가 없는 과목
+            return {"context": context, "image": "(이미지 없음)", "image_uri": None}
+        image_uri = image_docs[0].metadata['uri']
+        with tracer.span("image_load"):
+            image = Image.open(image_uri).convert("RGB")
+        return {"context": context, "image": image, "image_uri": image_uri}
+
+    def get(self, query: str) -> dict:
+        """
+        질의에 대한 검색 결과를 반환합니다. 같은 키를 동시에 요청해도 검색은 한 번만 수행됩니다.
+
+        Returns:
+            dict: context (str), image (PIL.Image, 이미지가 없으면 '(이미지 없음)'), image_uri (str | None).
+                반환된 이미지는 수정하지 말 것.
+        """
+        key = (normalize_query(query), self.index_version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:  # 다른 스레드가 먼저 채운 경우
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+            result = self._retrieve(query)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = result
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                self._key_locks.pop(key, None)
+        return result
+
+    def assign(self, query_key: str):
+        """
+        체인 입력 dict 에 검색 결과를 합쳐 주는 함수를 반환합니다.
+
+        Args:
+            query_key (str): 질의로 사용할 입력 dict 의 키 (예: 'keyword').
+        """
+        return lambda x: {**x, **self.get(x[query_key])}
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,329 @@
+"""
+frontend(App.js)의 /compare_models/, /save_selection/, /submit_feedback/ 를 제공하는 상주 퀴즈 비교 서버.
+
+모델과 인덱스는 시작할 때 한 번만 로드합니다. 동시에 들어온 /compare_models/ 요청은 모델별 DynamicBatcher 큐에
+쌓였다가 지연 예산(max_wait_ms) 안에서 하나의 generate_batch 호출로 묶여 처리됩니다.
+--pool-dir 를 주면 rag.quiz_pool 로 미리 생성해 둔 풀에서 퀴즈를 꺼내 주고,
+과목 풀의 남은 문제(가장 앞선 세션 기준)가 low_watermark 아래로 내려가면 백그라운드에서 풀을 보충합니다.
+세션이 풀을 다 받았는데 보충 중이면 기다리지 않고 503(Retry-After)을, 과목이 소진되었으면 404 를 돌려줍니다.
+
+실행:
+    python -m rag.server                # 실제 Gemma/KoE5/CLIP 로드
+    python -m rag.server --stub         # 결정적 stub 모델로 로컬 테스트
+    python -m rag.server --pool-dir .rag_cache/quiz_pool
+    python -m rag.server --trace        # 단계별 지연 히스토그램: GET /metrics, GET /trace/
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+
+from rag.batching import DynamicBatcher
+from rag.quiz_pool import QuizJob, QuizPool, base_query, build_job, fill_pool
+from rag.structured import QuizSchema
+from rag.tracing import tracer
+
+MODEL_NAMES = ("model_a", "model_b")
+
+
+class QuizPending(Exception):
+    """세션이 받을 퀴즈가 아직 없고, 과목 풀을 보충하는 중."""
+
+
+class CompareRequest(BaseModel):
+    subject: str
+    session_id: str | None = None
+
+
+class SelectionRequest(BaseModel):
+    session_id: str
+    subject: str
+    idx: int
+    selected_model: str
+
+
+class FeedbackRequest(BaseModel):
+    session_id: str
+    feedback: str
+
+
+class QuizService:
+    """
+    과목별 키워드 → 퀴즈 프롬프트 → 모델 A/B 생성 흐름과 세션 상태를 관리합니다.
+
+    Args:
+        keywords_fn (callable): 과목명 → 키워드 리스트 (블로킹 함수, 과목별로 한 번만 호출됨).
+        prompt_fn (callable): (과목명, 키워드) → 퀴즈 프롬프트 (블로킹 함수).
+        generate_fns (dict): 'model_a'/'model_b' → 프롬프트 리스트를 받아 결과 리스트를 돌려주는 함수.
+            같은 함수 객체를 넘기면 하나의 배처를 공유합니다.
+        results_dir (str): 선택/피드백 JSONL 을 저장할 디렉토리.
+        max_batch_size (int): 배처 최대 배치 크기.
+        max_wait_ms (float): 배처 지연 예산(ms).
+        max_sessions (int): 메모리에 보관할 최대 세션 수.
+        pool (QuizPool | None): 사전 생성 퀴즈 풀. 주어지면 실시간 생성 대신 풀에서 꺼냅니다.
+        job (QuizJob | None): 풀 보충에 사용할 작업. None 이면 보충하지 않습니다.
+        low_watermark (int): 과목 풀의 남은 문제 수(가장 앞선 세션 기준)가 이 값보다 작아지면 보충을 시작합니다.
+        topup_size (int): 한 번 보충할 때 추가할 최소 퀴즈 수.
+    """
+
+    def __init__(self, keywords_fn, prompt_fn, generate_fns: dict, results_dir: str = "results",
+                 max_batch_size: int = 8, max_wait_ms: float = 50.0, max_sessions: int = 10000,
+                 pool: QuizPool | None = None, job: QuizJob | None = None,
+                 low_watermark: int = 5, topup_size: int = 10):
+        self.keywords_fn = keywords_fn
+        self.prompt_fn = prompt_fn
+        self.pool = pool
+        self.job = job
+        self.low_watermark = low_watermark
+        self.topup_size = topup_size
+        self._topups = {}
+        self.topups = 0
+        self.quiz_schema = QuizSchema(num_options=4, explanation=True)
+        self.results_dir = Path(results_dir)
+        self.max_sessions = max_sessions
+        batchers = {}
+        self.batchers = {}
+        for name, fn in generate_fns.items():
+            if id(fn) not in batchers:
+                batchers[id(fn)] = DynamicBatcher(fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+            self.batchers[name] = batchers[id(fn)]
+        self._keywords = {}
+        self._keyword_locks = {}
+        self._sessions = OrderedDict()
+
+    async def start(self):
+        for batcher in set(self.batchers.values()):
+            batcher.start()
+
+    async def stop(self):
+        for task in self._topups.values():
+            task.cancel()
+        for batcher in set(self.batchers.values()):
+            await batcher.stop()
+
+    async def keywords(self, subject: str) -> list:
+        if subject not in self._keywords:
+            lock = self._keyword_locks.setdefault(subject, asyncio.Lock())
+            async with lock:
+                if subject not in self._keywords:
+                    self._keywords[subject] = await asyncio.to_thread(self.keywords_fn, subject)
+        return self._keywords[subject]
+
+    def _session(self, session_id: str | None, subject: str) -> tuple:
+        if session_id is None or session_id not in self._sessions:
+            session_id = session_id or uuid.uuid4().hex
+            self._sessions[session_id] = {"subject": subject, "served": {}, "quizzes": {}}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        return session_id, self._sessions[session_id]
+
+    async def compare(self, subject: str, session_id: str | None = None) -> dict | None:
+        """
+        세션에서 아직 풀지 않은 키워드로 모델 A/B 퀴즈를 생성합니다.
+
+        Returns:
+            dict | None: 응답 본문. 과목의 문제가 소진되었으면 None.
+
+        Raises:
+            QuizPending: 풀 모드에서 세션이 받을 퀴즈가 없고 과목 풀을 보충하는 중일 때.
+        """
+        if self.pool is not None:
+            return await self._compare_from_pool(subject, session_id)
+        keywords = await self.keywords(subject)
+        session_id, session = self._session(session_id, subject)
+        served = session["served"].setdefault(subject, set())
+        remaining = [i for i in range(len(keywords)) if i not in served]
+        if not remaining:
+            return None
+        idx = remaining[0]
+        served.add(idx)
+
+        prompt = await asyncio.to_thread(self.prompt_fn, subject, keywords[idx])
+        texts = await asyncio.gather(*(self.batchers[name].submit(prompt) for name in MODEL_NAMES))
+        quizzes = {name: self.quiz_schema.parse(text) for name, text in zip(MODEL_NAMES, texts)}
+        session["quizzes"][(subject, idx)] = {"keyword": keywords[idx], **quizzes}
+        return {"session_id": session_id, "idx": idx, "keyword": keywords[idx], **quizzes}
+
+    def _schedule_topup(self, subject: str) -> asyncio.Task | None:
+        """
+        과목 풀 보충 작업을 백그라운드로 시작합니다. 이미 진행 중이면 그 작업을 돌려줍니다.
+        보충할 수 없으면(작업 없음, 과목 소진) None.
+        """
+        if self.job is None:
+            return None
+        task = self._topups.get(subject)
+        if task is None or task.done():
+            if self.pool.exhausted(subject):
+                return None
+            target = self.pool.size(subject) + self.topup_size
+            task = asyncio.create_task(asyncio.to_thread(fill_pool, self.pool, self.job, subject, target))
+            self._topups[subject] = task
+            self.topups += 1
+        return task
+
+    async def _compare_from_pool(self, subject: str, session_id: str | None) -> dict | None:
+        session_id, session = self._session(session_id, subject)
+        popped = self.pool.pop(subject, session_id)
+        task = None
+        if popped is None or self.pool.headroom(subject) < self.low_watermark:
+            task = self._schedule_topup(subject)
+        if popped is None:
+            # 보충은 백그라운드에서 진행하고 요청은 기다리지 않음. 보충할 것이 없으면 소진
+            if task is not None and not task.done():
+                raise QuizPending(subject)
+            return None
+
+        idx, record = popped
+        quizzes = {name: record[name] for name in MODEL_NAMES}
+        session["quizzes"][(subject, idx)] = {"keyword": record["keyword"], **quizzes}
+        return {"session_id": session_id, "idx": idx, "keyword": record["keyword"], **quizzes}
+
+    def _append(self, filename: str, record: dict):
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.results_dir / filename, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def save_selection(self, request: SelectionRequest) -> bool:
+        session = self._sessions.get(request.session_id)
+        if request.selected_model not in MODEL_NAMES:
+            return False
+        quiz = session["quizzes"].get((request.subject, request.idx)) if session else None
+        self._append("selections.jsonl", {"time": time.time(), **request.model_dump(), "quiz": quiz})
+        return True
+
+    def save_feedback(self, request: FeedbackRequest):
+        self._append("feedback.jsonl", {"time": time.time(), **request.model_dump()})
+
+    def stats(self) -> dict:
+        stats = {
+            "sessions": len(self._sessions),
+            "batchers": {name: batcher.stats() for name, batcher in self.batchers.items()},
+        }
+        if self.pool is not None:
+            subjects = self.pool.subjects()
+            stats["pool"] = {
+                "topups": self.topups,
+                "topups_running": sorted(subject for subject, task in self._topups.items() if not task.done()),
+                "sizes": {subject: self.pool.size(subject) for subject in subjects},
+                "exhausted": [subject for subject in subjects if self.pool.exhausted(subject)],
+            }
+        return stats
+
+
+def create_app(service: QuizService) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await service.start()
+        yield
+        await service.stop()
+
+    app = FastAPI(title="LLM Quiz Comparison", lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=os.environ.get("RAG_CORS_ORIGINS", "*").split(","),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @app.post("/compare_models/")
+    async def compare_models(request: CompareRequest):
+        try:
+            result = await service.compare(request.subject, request.session_id)
+        except KeyError as e:  # 과목별 코퍼스에 없는 과목
+            raise HTTPException(status_code=404, detail=str(e))
+        except QuizPending:
+            raise HTTPException(status_code=503, detail="퀴즈를 준비 중입니다. 잠시 후 다시 시도하세요.",
+                                headers={"Retry-After": "5"})
+        if result is None:
+            raise HTTPException(status_code=404, detail="문제가 소진되었습니다.")
+        return result
+
+    @app.post("/save_selection/")
+    async def save_selection(request: SelectionRequest):
+        if not service.save_selection(request):
+            raise HTTPException(status_code=400, detail=f"selected_model 은 {MODEL_NAMES} 중 하나여야 합니다.")
+        return {"ok": True}
+
+    @app.post("/submit_feedback/")
+    async def submit_feedback(request: FeedbackRequest):
+        service.save_feedback(request)
+        return {"ok": True}
+
+    @app.get("/stats/")
+    async def stats():
+        return service.stats()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return tracer.prometheus()
+
+    @app.get("/trace/")
+    async def trace():
+        return {"enabled": tracer.enabled, "chains": tracer.snapshot()}
+
+    app.state.service = service
+    return app
+
+
+def build_stub_service(**kwargs) -> QuizService:
+    """실제 모델 없이 결정적 stub 생성기로 서비스를 만듭니다 (로컬 테스트용)."""
+    return _service_from_job(build_job(stub=True), **kwargs)
+
+
+def build_service(**kwargs) -> QuizService:
+    """
+    Gemma/KoE5/CLIP 과 인덱스를 로드해 서비스를 만듭니다.
+    모델 B 경로는 GEMMA_MODEL_B_PATH 로 지정하며, 없으면 모델 A 와 같은 생성기를 공유합니다.
+    """
+    return _service_from_job(build_job(stub=False), **kwargs)
+
+
+def _service_from_job(job: QuizJob, pool_dir: str | None = None, **kwargs) -> QuizService:
+    return QuizService(
+        keywords_fn=lambda subject: job.keywords_fn(subject, base_query(subject)),
+        prompt_fn=job.quiz_prompt_fn,
+        generate_fns=job.quiz_batches,
+        pool=QuizPool(pool_dir) if pool_dir else None,
+        job=job,
+        **kwargs,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 퀴즈 비교 서버")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub", action="store_true", help="실제 모델 대신 결정적 stub 생성기 사용")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=50.0)
+    parser.add_argument("--results-dir", default="results")
+    parser.add_argument("--pool-dir", default=None, help="사전 생성 퀴즈 풀 디렉토리 (rag.quiz_pool)")
+    parser.add_argument("--low-watermark", type=int, default=5)
+    parser.add_argument("--topup-size", type=int, default=10)
+    parser.add_argument("--trace", action="store_true", help="체인 단계별 지연 시간 기록 (RAG_TRACE=1 과 같음)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    if args.trace:
+        tracer.enable()
+
+    options = {"max_batch_size": args.max_batch_size, "max_wait_ms": args.max_wait_ms, "results_dir": args.results_dir,
+               "pool_dir": args.pool_dir, "low_watermark": args.low_watermark, "topup_size": args.topup_size}
+    service = build_stub_service(**options) if args.stub else build_service(**options)
+    uvicorn.run(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
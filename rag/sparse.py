@@ -0,0 +1,215 @@
+"""
+배열 기반 BM25 검색과 희소/밀집 하이브리드 검색.
+
+BM25Index 는 청크를 한 번 토큰화해 용어 → 문서 역색인을 CSR 행렬(행: 용어, 열: 문서)로 만들고,
+각 칸에 BM25 가중치를 미리 계산해 둡니다. 질의 점수는 질의 용어 행들의 합이므로
+여러 질의를 (질의 × 용어) 희소 행렬 하나로 묶어 행렬곱 한 번으로 계산합니다.
+점수 공식은 rank_bm25.BM25Okapi (k1=1.5, b=0.75, epsilon=0.25) 와 같습니다.
+
+HybridRetriever 는 BM25 와 FAISS 검색을 동시에 실행하고 EnsembleRetriever 와 같은 가중 RRF 로 합칩니다.
+"""
+import asyncio
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+from scipy import sparse
+
+TOKEN_PATTERN = re.compile(r"[가-힣]+|[a-z0-9]+(?:\.[0-9]+)?")
+# 긴 조사부터 떼어야 '에서' 가 '서' 로 남지 않음
+JOSA = sorted(
+    ["은", "는", "이", "가", "을", "를", "의", "에", "에서", "에게", "으로", "로", "와", "과", "도", "만",
+     "까지", "부터", "보다", "처럼", "이나", "나", "이며", "며", "이다", "입니다", "하는", "하여", "한다", "된다"],
+    key=len, reverse=True,
+)
+
+
+def tokenize_ko(text: str) -> list:
+    """
+    한국어 기술 문서용 토크나이저.
+
+    한글 어절은 끝의 조사/어미를 떼고, 복합명사('테브난등가회로')도 부분 일치하도록
+    세 글자 이상인 어간에는 글자 bigram 을 함께 넣습니다. 영문/숫자는 소문자 단어 단위로 자릅니다.
+    """
+    tokens = []
+    for word in TOKEN_PATTERN.findall(text.lower()):
+        if "가" <= word[0] <= "힣":
+            for josa in JOSA:
+                if len(word) > len(josa) + 1 and word.endswith(josa):
+                    word = word[:-len(josa)]
+                    break
+            tokens.append(word)
+            if len(word) >= 3:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """
+    Args:
+        texts (list): 청크 텍스트 리스트.
+        tokenizer (callable): 텍스트 → 토큰 리스트.
+        k1, b, epsilon (float): BM25Okapi 파라미터.
+    """
+
+    def __init__(self, texts: list, tokenizer=tokenize_ko, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.tokenizer = tokenizer
+        self.vocab = {}
+        rows, cols = [], []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenizer(text)
+            doc_len[doc_id] = len(tokens)
+            rows.extend(self.vocab.setdefault(t, len(self.vocab)) for t in tokens)
+            cols.extend([doc_id] * len(tokens))
+
+        # 용어 × 문서 빈도 행렬 (중복 (용어, 문서) 쌍은 CSR 변환 시 합쳐짐)
+        tf = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64))),
+            shape=(len(self.vocab), len(texts)),
+        )
+        tf.sum_duplicates()
+        num_docs = len(texts)
+        df = np.diff(tf.indptr).astype(np.float64)
+        idf = np.log(num_docs - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+        avgdl = doc_len.mean() if num_docs else 1.0
+
+        # 각 칸을 tf → BM25 가중치로 바꿔 질의 시에는 더하기만 하면 되게 함
+        term_of_entry = np.repeat(np.arange(len(self.vocab)), np.diff(tf.indptr))
+        freq = tf.data
+        norm = k1 * (1 - b + b * doc_len[tf.indices] / avgdl)
+        tf.data = (idf[term_of_entry] * freq * (k1 + 1) / (freq + norm)).astype(np.float32)
+        self.weights = tf
+        self.num_docs = num_docs
+
+    def query_matrix(self, queries: list) -> sparse.csr_matrix:
+        """질의들을 (질의 × 용어) 빈도 행렬로 만듭니다. 사전에 없는 용어는 버립니다."""
+        rows, cols = [], []
+        for i, query in enumerate(queries):
+            ids = [self.vocab[t] for t in self.tokenizer(query) if t in self.vocab]
+            rows.extend([i] * len(ids))
+            cols.extend(ids)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(queries), len(self.vocab)),
+        )
+
+    def scores(self, queries: list) -> sparse.csr_matrix:
+        """(질의 × 문서) BM25 점수 희소 행렬. 질의 용어가 하나도 없는 문서는 0(저장 안 됨)."""
+        return self.query_matrix(queries) @ self.weights
+
+    def search(self, queries: list, k: int = 4) -> list:
+        """
+        질의마다 점수 상위 k 개 문서 번호를 돌려줍니다.
+        BM25Okapi.get_top_n 과 같이 동점이면 번호가 큰 문서가 먼저 오고, 점수가 있는 문서가 k 개보다 적거나
+        음수 점수(절반 넘는 문서에 나오는 용어)가 섞이면 0점 문서까지 포함한 전체 점수에서 고릅니다.
+
+        Returns:
+            list: 질의별 [(문서 번호, 점수), ...] 리스트.
+        """
+        k = min(k, self.num_docs)
+        scores = self.scores(queries)
+        results = []
+        for i in range(len(queries)):
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            doc_ids, values = scores.indices[start:end], scores.data[start:end]
+            if len(values) < k or (len(values) < self.num_docs and values.min(initial=0.0) < 0):
+                row = scores[i].toarray().ravel()
+                top = np.argsort(row, kind="stable")[::-1][:k]
+                results.append([(int(d), float(row[d])) for d in top])
+                continue
+            if len(values) > k:
+                top = np.argpartition(-values, k - 1)[:k]
+                doc_ids, values = doc_ids[top], values[top]
+            order = np.lexsort((-doc_ids, -values))
+            results.append([(int(doc_ids[j]), float(values[j])) for j in order])
+        return results
+
+
+class SparseBM25Retriever(BaseRetriever):
+    """BM25Index 기반 검색기. BM25Retriever 대신 쓸 수 있고 batch_search 로 여러 질의를 한 번에 처리합니다."""
+
+    index: BM25Index
+    docs: list
+    k: int = 4
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @classmethod
+    def from_documents(cls, documents: list, tokenizer=tokenize_ko, **kwargs) -> "SparseBM25Retriever":
+        documents = list(documents)
+        return cls(index=BM25Index([d.page_content for d in documents], tokenizer=tokenizer), docs=documents, **kwargs)
+
+    def batch_search(self, queries: list, k: int | None = None) -> list:
+        return [[self.docs[i] for i, _ in hits] for hits in self.index.search(queries, k or self.k)]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        return self.batch_search([query])[0]
+
+
+def weighted_rrf(doc_lists: list, weights: list, c: int = 60) -> list:
+    """EnsembleRetriever.weighted_reciprocal_rank 와 같은 방식으로 순위 리스트들을 합칩니다 (page_content 기준 중복 제거)."""
+    rrf_score = defaultdict(float)
+    for doc_list, weight in zip(doc_lists, weights):
+        for rank, doc in enumerate(doc_list, start=1):
+            rrf_score[doc.page_content] += weight / (rank + c)
+    unique = {}
+    for doc_list in doc_lists:
+        for doc in doc_list:
+            unique.setdefault(doc.page_content, doc)
+    return sorted(unique.values(), reverse=True, key=lambda doc: rrf_score[doc.page_content])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    BM25 와 FAISS 를 동시에 검색해 가중 RRF 로 합치는 검색기.
+    EnsembleRetriever(retrievers=[bm25, faiss], weights=[0.3, 0.7]) 와 같은 결과를 냅니다.
+    """
+
+    sparse_retriever: SparseBM25Retriever
+    faiss_store: object
+    k: int = 4
+    weights: list = [0.3, 0.7]
+    c: int = 60
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _dense_search(self, vectors: np.ndarray) -> list:
+        store = self.faiss_store
+        _, indices = store.index.search(np.asarray(vectors, dtype=np.float32), self.k)
+        return [
+            [store.docstore.search(store.index_to_docstore_id[i]) for i in row if i != -1]
+            for row in indices
+        ]
+
+    def batch_search(self, queries: list) -> list:
+        """여러 질의를 희소/밀집 각각 한 번의 배치 연산으로 검색합니다."""
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            sparse_future = pool.submit(self.sparse_retriever.batch_search, queries, self.k)
+            dense_future = pool.submit(
+                lambda: self._dense_search(self.faiss_store.embedding_function.embed_documents(queries))
+            )
+            sparse_lists, dense_lists = sparse_future.result(), dense_future.result()
+        return [weighted_rrf([s, d], self.weights, self.c) for s, d in zip(sparse_lists, dense_lists)]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            sparse_future = pool.submit(self.sparse_retriever.batch_search, [query], self.k)
+            dense_future = pool.submit(
+                lambda: self._dense_search([self.faiss_store.embedding_function.embed_query(query)])
+            )
+            return weighted_rrf([sparse_future.result()[0], dense_future.result()[0]], self.weights, self.c)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager) -> list:
+        sparse_docs, dense_docs = await asyncio.gather(
+            asyncio.to_thread(self.sparse_retriever.batch_search, [query], self.k),
+            asyncio.to_thread(lambda: self._dense_search([self.faiss_store.embedding_function.embed_query(query)])),
+        )
+        return weighted_rrf([sparse_docs[0], dense_docs[0]], self.weights, self.c)
@@ -0,0 +1,268 @@
+"""
+구조화 출력(JSON 키워드 배열, 4지선다 퀴즈 형식)으로 디코딩을 제한하는 스키마와 logits processor.
+
+스키마는 문자 단위 상태 기계로, 지금까지 생성한 텍스트가 형식의 올바른 접두사인지 판단합니다.
+매 스텝마다 상위 후보 토큰 중 형식을 깨지 않는 토큰만 남기고, 형식이 완성되면 바로 생성을 멈춥니다.
+"""
+import json
+import re
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+# 바이트 폴백 토큰처럼 단독으로 디코딩되지 않는 토큰은 U+FFFD 로 나오며, 자유 텍스트 안에서만 허용
+OPAQUE_CHAR = "�"
+
+
+class JsonStringArraySchema:
+    """
+    최대 max_items 개의 비어 있지 않은 문자열로 이루어진 JSON 배열. 예: ["키워드1","키워드2"]
+    상태: (모드, 항목 수, 현재 문자열 길이, 이스케이프 여부)
+    """
+
+    def __init__(self, max_items: int = 5):
+        self.max_items = max_items
+
+    def initial_state(self):
+        return ("start", 0, 0, False)
+
+    def advance(self, state, text: str):
+        for ch in text:
+            mode, items, length, escape = state
+            if mode == "done":
+                return None
+            if mode == "str":
+                if escape:
+                    state = ("str", items, length + 1, False)
+                elif ch == "\\":
+                    state = ("str", items, length, True)
+                elif ch == '"':
+                    if length == 0:
+                        return None
+                    state = ("after", items, 0, False)
+                elif ch in "\n\r\t":
+                    return None
+                else:
+                    state = ("str", items, length + 1, False)
+            elif ch in " \n\r\t":
+                continue
+            elif mode == "start":
+                if ch != "[":
+                    return None
+                state = ("open", 0, 0, False)
+            elif mode in ("open", "comma") and ch == '"':
+                if items >= self.max_items:
+                    return None
+                state = ("str", items + 1, 0, False)
+            elif mode == "open" and ch == "]" and items == 0:
+                state = ("done", items, 0, False)
+            elif mode == "after" and ch == "," and items < self.max_items:
+                state = ("comma", items, 0, False)
+            elif mode == "after" and ch == "]":
+                state = ("done", items, 0, False)
+            else:
+                return None
+        return state
+
+    def is_complete(self, state) -> bool:
+        return state[0] == "done"
+
+    def parse(self, text: str) -> list:
+        """생성 결과를 문자열 리스트로 변환합니다. JSON 이 아니면 단어 단위로 추출합니다."""
+        try:
+            items = json.loads(text.strip())
+            if isinstance(items, list):
+                return list(dict.fromkeys(str(item).strip() for item in items if str(item).strip()))[:self.max_items]
+        except (ValueError, TypeError):
+            pass
+        return list(dict.fromkeys(re.findall(r"[\w가-힣]+", text)))[:self.max_items]
+
+
+class QuizSchema:
+    """
+    4지선다 퀴즈 형식.
+
+        문제: ...
+        1) ...
+        2) ...
+        3) ...
+        4) ...
+        정답: 번호
+        해설: ...        (explanation=True 일 때)
+
+    상태: (세그먼트 번호, 세그먼트 안에서의 위치)
+    """
+
+    def __init__(self, num_options: int = 4, explanation: bool = False):
+        self.num_options = num_options
+        self.explanation = explanation
+        segments = [("lit", "문제: "), ("text", None)]
+        for i in range(1, num_options + 1):
+            segments += [("lit", f"\n{i}) "), ("text", None)]
+        segments += [("lit", "\n정답: "), ("choice", "".join(str(i) for i in range(1, num_options + 1)))]
+        if explanation:
+            segments += [("lit", "\n해설: "), ("text", None), ("lit", "\n")]
+        self.segments = segments
+
+    def initial_state(self):
+        return (0, 0)
+
+    def advance(self, state, text: str):
+        for ch in text:
+            index, pos = state
+            if index >= len(self.segments):
+                return None
+            kind, value = self.segments[index]
+            if kind == "lit":
+                if ch != value[pos]:
+                    return None
+                state = (index + 1, 0) if pos + 1 == len(value) else (index, pos + 1)
+            elif kind == "choice":
+                if ch not in value:
+                    return None
+                state = (index + 1, 0)
+            elif ch == "\n":
+                # 텍스트 줄이 끝나면 다음 리터럴(항상 '\n' 으로 시작)로 넘어감
+                if pos == 0:
+                    return None
+                _, next_value = self.segments[index + 1]
+                state = (index + 2, 0) if len(next_value) == 1 else (index + 1, 1)
+            else:
+                state = (index, pos + 1)
+        return state
+
+    def is_complete(self, state) -> bool:
+        return state[0] >= len(self.segments)
+
+    def parse(self, text: str) -> dict:
+        """생성 결과를 {question, choices, answer, explanation} 으로 변환합니다."""
+        question = re.search(r"문제:\s*(.*)", text)
+        choices = [m.group(2).strip() for m in re.finditer(r"(?m)^\s*(\d)\)\s*(.*)$", text)]
+        answer = re.search(r"정답:\s*(\d)", text)
+        explanation = re.search(r"해설:\s*(.*)", text, re.S)
+        return {
+            "question": question.group(1).strip() if question else text.strip(),
+            "choices": choices[:self.num_options],
+            "answer": answer.group(1) if answer else "",
+            "explanation": explanation.group(1).strip() if explanation else "",
+        }
+
+
+class SchemaConstraint:
+    """
+    배치의 각 행이 스키마의 어느 상태에 있는지 추적합니다.
+    logits processor 와 stopping criteria 가 같은 객체를 공유합니다.
+
+    Args:
+        schema: JsonStringArraySchema / QuizSchema.
+        tokenizer: 토큰 ID → 텍스트 변환에 사용할 토크나이저.
+        batch_size (int): 배치 행 수.
+        prompt_len (int): 프롬프트(패딩 포함) 길이. 이후 토큰부터 상태를 진행합니다.
+        top_k (int): 매 스텝 형식 검사를 할 상위 후보 수.
+    """
+
+    _token_text_cache = {}
+
+    def __init__(self, schema, tokenizer, batch_size: int, prompt_len: int, top_k: int = 64):
+        self.schema = schema
+        self.tokenizer = tokenizer
+        self.top_k = top_k
+        self.prompt_len = prompt_len
+        self.tokens = torch.empty((batch_size, 0), dtype=torch.long)  # 지금까지 상태에 반영한 생성 토큰
+        self.history = [[schema.initial_state()] for _ in range(batch_size)]  # 행마다 토큰 위치별 상태
+        self.eos_token_id = tokenizer.eos_token_id
+        # <end_of_turn> 처럼 added token 으로만 등록된 특수 토큰도 제외
+        self.special_ids = set(tokenizer.all_special_ids) | {
+            token_id for token_id, token in getattr(tokenizer, "added_tokens_decoder", {}).items()
+            if getattr(token, "special", False)
+        }
+        self._texts = self._token_text_cache.setdefault(id(tokenizer), {})
+
+    def token_text(self, token_id: int) -> str:
+        text = self._texts.get(token_id)
+        if text is None:
+            text = self.tokenizer.decode([token_id])
+            self._texts[token_id] = text
+        return text
+
+    @property
+    def states(self) -> list:
+        return [history[-1] for history in self.history]
+
+    def _done(self, state) -> bool:
+        return state is None or self.schema.is_complete(state)
+
+    def finished(self, row: int) -> bool:
+        return self._done(self.history[row][-1])
+
+    def update(self, input_ids: torch.Tensor):
+        """
+        input_ids 의 생성 부분에 맞게 각 행의 상태를 맞춥니다.
+        보조 디코딩에서는 draft 후보 위치마다 호출되고 거절된 후보는 다음 호출에서 사라지므로, 이전에 반영한 토큰과
+        처음 달라지는 위치까지 상태를 되돌린 뒤 다시 진행합니다 (일반 생성에서는 새 토큰만 진행).
+        """
+        generated = input_ids[:, self.prompt_len:].cpu()
+        common = min(generated.shape[1], self.tokens.shape[1])
+        mismatch = (generated[:, :common] != self.tokens[:, :common]).any(dim=0).nonzero()
+        keep = int(mismatch[0]) if len(mismatch) else common
+        for history in self.history:
+            del history[keep + 1:]
+        for position in range(keep, generated.shape[1]):
+            for row, token_id in enumerate(generated[:, position].tolist()):
+                state = self.history[row][-1]
+                if not self._done(state):
+                    state = self.schema.advance(state, self.token_text(token_id))
+                self.history[row].append(state)
+        self.tokens = generated
+
+    def _allowed(self, state, scores: torch.Tensor) -> list:
+        def valid(token_id):
+            if token_id in self.special_ids:
+                return False
+            text = self.token_text(token_id)
+            if not text:
+                return False
+            # 자유 텍스트 안에서는 단독 디코딩이 안 되는 토큰을 일반 문자처럼 취급
+            return self.schema.advance(state, text.replace(OPAQUE_CHAR, "가")) is not None
+
+        candidates = torch.topk(scores, min(self.top_k, scores.shape[-1])).indices.tolist()
+        allowed = [t for t in candidates if valid(t)]
+        if not allowed:
+            # 상위 후보가 모두 형식을 깨면 범위를 넓혀 탐색
+            candidates = torch.argsort(scores, descending=True)[:4096].tolist()
+            allowed = [t for t in candidates if valid(t)][:self.top_k]
+        return allowed or [self.eos_token_id]
+
+
+class SchemaLogitsProcessor(LogitsProcessor):
+    """형식을 깨는 토큰의 점수를 -inf 로 만들고, 완성된 행에는 EOS 만 허용합니다."""
+
+    def __init__(self, constraint: SchemaConstraint):
+        self.constraint = constraint
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        constraint = self.constraint
+        constraint.update(input_ids)
+        masked = torch.full_like(scores, float("-inf"))
+        for row in range(scores.shape[0]):
+            if constraint.finished(row):
+                allowed = [constraint.eos_token_id]
+            else:
+                allowed = constraint._allowed(constraint.states[row], scores[row])
+            masked[row, allowed] = scores[row, allowed]
+            if torch.isinf(masked[row, allowed]).all():
+                # 앞선 top-k/top-p 처리로 허용 토큰이 모두 -inf 가 된 경우
+                masked[row, allowed] = 0.0
+        return masked
+
+
+class SchemaStoppingCriteria(StoppingCriteria):
+    """형식이 완성된 행은 EOS 를 기다리지 않고 바로 종료합니다."""
+
+    def __init__(self, constraint: SchemaConstraint):
+        self.constraint = constraint
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        self.constraint.update(input_ids)
+        done = [self.constraint.finished(row) for row in range(input_ids.shape[0])]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,112 @@
+"""
+실제 Gemma/KoE5/CLIP 없이 서버와 체인을 로컬에서 돌려 보기 위한 결정적 대역(stub) 구성요소.
+생성기(StubGenerator), 텍스트 임베딩(StubEmbeddings), 이미지 검색기(StubImageRetriever)는 네트워크 없이 CPU 에서 동작합니다.
+"""
+import hashlib
+import json
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from rag.sparse import tokenize_ko
+from rag.structured import JsonStringArraySchema, QuizSchema
+
+STUB_KEYWORDS = ["옴의 법칙", "키르히호프 법칙", "테브난 등가회로", "노턴 등가회로", "중첩의 원리"]
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest(), 16)
+
+
+class StubGenerator:
+    """
+    GemmaGenerator 와 같은 generate / generate_batch / stream 인터페이스를 가진 결정적 생성기.
+    같은 프롬프트에는 항상 같은 출력을 내며, schema 가 주어지면 그 형식을 따릅니다.
+
+    Args:
+        name (str): 출력에 섞이는 이름. 모델 A/B 를 구분하는 데 사용.
+    """
+
+    def __init__(self, name: str = "stub"):
+        self.name = name
+        self.max_batch_size = 8
+        self.prefix_cache = None
+        self.last_stats = {}
+
+    def _complete(self, prompt: str, schema=None) -> str:
+        seed = _digest(self.name + prompt)
+        if isinstance(schema, JsonStringArraySchema):
+            return json.dumps(STUB_KEYWORDS[:schema.max_items], ensure_ascii=False)
+        if isinstance(schema, QuizSchema):
+            topic = prompt.split("'")[1] if prompt.count("'") >= 2 else "회로"
+            options = "\n".join(f"{i}) {topic} 보기 {i} ({self.name})" for i in range(1, schema.num_options + 1))
+            text = f"문제: {topic}에 대한 설명으로 옳은 것은? ({self.name})\n{options}\n정답: {seed % schema.num_options + 1}"
+            if schema.explanation:
+                text += f"\n해설: {topic} 관련 stub 해설입니다.\n"
+            return text
+        return f"[{self.name}] {prompt[-40:].strip()} 에 대한 요약입니다."
+
+    def generate(self, formatted_prompt: str, schema=None, **generate_kwargs) -> str:
+        return self._complete(formatted_prompt, schema)
+
+    def generate_batch(self, formatted_prompts: list, max_batch_size: int | None = None, schema=None,
+                       **generate_kwargs) -> list:
+        return [self._complete(p, schema) for p in formatted_prompts]
+
+    def stream(self, formatted_prompt: str, schema=None, stats: dict | None = None, **generate_kwargs):
+        text = self._complete(formatted_prompt, schema)
+        for start in range(0, len(text), 8):
+            yield text[start:start + 8]
+
+    async def astream(self, formatted_prompt: str, schema=None, stats: dict | None = None, **generate_kwargs):
+        for chunk in self.stream(formatted_prompt, schema=schema, stats=stats):
+            yield chunk
+
+
+class StubEmbeddings(Embeddings):
+    """
+    KoE5 대신 쓰는 결정적 임베딩. 토큰을 해시 버킷(±1)에 더한 뒤 정규화하므로, 단어가 겹치는 텍스트끼리 가깝습니다.
+    모델 다운로드 없이 FAISS 인덱스/하이브리드 검색 경로를 그대로 실행할 수 있습니다.
+
+    Args:
+        size (int): 벡터 차원.
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in tokenize_ko(text):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.size] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+
+class StubImageRetriever(BaseRetriever):
+    """CLIP 대신 질의 해시로 이미지 하나를 고르는 결정적 이미지 검색기 (결과 metadata['uri'] 는 실제 파일 경로)."""
+
+    image_uris: list
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list:
+        if not self.image_uris:
+            return []
+        uri = self.image_uris[_digest(query) % len(self.image_uris)]
+        return [Document(page_content=uri, metadata={"uri": uri})]
+
+
+def stub_quiz_prompt(keyword: str) -> str:
+    """검색 없이 고정 문맥으로 퀴즈 프롬프트를 만듭니다."""
+    from rag.pipeline import build_quiz_messages
+
+    return build_quiz_messages({"keyword": keyword, "context": f"{keyword} 관련 stub 문서", "image": "(이미지 없음)"})
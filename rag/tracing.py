@@ -0,0 +1,261 @@
+"""
+LCEL 체인의 단계별 추적과 지연 시간 히스토그램.
+
+체인(keywords_chain / summary_chain / quiz_chain)마다 검색, CLIP 질의 인코딩, 이미지 디코딩, 프롬프트 구성, 토큰화,
+prefill, decode 단계의 소요 시간·토큰 수·메모리 변화를 기록하고 (체인, 단계)별 히스토그램으로 모읍니다.
+메모리는 span 마다 현재 RSS 의 증감(rss_delta_mb, 단계 안에서 잡고 놓지 않은 메모리)과 프로세스 최대 RSS 를
+끌어올린 양(peak_rss_growth_mb, 단계 도중 잠깐 잡았다 놓은 메모리 포함)을 기록하므로, 어느 단계가 메모리를 쓰는지 구분됩니다.
+꺼져 있으면 span() 은 미리 만든 빈 컨텍스트를 돌려주고 record() 는 바로 반환하므로 추가 비용은 속성 확인 한 번입니다.
+
+설정:
+    RAG_TRACE=1                          추적 켜기 (또는 tracer.enable())
+    RAG_TRACE_FILE=trace.json|trace.prom 프로세스 종료 시 JSON 또는 Prometheus 텍스트로 저장
+서버에서는 GET /metrics (Prometheus 텍스트), GET /trace/ (JSON) 로 확인합니다.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+
+from rag.profiling import current_rss_mb, peak_rss_mb
+
+# 초 단위 버킷 상한 (마지막 +Inf 는 암묵적)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_chain = contextvars.ContextVar("rag_trace_chain", default="-")
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Prometheus 형식의 누적 버킷 히스토그램 (관측값 합/개수 포함)."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """버킷 안에서 선형 보간한 분위수 (Prometheus histogram_quantile 과 같은 방식)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):  # +Inf 버킷은 마지막 상한을 반환
+                    return self.buckets[-1]
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class StageStats:
+    """(체인, 단계) 하나의 지연 히스토그램, 토큰 합계, span 한 번의 최대 RSS 증가량, 최대 RSS 를 끌어올린 양의 합."""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.tokens = 0
+        self.max_rss_delta_mb = None
+        self.peak_rss_growth_mb = 0.0
+
+    def as_dict(self) -> dict:
+        latency = self.latency
+        return {
+            "count": latency.count,
+            "sum_sec": latency.sum,
+            "mean_sec": latency.sum / latency.count if latency.count else None,
+            "p50_sec": latency.quantile(0.5),
+            "p95_sec": latency.quantile(0.95),
+            "p99_sec": latency.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in latency.buckets] + ["+Inf"], latency.counts)),
+            "tokens": self.tokens,
+            "max_rss_delta_mb": self.max_rss_delta_mb,
+            "peak_rss_growth_mb": self.peak_rss_growth_mb,
+        }
+
+
+class Tracer:
+    """
+    단계별 측정값을 모으는 객체. 보통 모듈 전역 tracer 하나를 사용합니다.
+
+    Args:
+        enabled (bool): 처음부터 기록할지 여부.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def record(self, stage: str, seconds: float, tokens: int | None = None, chain: str | None = None,
+               rss_delta_mb: float | None = None, peak_growth_mb: float | None = None):
+        """
+        이미 측정한 소요 시간을 기록합니다. chain 이 None 이면 현재 span 의 체인.
+        rss_delta_mb 는 구간 시작 대비 끝의 현재 RSS 변화, peak_growth_mb 는 구간 동안 늘어난 프로세스 최대 RSS.
+        """
+        if not self.enabled:
+            return
+        key = (chain or _current_chain.get(), stage)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StageStats()
+            stats.latency.observe(seconds)
+            if tokens:
+                stats.tokens += tokens
+            if rss_delta_mb is not None and (stats.max_rss_delta_mb is None or rss_delta_mb > stats.max_rss_delta_mb):
+                stats.max_rss_delta_mb = rss_delta_mb
+            if peak_growth_mb:
+                stats.peak_rss_growth_mb += peak_growth_mb
+
+    def span(self, stage: str, chain: str | None = None):
+        """
+        with 블록의 소요 시간과 블록 동안의 RSS 변화(현재 RSS 증감, 최대 RSS 증가량)를 기록합니다. chain 을 주면 블록 안의 하위 span 도 그 체인으로 기록됩니다.
+        꺼져 있으면 아무것도 하지 않는 공용 컨텍스트를 돌려줍니다.
+        """
+        if not self.enabled:
+            return _NOOP
+        return self._span(stage, chain)
+
+    @contextmanager
+    def _span(self, stage: str, chain: str | None):
+        token = _current_chain.set(chain) if chain else None
+        rss_before, peak_before = current_rss_mb(), peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            rss_after, peak_after = current_rss_mb(), peak_rss_mb()
+            self.record(
+                stage, elapsed,
+                rss_delta_mb=rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+                peak_growth_mb=peak_after - peak_before if peak_before is not None and peak_after is not None else None,
+            )
+            if token is not None:
+                _current_chain.reset(token)
+
+    def snapshot(self) -> dict:
+        """{체인: {단계: 통계}} dict (JSON 으로 바로 저장 가능)."""
+        with self._lock:
+            items = sorted(self._stats.items())
+            result = {}
+            for (chain, stage), stats in items:
+                result.setdefault(chain, {})[stage] = stats.as_dict()
+            return result
+
+    def prometheus(self) -> str:
+        """Prometheus 텍스트 노출 형식."""
+        lines = [
+            "# HELP rag_stage_latency_seconds LCEL 체인 단계별 소요 시간",
+            "# TYPE rag_stage_latency_seconds histogram",
+        ]
+        token_lines = ["# HELP rag_stage_tokens_total 단계에서 처리한 토큰 수", "# TYPE rag_stage_tokens_total counter"]
+        rss_lines = ["# HELP rag_stage_max_rss_delta_mb 단계 span 한 번 동안 현재 RSS 가 가장 많이 늘어난 양(MB)",
+                     "# TYPE rag_stage_max_rss_delta_mb gauge"]
+        growth_lines = ["# HELP rag_stage_peak_rss_growth_mb_total 단계가 프로세스 최대 RSS 를 끌어올린 양의 합(MB)",
+                        "# TYPE rag_stage_peak_rss_growth_mb_total counter"]
+        with self._lock:
+            for (chain, stage), stats in sorted(self._stats.items()):
+                labels = f'chain="{chain}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(list(stats.latency.buckets) + ["+Inf"], stats.latency.counts):
+                    cumulative += count
+                    lines.append(f'rag_stage_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"rag_stage_latency_seconds_sum{{{labels}}} {stats.latency.sum}")
+                lines.append(f"rag_stage_latency_seconds_count{{{labels}}} {stats.latency.count}")
+                token_lines.append(f"rag_stage_tokens_total{{{labels}}} {stats.tokens}")
+                if stats.max_rss_delta_mb is not None:
+                    rss_lines.append(f"rag_stage_max_rss_delta_mb{{{labels}}} {stats.max_rss_delta_mb}")
+                growth_lines.append(f"rag_stage_peak_rss_growth_mb_total{{{labels}}} {stats.peak_rss_growth_mb}")
+        return "\n".join(lines + token_lines + rss_lines + growth_lines) + "\n"
+
+    def export(self, path):
+        """확장자가 .prom / .txt 이면 Prometheus 텍스트, 그 외에는 JSON 으로 저장합니다."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix in (".prom", ".txt"):
+            path.write_text(self.prometheus(), encoding="utf-8")
+        else:
+            path.write_text(json.dumps(self.snapshot(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+tracer = Tracer(enabled=os.environ.get("RAG_TRACE", "") not in ("", "0"))
+
+if os.environ.get("RAG_TRACE_FILE"):
+    atexit.register(lambda: tracer.export(os.environ["RAG_TRACE_FILE"]))
+
+
+def traced(stage: str, fn, chain: str | None = None):
+    """
+    함수 fn 을 span 으로 감쌉니다 (LCEL 체인의 한 단계로 그대로 사용 가능).
+    꺼져 있으면 tracer.enabled 확인 한 번만 추가됩니다.
+    """
+    def wrapper(x):
+        if not tracer.enabled:
+            return fn(x)
+        with tracer.span(stage, chain=chain):
+            return fn(x)
+
+    wrapper.__name__ = getattr(fn, "__name__", stage)
+    return wrapper
+
+
+def traced_chain(name: str, runnable) -> RunnableLambda:
+    """체인 전체 실행을 name 체인의 'total' 단계로 기록하는 Runnable."""
+    def invoke(x, config):
+        with tracer.span("total", chain=name):
+            return runnable.invoke(x, config)
+
+    return RunnableLambda(invoke, name=name)
+
+
+class TracedEmbeddings(Embeddings):
+    """
+    embed_query / embed_documents 호출을 span 으로 기록하는 임베딩 래퍼 (예: 이미지 검색기의 CLIP 질의 인코딩).
+    그 밖의 속성은 원래 임베딩 객체로 넘깁니다.
+    """
+
+    def __init__(self, embeddings, stage: str):
+        self.embeddings = embeddings
+        self.stage = stage
+
+    def embed_query(self, text: str) -> list:
+        with tracer.span(self.stage):
+            return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: list) -> list:
+        with tracer.span(self.stage):
+            return self.embeddings.embed_documents(texts)
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["embeddings"], name)
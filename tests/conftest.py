@@ -0,0 +1,67 @@
+"""
+테스트 공용 fixture. 실제 Gemma/KoE5 대신 메모리에서 만드는 문자 단위 토크나이저와 작은 causal LM 을 사용합니다.
+
+실행 (저장소 루트에서):
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+# finetuning/ 스크립트는 같은 디렉토리의 모듈을 이름으로 import 함 (from dedup import ...)
+sys.path.insert(0, str(ROOT / "finetuning"))
+sys.path.insert(0, str(ROOT))
+
+SPECIAL_TOKENS = ["<start_of_turn>", "<end_of_turn>", "user", "model"]
+
+
+# 토크나이저에 넣을 한글 음절 (프롬프트 템플릿, 테스트 키워드, 퀴즈 형식에 쓰이는 글자만 넣어 어휘를 작게 유지)
+HANGUL_TEXT = (
+    "전기전자공학 전문가로서 위 문서에서 기술 중심 키워드 개만 리스트로 추출하세요 일반 용어는 제외하고 출력은 반드시 형식으로 해주세요 "
+    "요약 에 대해 문장 이내로 반복은 피하고 번역은 하지 마세요 한글로 작성 시험 문제 출제자입니다 관련 지선다 아래 생성 "
+    "정답 번호 해설 보기 이미지 없음 옴의 법칙 키르히호프 테브난 등가회로 노턴 중첩의 원리 회로 전압과 전류 관계를 설명하는"
+)
+
+
+@pytest.fixture(scope="session")
+def tiny_tokenizer():
+    """ASCII 와 HANGUL_TEXT 의 한글을 글자 하나씩 토큰으로 쓰는 토크나이저 (pad=0, bos=1, eos=2)."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    chars = list(" \n[]\"',.:;?!()'-0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ<>_/")
+    chars += sorted(set(HANGUL_TEXT) - {" "})
+    vocab = {"<pad>": 0, "<bos>": 1, "<eos>": 2, "<unk>": 3}
+    for token in chars + SPECIAL_TOKENS:
+        vocab.setdefault(token, len(vocab))
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split(pattern="", behavior="isolated")
+    tokenizer.decoder = decoders.Fuse()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token="<bos>", eos_token="<eos>",
+                                   pad_token="<pad>", unk_token="<unk>")
+
+
+@pytest.fixture(scope="session")
+def make_tiny_model(tiny_tokenizer):
+    """
+    무작위 초기화한 작은 모델을 만드는 함수.
+
+    kind='llama' 는 LlamaForCausalLM, kind='gemma3' 은 sliding window 층이 섞인 Gemma3ForCausalLM.
+    """
+    import torch
+    from transformers import Gemma3ForCausalLM, Gemma3TextConfig, LlamaConfig, LlamaForCausalLM
+
+    def make(kind: str = "llama", num_layers: int = 2, seed: int = 0, sliding_window: int = 4096):
+        torch.manual_seed(seed)
+        common = dict(vocab_size=len(tiny_tokenizer), hidden_size=64, intermediate_size=128,
+                      num_hidden_layers=num_layers, num_attention_heads=4, num_key_value_heads=2,
+                      max_position_embeddings=4096, pad_token_id=0, bos_token_id=1, eos_token_id=2)
+        if kind == "gemma3":
+            config = Gemma3TextConfig(head_dim=16, sliding_window=sliding_window,
+                                      layer_types=["sliding_attention", "full_attention"] * (num_layers // 2), **common)
+            return Gemma3ForCausalLM(config).eval()
+        return LlamaForCausalLM(LlamaConfig(**common)).eval()
+
+    return make
@@ -0,0 +1,67 @@
+import copy
+
+import pytest
+import torch
+
+from rag.generation import GemmaGenerator
+from rag.pipeline import build_quiz_messages, build_summary_messages
+from rag.structured import JsonStringArraySchema, QuizSchema
+
+INPUTS = [{"context": f"{keyword} 회로의 전압과 전류 관계를 설명하는 문서", "image": "(이미지 없음)", "keyword": keyword}
+          for keyword in ("테브난 등가회로", "키르히호프 법칙")]
+SCHEMAS = {"free": None, "quiz": QuizSchema(num_options=4), "keywords": JsonStringArraySchema(max_items=5)}
+
+
+def perturbed_copy(model, noise: float, seed: int = 1):
+    """본 모델에 잡음을 더한 draft. 잡음이 0 이면 모든 후보가 받아들여지고, 0 보다 크면 일부가 거절됨."""
+    draft = copy.deepcopy(model)
+    generator = torch.Generator().manual_seed(seed)
+    with torch.no_grad():
+        for parameter in draft.parameters():
+            parameter.add_(torch.randn(parameter.shape, generator=generator) * noise)
+    return draft
+
+
+@pytest.fixture(scope="module")
+def target(make_tiny_model):
+    return make_tiny_model("llama", num_layers=2)
+
+
+@pytest.mark.parametrize("noise", [0.0, 0.05])
+@pytest.mark.parametrize("schema_name", list(SCHEMAS))
+def test_assisted_batch_matches_greedy(target, tiny_tokenizer, schema_name, noise):
+    schema = SCHEMAS[schema_name]
+    greedy = GemmaGenerator(target, tiny_tokenizer, max_new_tokens=32)
+    assisted = GemmaGenerator(target, tiny_tokenizer, max_new_tokens=32,
+                              assistant_model=perturbed_copy(target, noise), num_assistant_tokens=4)
+    build = build_summary_messages if schema is None else build_quiz_messages
+    prompts = [build(x) for x in INPUTS]
+
+    expected = greedy.generate_batch(prompts, schema=schema, do_sample=False)
+    assert assisted.generate_batch(prompts, schema=schema) == expected
+    stats = assisted.last_stats
+    assert stats["drafted_tokens"] > 0
+    if noise == 0.0:
+        assert stats["acceptance_rate"] == 1.0
+        assert stats["target_forwards"] < stats["new_tokens"]
+
+
+def test_schema_constraint_rolls_back_rejected_drafts(target, tiny_tokenizer):
+    # 일부 draft 후보가 거절되는 경우에도 제약 greedy 와 같아야 함 (거절된 토큰으로 진행한 상태를 되돌림)
+    greedy = GemmaGenerator(target, tiny_tokenizer, max_new_tokens=32)
+    assisted = GemmaGenerator(target, tiny_tokenizer, max_new_tokens=32,
+                              assistant_model=perturbed_copy(target, 0.05), num_assistant_tokens=4)
+    prompt = build_quiz_messages(INPUTS[0])
+    schema = SCHEMAS["quiz"]
+
+    assert assisted.generate(prompt, schema=schema) == greedy.generate(prompt, schema=schema, do_sample=False)
+    assert 0.0 < assisted.last_stats["acceptance_rate"] < 1.0
+
+
+def test_assisted_can_be_disabled_per_call(target, tiny_tokenizer):
+    greedy = GemmaGenerator(target, tiny_tokenizer, max_new_tokens=16)
+    assisted = GemmaGenerator(target, tiny_tokenizer, max_new_tokens=16, assistant_model=perturbed_copy(target, 0.0))
+    prompt = build_summary_messages(INPUTS[0])
+
+    assert assisted.generate(prompt, assisted=False, do_sample=False) == greedy.generate(prompt, do_sample=False)
+    assert "acceptance_rate" not in assisted.last_stats
@@ -0,0 +1,65 @@
+import numpy as np
+from datasets import Dataset
+
+from dedup import lsh_groups, minhash_signatures, normalize_texts
+from prepare_dataset import dedup_hash_split
+
+WORDS = ("저항 전압 전류 커패시터 인덕터 임피던스 위상 주파수 전력 노드 메시 테브난 노턴 중첩 키르히호프 "
+         "옴의 법칙 직렬 병렬 분배 과도 응답 정상 상태 시정수 공진 필터 이득 트랜지스터 다이오드").split()
+
+
+def question_groups(groups: int = 60, seed: int = 0) -> list:
+    """(묶음 번호, 질문) 목록. 묶음마다 원문과, 문장부호/대소문자/글자 하나만 다른 변형 0~2개."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for group in range(groups):
+        base = " ".join(rng.choice(WORDS, size=12)) + f" 값을 구하시오 {group}"
+        variants = [base, base.replace(" ", ", ", 1) + "?", base.upper() + "!", base[:-1] + "번"]
+        for text in variants[:1 + group % 3]:
+            rows.append((group, text))
+    return rows
+
+
+def make_dataset(rows: list) -> Dataset:
+    # 분할 뒤에는 "text" 만 남으므로 text 에 묶음 번호를 남겨 둠
+    return Dataset.from_dict({"text": [f"{group}|{i}|{q}" for i, (group, q) in enumerate(rows)],
+                              "dedup_text": [q for _, q in rows]})
+
+
+def split_of(splits) -> dict:
+    return {text: name for name, split in splits.items() for text in split["text"]}
+
+
+def test_lsh_groups_merge_near_duplicates_only():
+    rows = question_groups()
+    roots = lsh_groups(minhash_signatures(normalize_texts([q for _, q in rows])))
+    groups = np.array([group for group, _ in rows])
+    for root in np.unique(roots):
+        assert len(set(groups[roots == root])) == 1  # 서로 다른 문제는 묶이지 않음
+    for group in np.unique(groups):
+        assert len(set(roots[groups == group])) == 1  # 변형은 모두 한 묶음
+
+
+def test_groups_never_cross_splits_and_splits_are_deterministic():
+    rows = question_groups()
+    first = split_of(dedup_hash_split(make_dataset(rows)))
+    assert first == split_of(dedup_hash_split(make_dataset(rows)))
+    assert set(first.values()) == {"train", "validation", "test"}
+
+    by_group = {}
+    for text, name in first.items():
+        by_group.setdefault(text.split("|")[0], set()).add(name)
+    assert all(len(names) == 1 for names in by_group.values())
+
+    # 새 문제를 뒤에 추가해도 기존 문제의 분할은 그대로
+    extra = [(group + 1000, q + " 추가 문항") for group, q in question_groups(groups=20, seed=1)]
+    grown = split_of(dedup_hash_split(make_dataset(rows + extra)))
+    assert {text: grown[text] for text in first} == first
+
+
+def test_drop_duplicates_keeps_one_row_per_group():
+    rows = question_groups()
+    splits = dedup_hash_split(make_dataset(rows), drop_duplicates=True)
+    kept = [text.split("|")[0] for split in splits.values() for text in split["text"]]
+    assert sorted(kept) == sorted({str(group) for group, _ in rows})
+    assert "dedup_text" not in splits["train"].column_names
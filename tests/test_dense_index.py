@@ -0,0 +1,20 @@
+import numpy as np
+
+from rag.dense_index import build_dense_index, effective_kind, evaluate, synthetic_vectors
+
+
+def test_small_corpus_reports_the_kind_actually_built():
+    vectors = synthetic_vectors(2000, 32, num_clusters=16)
+    queries = vectors[:20] + 0.01
+    assert effective_kind("ivfpq", len(vectors)) == "sq8"
+    assert effective_kind("ivf_sq8", len(vectors)) == "ivf_sq8"
+
+    results = evaluate(vectors, queries.astype(np.float32), ["ivf_sq8", "ivfpq"], k=5, nprobes=[1, 4], pq_m=8)
+    rows = [(r["kind"], r["requested"], r["nprobe"]) for r in results]
+    # ivf_sq8 은 nprobe 별로, 벡터가 부족한 ivfpq 는 실제로 만든 sq8 한 행으로 보고
+    assert rows == [("ivf_sq8", "ivf_sq8", 1), ("ivf_sq8", "ivf_sq8", 4), ("sq8", "ivfpq", None)]
+
+
+def test_build_uses_effective_kind():
+    vectors = synthetic_vectors(500, 16, num_clusters=8)
+    assert type(build_dense_index(vectors, "ivfpq", pq_m=4)).__name__ == "IndexScalarQuantizer"
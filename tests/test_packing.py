@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import torch
+from datasets import Dataset
+
+from tokenize_dataset import IGNORE_INDEX, collate_packed, iter_packed_rows, pack_lengths, tokenize_batch
+
+SEQ_LEN = 64
+TEXTS = [f"{keyword} 회로의 전압과 전류 관계를 설명하는 문서"[:length]
+         for keyword, length in zip(["옴의 법칙", "키르히호프 법칙", "테브난 등가회로", "노턴 등가회로", "중첩의 원리"] * 3,
+                                    [5, 30, 12, 22, 8, 27, 17, 3, 25, 10, 14, 28, 6, 19, 9])]
+
+
+@pytest.fixture(scope="module")
+def tokenized(tiny_tokenizer):
+    return Dataset.from_dict({"text": TEXTS}).map(
+        tokenize_batch, batched=True, fn_kwargs={"tokenizer": tiny_tokenizer, "max_length": SEQ_LEN})
+
+
+def test_pack_lengths_fills_rows_without_overflow():
+    lengths = np.random.default_rng(0).integers(1, 200, size=500)
+    bins = pack_lengths(lengths, 256)
+    members = sorted(i for row in bins for i in row)
+    assert members == list(range(len(lengths)))
+    assert all(lengths[row].sum() <= 256 for row in bins)
+    assert all(row == sorted(row) for row in bins)
+    # best-fit decreasing 는 하한(총 길이 / seq_len)에 가깝게 채움
+    assert len(bins) <= int(np.ceil(lengths.sum() / 256) * 1.05) + 1
+
+
+def test_packed_rows_reset_positions_and_mask_sample_starts(tokenized, tiny_tokenizer):
+    bins = pack_lengths(np.asarray(tokenized["length"]), SEQ_LEN)
+    rows = list(iter_packed_rows(tokenized, bins, SEQ_LEN, tiny_tokenizer.pad_token_id))
+    assert len(rows) < len(TEXTS)
+    for members, row in zip(bins, rows):
+        assert all(len(row[key]) == SEQ_LEN for key in ("input_ids", "labels", "position_ids", "attention_mask"))
+        start = 0
+        for ids in tokenized[members]["input_ids"]:
+            assert ids[-1] == tiny_tokenizer.eos_token_id
+            assert row["input_ids"][start:start + len(ids)] == ids
+            assert row["position_ids"][start:start + len(ids)] == list(range(len(ids)))
+            assert row["labels"][start:start + len(ids)] == [IGNORE_INDEX] + ids[1:]
+            start += len(ids)
+        assert row["labels"][start:] == [IGNORE_INDEX] * (SEQ_LEN - start)
+        assert sum(row["attention_mask"]) == start
+
+
+@pytest.mark.parametrize("attn_implementation", ["eager", "sdpa"])
+def test_block_mask_matches_unpacked_forward(tokenized, tiny_tokenizer, make_tiny_model, attn_implementation):
+    model = make_tiny_model("llama", num_layers=2)
+    model.set_attn_implementation(attn_implementation)
+    bins = pack_lengths(np.asarray(tokenized["length"]), SEQ_LEN)
+    rows = list(iter_packed_rows(tokenized, bins, SEQ_LEN, tiny_tokenizer.pad_token_id))
+    batch = collate_packed(rows)
+
+    with torch.no_grad():
+        packed = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"],
+                       position_ids=batch["position_ids"]).logits
+        for row, members in enumerate(bins):
+            start = 0
+            for ids in tokenized[members]["input_ids"]:
+                alone = model(input_ids=torch.tensor([ids])).logits[0]
+                torch.testing.assert_close(packed[row, start:start + len(ids)], alone, atol=1e-4, rtol=1e-4)
+                start += len(ids)
+    assert torch.isfinite(packed).all()  # 패딩 위치도 NaN 이 아님
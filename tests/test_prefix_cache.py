@@ -0,0 +1,107 @@
+import torch
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag.generation import GemmaGenerator
+from rag.pipeline import PipelineConfig, RagPipeline, build_context_block, build_quiz_messages, build_summary_messages
+from rag.prefix_cache import PrefixKVCache
+from rag.retrieval_cache import RetrievalCache
+
+
+class FixedRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list:
+        return [Document(page_content=f"{query} 관련 문서")]
+
+
+def keyword_inputs():
+    return [{"context": f"{keyword} 회로의 전압과 전류 관계 " * 8, "image": "(이미지 없음)", "keyword": keyword}
+            for keyword in ("테브난", "노턴", "키르히호프")]
+
+
+def test_batch_reuses_shared_context_prefix(make_tiny_model, tiny_tokenizer):
+    model = make_tiny_model("gemma3", num_layers=4)
+    plain = GemmaGenerator(model, tiny_tokenizer, max_new_tokens=8)
+    cached = GemmaGenerator(model, tiny_tokenizer, max_new_tokens=8, prefix_cache=PrefixKVCache())
+    summaries = [build_summary_messages(x, context_first=True) for x in keyword_inputs()]
+    quizzes = [build_quiz_messages(x, context_first=True) for x in keyword_inputs()]
+
+    assert cached.generate_batch(summaries) == plain.generate_batch(summaries)
+    saved_before = cached.prefix_cache.stats()["prefill_tokens_saved"]
+    assert cached.generate_batch(quizzes) == plain.generate_batch(quizzes)
+
+    # 퀴즈 프롬프트는 같은 키워드 요약 프롬프트의 [문서] 문맥 전체를 재사용
+    context_tokens = min(len(tiny_tokenizer(build_context_block(x))["input_ids"]) for x in keyword_inputs())
+    assert cached.prefix_cache.stats()["prefill_tokens_saved"] - saved_before >= 3 * context_tokens
+
+
+def test_uncroppable_sliding_window_entry_is_a_miss(make_tiny_model, tiny_tokenizer):
+    # 창(16)보다 긴 접두사는 sliding window 층에서 자를 수 없으므로 재사용하지 않고 처음부터 prefill
+    model = make_tiny_model("gemma3", num_layers=4, sliding_window=16)
+    plain = GemmaGenerator(model, tiny_tokenizer, max_new_tokens=8)
+    cached = GemmaGenerator(model, tiny_tokenizer, max_new_tokens=8, prefix_cache=PrefixKVCache())
+    x = keyword_inputs()[0]
+    prompts = [build_summary_messages(x, context_first=True), build_quiz_messages(x, context_first=True)]
+
+    assert cached.generate_batch(prompts) == plain.generate_batch(prompts)
+    assert cached.prefix_cache.stats()["hits"] == 0
+
+
+def test_short_shared_prefix_is_a_miss(make_tiny_model, tiny_tokenizer):
+    # 다른 문맥의 프롬프트는 min_prefix_tokens 보다 짧은 머리말만 겹침 → 재사용하지 않고 처음부터 prefill
+    model = make_tiny_model("llama")
+    cache = PrefixKVCache(min_prefix_tokens=16)
+    first = list(range(10, 30))
+    with torch.no_grad():
+        cache.store(first, model(torch.tensor([first]), use_cache=True).past_key_values)
+
+    assert cache.lookup(first[:6] + list(range(40, 64))) == (0, None)
+    assert cache.lookup(list(range(40, 70))) == (0, None)
+    assert cache.stats()["misses"] == 2
+    assert cache.lookup(first + [5])[0] == len(first)
+
+
+def test_uncroppable_candidate_then_short_candidate_is_a_miss(make_tiny_model, tiny_tokenizer):
+    model = make_tiny_model("gemma3", num_layers=2, sliding_window=8)
+    cache = PrefixKVCache(min_prefix_tokens=4)
+    long_prefix, short_prefix = list(range(10, 30)), [10, 11, 12, 50, 51, 52, 53, 54]
+    with torch.no_grad():
+        for ids in (long_prefix, short_prefix):
+            cache.store(ids, model(torch.tensor([ids]), use_cache=True).past_key_values)
+
+    # 가장 길게 겹치는 항목은 창(8)을 넘어 자를 수 없고, 다음 항목은 3토큰만 겹침
+    assert cache.lookup(long_prefix[:12] + [60, 61, 62]) == (0, None)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["prefill_tokens_saved"]) == (0, 1, 0)
+
+
+def test_generation_with_unrelated_contexts(make_tiny_model, tiny_tokenizer):
+    # 문맥이 다른 두 프롬프트를 차례로 생성해도 (겹치는 머리말이 짧아) 캐시 없이와 같은 결과
+    model = make_tiny_model("gemma3", num_layers=4)
+    plain = GemmaGenerator(model, tiny_tokenizer, max_new_tokens=8)
+    cached = GemmaGenerator(model, tiny_tokenizer, max_new_tokens=8, prefix_cache=PrefixKVCache(min_prefix_tokens=64))
+    prompts = [build_summary_messages(x, context_first=True) for x in keyword_inputs()[:2]]
+
+    assert [cached.generate(p) for p in prompts] == [plain.generate(p) for p in prompts]
+    assert cached.prefix_cache.stats()["misses"] == 2
+
+
+def test_prefix_cache_and_context_first_layout_are_opt_in(make_tiny_model, tiny_tokenizer, monkeypatch):
+    # 기본 설정은 캐시 없이 패딩 배치, 프롬프트는 지시문 → 문서 순서
+    assert PipelineConfig().prefix_cache_bytes == 0
+    x = keyword_inputs()[0]
+    assert build_summary_messages(x).index("[문서]") > build_summary_messages(x).index("요약하세요")
+    assert build_summary_messages(x, context_first=True).startswith("<start_of_turn>user\n" + build_context_block(x))
+
+    model = make_tiny_model("llama")
+    plain = GemmaGenerator(model, tiny_tokenizer, max_new_tokens=4)
+    calls = []
+    monkeypatch.setattr(plain, "_generate_padded", lambda prompts, schema=None, **kw: calls.append(prompts) or [""] * len(prompts))
+    plain.generate_batch([build_summary_messages(x) for x in keyword_inputs()])
+    assert [len(prompts) for prompts in calls] == [3]
+
+    retrieval_cache = RetrievalCache(FixedRetriever(), None, index_version="test")
+    assert not RagPipeline(retrieval_cache, plain).context_first
+    cached = GemmaGenerator(model, tiny_tokenizer, max_new_tokens=4, prefix_cache=PrefixKVCache())
+    pipeline = RagPipeline(retrieval_cache, cached)
+    assert pipeline.context_first
+    assert pipeline.summary_prompt_chain.invoke({"keyword": "옴의 법칙"}).startswith("<start_of_turn>user\n[문서]")
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from prepare_dataset import (dedup_hash_split, dedup_text_frame, format_alpaca_frame, load_and_process_csv,
+                             load_and_process_csv_streaming)
+
+
+def create_alpaca_formatted_text(instruction: str, response: str, input_text: str) -> str:
+    return f"""Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.
+
+### Instruction:
+{instruction}
+
+### Input:
+{input_text}
+
+### Response:
+{response}"""
+
+
+def rowwise_reference(df: pd.DataFrame) -> tuple:
+    """컬럼 연산으로 바꾸기 전의 iterrows 가공 (format_ox_quiz_sample / format_multiple_choice_sample)."""
+    df = df.copy()
+    for i in range(1, 6):
+        if f'보기{i}' in df.columns:
+            df[f'보기{i}'] = df[f'보기{i}'].astype(str)
+    texts, counts = [], {"unknown": 0, "ox_missing": 0, "mc_missing": 0}
+    for _, row in df.iterrows():
+        problem_type = row.get('문제유형', '').strip()
+        subject, question = row.get('과목명', 'N/A'), row.get('질문', '')
+        answer, explanation = str(row.get('정답', '')), row.get('해설', '')
+        if problem_type == 'OX':
+            if not question or not answer:
+                counts["ox_missing"] += 1
+                continue
+            instruction = f"다음은 [{subject}] 과목의 OX 퀴즈입니다. 주어진 질문에 대해 O 또는 X로 답하고, 그 이유를 간략히 설명해주세요."
+            input_text = f"질문: {question}"
+        elif problem_type == '객관식':
+            options = [f"{i}: {str(row.get(f'보기{i}')).strip()}" for i in range(1, 6)
+                       if pd.notna(row.get(f'보기{i}')) and str(row.get(f'보기{i}')).strip()]
+            if not question or not options or not answer:
+                counts["mc_missing"] += 1
+                continue
+            instruction = f"다음은 [{subject}] 과목의 객관식 문제입니다. 문제와 보기를 읽고 정답 번호와 해설을 제공해주세요."
+            options_str = "\n".join(options)
+            input_text = f"문제: {question}\n보기:\n{options_str}"
+        else:
+            counts["unknown"] += 1
+            continue
+        texts.append(create_alpaca_formatted_text(instruction, f"정답: {answer}\n해설: {explanation}", input_text))
+    return texts, counts
+
+
+def sample_frame(rows: int = 60) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        '과목명': [f"회로이론{i % 3}" for i in range(rows)],
+        '문제유형': rng.choice(['OX', '객관식', ' 객관식 ', '주관식'], size=rows),
+        '질문': [f"질문 {i}" if i % 11 else "" for i in range(rows)],
+        '정답': [i % 4 + 1 for i in range(rows)],
+        '해설': [f"해설 {i}" if i % 7 else np.nan for i in range(rows)],
+    })
+    for k in range(1, 6):
+        frame[f'보기{k}'] = [f" 보기 {k}-{i} " if (i + k) % 5 else (np.nan if i % 2 else "  ") for i in range(rows)]
+    frame.loc[frame.index % 13 == 0, [f'보기{k}' for k in range(1, 6)]] = np.nan
+    # 마지막 청크에만 정답 결측: 전체를 한 번에 읽으면 정답 컬럼이 float 이 되어 '2.0' 처럼 가공됨
+    frame.loc[rows - 1, '정답'] = np.nan
+    return frame
+
+
+def test_vectorized_formatting_matches_rowwise():
+    frame = sample_frame()
+    texts, counts = format_alpaca_frame(frame)
+    expected_texts, expected_counts = rowwise_reference(frame)
+    assert texts.tolist() == expected_texts
+    assert counts == expected_counts
+    assert all(counts.values())
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_streaming_matches_full_read(tmp_path, suffix):
+    path = str(tmp_path / f"combined{suffix}")
+    frame = sample_frame()
+    frame.to_csv(path, index=False) if suffix == ".csv" else frame.to_parquet(path, row_group_size=16)
+
+    full = load_and_process_csv(path)
+    streamed = load_and_process_csv_streaming(path, str(tmp_path / "cache"), chunksize=16)
+    assert streamed["text"] == full["text"]
+    assert streamed["dedup_text"] == full["dedup_text"]
+    assert ".0\n해설:" in streamed["text"][0]  # 결측이 없는 첫 청크도 전체 읽기와 같이 float 로 가공
+    assert full["text"] == rowwise_reference(pd.read_csv(path) if suffix == ".csv" else pd.read_parquet(path))[0]
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_dedup_text_and_splits_match_between_modes(tmp_path, suffix):
+    path = str(tmp_path / f"combined{suffix}")
+    frame = sample_frame()
+    frame['보기5'] = np.nan  # 전부 결측인 보기 컬럼은 float 로 읽힘
+    frame.to_csv(path, index=False) if suffix == ".csv" else frame.to_parquet(path, row_group_size=16)
+
+    full = load_and_process_csv(path)
+    streamed = load_and_process_csv_streaming(path, str(tmp_path / "cache"), chunksize=16)
+    assert streamed["dedup_text"] == full["dedup_text"]
+    assert not any("nan" in text.split() for text in full["dedup_text"])
+
+    def assignment(dataset):
+        return {text: name for name, split in dedup_hash_split(dataset).items() for text in split["text"]}
+
+    assert assignment(streamed) == assignment(full)
+
+
+def test_dedup_text_skips_missing_options_regardless_of_dtype():
+    frame = pd.DataFrame({'질문': ["질문", np.nan], '보기1': ["가", np.nan], '보기2': [np.nan, np.nan], '보기3': ["", "다"]})
+    expected = ["질문 가", " 다"]
+    assert dedup_text_frame(frame).tolist() == expected
+    as_object = frame.astype(object)
+    assert dedup_text_frame(as_object).tolist() == expected
@@ -0,0 +1,58 @@
+import threading
+
+from rag.quiz_pool import QuizPool, base_query, build_job, fill_pool
+
+SUBJECT = "회로이론1"
+
+
+def test_topups_add_only_new_keywords_until_exhausted(tmp_path):
+    pool = QuizPool(tmp_path)
+    job = build_job(stub=True)
+
+    assert fill_pool(pool, job, SUBJECT, 5) == 5
+    assert not pool.exhausted(SUBJECT)
+    # 과목 질의 다음에는 풀에 든 키워드를 질의로 써서 새 키워드('<키워드> 응용')를 뽑음
+    assert pool.next_query(SUBJECT) != base_query(SUBJECT)
+
+    fill_pool(pool, job, SUBJECT, 100)
+    keywords = [pool.get(SUBJECT, i)["keyword"] for i in range(pool.size(SUBJECT))]
+    assert len(keywords) == len(set(keywords)) == 10
+    assert pool.exhausted(SUBJECT)
+
+    # 다시 열어도(서버 재시작) 이미 쓴 질의와 키워드를 기억해 중복을 만들지 않음
+    reopened = QuizPool(tmp_path)
+    assert fill_pool(reopened, job, SUBJECT, 100) == 0
+    assert reopened.size(SUBJECT) == 10
+
+
+def test_headroom_follows_the_furthest_session(tmp_path):
+    pool = QuizPool(tmp_path)
+    fill_pool(pool, build_job(stub=True), SUBJECT, 5)
+
+    for _ in range(3):
+        pool.pop(SUBJECT, "a")
+    pool.pop(SUBJECT, "b")
+    assert pool.remaining(SUBJECT, "b") == 4
+    assert pool.headroom(SUBJECT) == 2
+
+
+def test_used_queries_can_be_read_while_a_topup_writes_them(tmp_path):
+    # 서버는 보충 스레드가 질의를 기록하는 동안에도 /stats/ 등에서 소진 여부를 읽음
+    pool = QuizPool(tmp_path)
+    errors, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                pool.exhausted(SUBJECT)
+            except Exception as error:
+                errors.append(error)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for i in range(300):
+        pool.mark_query_used(SUBJECT, f"질의 {i}")
+    done.set()
+    reader.join()
+    assert errors == []
+    assert len(pool.used_queries(SUBJECT)) == 300
@@ -0,0 +1,115 @@
+import time
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag.pipeline import PipelineConfig, RagPipeline, build_response_cache
+from rag.response_cache import ResponseCache
+from rag.retrieval_cache import RetrievalCache
+from rag.stubs import StubGenerator
+
+# 키워드 → 검색 문맥. 표기만 다른 키워드는 같은 문맥을, '노턴의 등가회로' 는 '노턴 등가회로' 와 다른 문맥을 검색
+CONTEXTS = {
+    "키르히호프 법칙": "전류 법칙 문서",
+    "키르히호프의 법칙": "전류 법칙 문서",
+    "노턴 등가회로": "노턴 문서",
+    "노턴의 등가회로": "등가회로 변환 문서",
+}
+
+
+class TopicRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list:
+        return [Document(page_content=CONTEXTS[query])]
+
+
+class CharEmbeddings:
+    """'의' 와 공백을 뺀 글자 빈도 벡터 ('키르히호프 법칙' 과 '키르히호프의 법칙' 이 같은 벡터가 됨)."""
+
+    def __init__(self):
+        self.vocab = sorted(set("".join(CONTEXTS)) - {"의", " "})
+
+    def embed_query(self, text: str) -> list:
+        counts = Counter(text)
+        return [float(counts[c]) for c in self.vocab]
+
+
+class CountingGenerator(StubGenerator):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def generate(self, formatted_prompt: str, schema=None, **generate_kwargs) -> str:
+        self.calls += 1
+        return super().generate(formatted_prompt, schema=schema, **generate_kwargs)
+
+
+def make_pipeline(tmp_path, similarity):
+    config = PipelineConfig(response_cache_path=str(tmp_path / "responses.sqlite"), response_cache_similarity=similarity)
+    generator = CountingGenerator()
+    pipeline = RagPipeline(RetrievalCache(TopicRetriever(), None, index_version="test"), generator,
+                           response_cache=build_response_cache(config, CharEmbeddings()))
+    return pipeline, generator
+
+
+def test_exact_key_hit_and_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"))
+    cache.put("k", "응답")
+    assert cache.get("k") == "응답"
+    assert cache.get("other") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_semantic_lookup_is_off_by_default(tmp_path):
+    assert PipelineConfig().response_cache_similarity is None
+    pipeline, generator = make_pipeline(tmp_path, similarity=None)
+    assert pipeline.response_cache.embeddings is None
+
+    pipeline.summary_chain.invoke({"keyword": "키르히호프 법칙"})
+    pipeline.summary_chain.invoke({"keyword": "키르히호프 법칙"})
+    pipeline.summary_chain.invoke({"keyword": "키르히호프의 법칙"})
+    assert generator.calls == 2
+    assert pipeline.response_cache.stats()["semantic_hits"] == 0
+
+
+def test_semantic_lookup_stays_within_the_retrieved_context(tmp_path):
+    pipeline, generator = make_pipeline(tmp_path, similarity=0.95)
+
+    first = pipeline.summary_chain.invoke({"keyword": "키르히호프 법칙"})
+    # 같은 문맥을 검색한 표기만 다른 키워드는 저장된 응답을 씀
+    assert pipeline.summary_chain.invoke({"keyword": "키르히호프의 법칙"}) == first
+    assert generator.calls == 1
+    assert pipeline.response_cache.stats()["semantic_hits"] == 1
+
+    # 임베딩이 같아도 검색 문맥이 다르면 새로 생성
+    pipeline.summary_chain.invoke({"keyword": "노턴 등가회로"})
+    pipeline.summary_chain.invoke({"keyword": "노턴의 등가회로"})
+    assert generator.calls == 3
+    assert pipeline.response_cache.stats()["semantic_hits"] == 1
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"), ttl_sec=0.05)
+    cache.put("k", "응답")
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "c.sqlite"), max_entries=2, embeddings=CharEmbeddings())
+    cache.put("a", "A", scope="s", query="노턴 등가회로")
+    time.sleep(0.01)
+    cache.put("b", "B", scope="s", query="키르히호프 법칙")
+    time.sleep(0.01)
+    assert cache.get("a") == "A"  # a 를 최근에 씀
+    time.sleep(0.01)
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.stats()["size"] == 2
+    # 지워진 항목은 유사도 조회에도 나오지 않음
+    assert cache.get("missing", scope="s", query="키르히호프 법칙") is None
+    assert np.isclose(cache.stats()["hit_rate"], 2 / 4)
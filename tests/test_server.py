@@ -0,0 +1,97 @@
+import asyncio
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from rag.quiz_pool import QuizPool, build_job, fill_pool
+from rag.server import build_stub_service, create_app
+from rag.stubs import STUB_KEYWORDS
+
+SUBJECT = "회로이론1"
+
+
+def stub_client(tmp_path, **kwargs) -> TestClient:
+    return TestClient(create_app(build_stub_service(results_dir=str(tmp_path / "results"), **kwargs)))
+
+
+def test_compare_serves_each_keyword_once_then_404(tmp_path):
+    with stub_client(tmp_path) as client:
+        first = client.post("/compare_models/", json={"subject": SUBJECT})
+        assert first.status_code == 200
+        body = first.json()
+        session_id = body["session_id"]
+        assert body["idx"] == 0
+        assert set(body["model_a"]) >= {"question", "choices", "answer"}
+        assert body["model_a"]["question"] != body["model_b"]["question"]
+
+        indices = [0]
+        for _ in range(len(STUB_KEYWORDS) - 1):
+            response = client.post("/compare_models/", json={"subject": SUBJECT, "session_id": session_id})
+            assert response.json()["session_id"] == session_id
+            indices.append(response.json()["idx"])
+        assert indices == list(range(len(STUB_KEYWORDS)))
+
+        exhausted = client.post("/compare_models/", json={"subject": SUBJECT, "session_id": session_id})
+        assert exhausted.status_code == 404
+        # 다른 세션은 처음부터 다시 받음
+        assert client.post("/compare_models/", json={"subject": SUBJECT}).json()["idx"] == 0
+
+
+def test_selection_and_feedback_are_saved(tmp_path):
+    with stub_client(tmp_path) as client:
+        quiz = client.post("/compare_models/", json={"subject": SUBJECT}).json()
+        selection = {"session_id": quiz["session_id"], "subject": SUBJECT, "idx": quiz["idx"], "selected_model": "model_b"}
+        assert client.post("/save_selection/", json=selection).status_code == 200
+        assert client.post("/save_selection/", json={**selection, "selected_model": "model_c"}).status_code == 400
+        feedback = {"session_id": quiz["session_id"], "feedback": "보기가 모호합니다"}
+        assert client.post("/submit_feedback/", json=feedback).status_code == 200
+
+    results = tmp_path / "results"
+    saved = [json.loads(line) for line in (results / "selections.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert len(saved) == 1
+    assert saved[0]["selected_model"] == "model_b"
+    assert saved[0]["quiz"]["model_b"] == quiz["model_b"]
+    assert json.loads((results / "feedback.jsonl").read_text(encoding="utf-8"))["feedback"] == feedback["feedback"]
+
+
+def test_concurrent_requests_are_coalesced_into_one_batch(tmp_path):
+    service = build_stub_service(results_dir=str(tmp_path), max_wait_ms=200, max_batch_size=8)
+
+    async def run():
+        await service.start()
+        try:
+            return await asyncio.gather(*(service.compare(SUBJECT, f"session-{i}") for i in range(4)))
+        finally:
+            await service.stop()
+
+    responses = asyncio.run(run())
+    assert [r["idx"] for r in responses] == [0, 0, 0, 0]
+    for name in ("model_a", "model_b"):
+        assert service.batchers[name].stats() == {"batches": 1, "requests": 4, "avg_batch_size": 4.0}
+
+
+def test_pool_serves_in_order_then_404_when_exhausted(tmp_path):
+    pool_dir = tmp_path / "pool"
+    fill_pool(QuizPool(pool_dir), build_job(stub=True), SUBJECT, 100)
+    with stub_client(tmp_path, pool_dir=str(pool_dir)) as client:
+        session_id = None
+        for expected in range(10):
+            response = client.post("/compare_models/", json={"subject": SUBJECT, "session_id": session_id})
+            assert response.status_code == 200
+            assert response.json()["idx"] == expected
+            session_id = response.json()["session_id"]
+        assert client.post("/compare_models/", json={"subject": SUBJECT, "session_id": session_id}).status_code == 404
+        assert SUBJECT in client.get("/stats/").json()["pool"]["exhausted"]
+
+
+def test_empty_pool_returns_503_while_topping_up(tmp_path):
+    with stub_client(tmp_path, pool_dir=str(tmp_path / "pool")) as client:
+        pending = client.post("/compare_models/", json={"subject": SUBJECT, "session_id": "s"})
+        assert pending.status_code == 503
+        assert pending.headers["retry-after"] == "5"
+        for _ in range(50):
+            if not client.get("/stats/").json()["pool"]["topups_running"]:
+                break
+            time.sleep(0.05)
+        assert client.post("/compare_models/", json={"subject": SUBJECT, "session_id": "s"}).json()["idx"] == 0
@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from rag.pipeline import RagPipeline
+from rag.retrieval_cache import RetrievalCache
+from rag.stubs import StubGenerator
+from rag.tracing import tracer
+
+
+class FixedRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list:
+        return [Document(page_content=f"{query} 관련 문서")]
+
+
+def test_batched_generation_is_attributed_to_its_chain():
+    pipeline = RagPipeline(RetrievalCache(FixedRetriever(), None, index_version="test"), StubGenerator())
+    inputs = [{"keyword": "옴의 법칙"}, {"keyword": "노턴 등가회로"}]
+    tracer.reset()
+    tracer.enable()
+    try:
+        pipeline.run_cached_batch("summary", inputs)
+        pipeline.run_cached_batch("quiz", inputs, schema=pipeline.quiz_schema)
+        snapshot = tracer.snapshot()
+    finally:
+        tracer.disable()
+        tracer.reset()
+
+    assert "batch" not in snapshot
+    for chain in ("summary_chain", "quiz_chain"):
+        assert snapshot[chain]["generate"]["count"] == 1
+        assert snapshot[chain]["retrieval"]["count"] == 2
+
+
+def test_memory_is_attributed_to_the_stage_that_allocates_it():
+    import numpy as np
+
+    tracer.reset()
+    tracer.enable()
+    try:
+        with tracer.span("allocate", chain="memory"):
+            kept = np.ones(64 * 1024 * 1024 // 8)  # 64MB 를 잡고 놓지 않음
+        with tracer.span("idle", chain="memory"):
+            pass
+        snapshot = tracer.snapshot()["memory"]
+    finally:
+        tracer.disable()
+        tracer.reset()
+
+    assert kept.sum() > 0
+    assert snapshot["allocate"]["max_rss_delta_mb"] > 48
+    assert abs(snapshot["idle"]["max_rss_delta_mb"]) < 8
+    assert snapshot["idle"]["peak_rss_growth_mb"] < 8